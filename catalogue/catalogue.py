@@ -78,7 +78,9 @@ class GridProduct(object):
     def name(self):
         if not self._name:
             aoiid = "{:02d}".format(self.gd.aoiid) if self.gd.aoiid else "NA"
-            self._name = f'{self.ptype}{self.rank}_{self.pname}_{self.gd.actid}_{aoiid}_{self.source_date.strftime("%Y%m%d")}'
+            self._name = (
+                f'{self.ptype}{self.rank}_{self.pname}_{self.gd.actid}_{aoiid}_{self.source_date.strftime("%Y%m%d")}'
+            )
         return self._name
 
     @property
@@ -122,15 +124,11 @@ class GridProduct(object):
         self.source_date = self.gd.source_date
         self.sources = self.gd.s1_ids
         try:
-            self._aoi_meta = CFG["Floods"][f"{self.gd.actid}"]["aois"][
-                f"{self.gd.aoiid:02d}"
-            ]
+            self._aoi_meta = CFG["Floods"][f"{self.gd.actid}"]["aois"][f"{self.gd.aoiid:02d}"]
         except:
             if self.gd.aoiid is None:
                 self.gd.aoiid = 999999
-            self._aoi_meta = dict(
-                aoi_id=f"{self.gd.aoiid:02d}", aoi_name=None, cl_zone=None, cl_name=None
-            )
+            self._aoi_meta = dict(aoi_id=f"{self.gd.aoiid:02d}", aoi_name=None, cl_zone=None, cl_name=None)
 
     def __repr__(self):
         return self.name
@@ -193,9 +191,7 @@ class CatalogueGrid(object):
             return
 
         self.gdmaster = self.gdf.loc[self.gdf["master"] == True].iloc[0]
-        self.gdslave = [
-            row for _, row in self.gdf.loc[self.gdf["master"] == False].iterrows()
-        ]
+        self.gdslave = [row for _, row in self.gdf.loc[self.gdf["master"] == False].iterrows()]
 
         self.infopath = self.path.joinpath("info.json")
         for ptype in ("IVH", "IVV"):
@@ -208,9 +204,7 @@ class CatalogueGrid(object):
         self.clz_id = self.datasets[-1].clz_id
         self.clz_name = self.datasets[-1].clz_name
         if self.inaoi:
-            self.datasets.append(
-                GridProduct(gd=self.gdmaster, base=self.path, pname="MLU")
-            )
+            self.datasets.append(GridProduct(gd=self.gdmaster, base=self.path, pname="MLU"))
 
         if self.infopath.exists():
             self.info = json.loads(self.infopath.read_text())
@@ -287,19 +281,13 @@ class Catalogue(object):
     def aoiids(self):
         uv = [
             _
-            for _ in list(
-                self.gdf.drop_duplicates(["actid", "aoiid"])[
-                    ["actid", "aoiid"]
-                ].to_records(index=False)
-            )
+            for _ in list(self.gdf.drop_duplicates(["actid", "aoiid"])[["actid", "aoiid"]].to_records(index=False))
             if _[1] is not None
         ]
         for uv_ in uv:
             yield uv_
 
-    def filter(
-        self, pcovered=None, ppermwater=None, pflooded=None, pwater=None, coverage="ALL"
-    ):
+    def filter(self, pcovered=None, ppermwater=None, pflooded=None, pwater=None, coverage="ALL"):
         gdf_ = self.gdf
         gdf_ = gdf_[gdf_.gvalid == True]
         if pcovered:
@@ -345,12 +333,8 @@ class Catalogue(object):
 
     def write(self, path):
         gdf = self.gdf.copy()
-        gdf["grid_id"] = self.gdf["grid_id"].apply(
-            lambda c: str(c) if c is not None else c
-        )
-        gdf["s1_ids"] = self.gdf["s1_ids"].apply(
-            lambda c: json.dumps([str(_) for _ in c]) if c is not None else c
-        )
+        gdf["grid_id"] = self.gdf["grid_id"].apply(lambda c: str(c) if c is not None else c)
+        gdf["s1_ids"] = self.gdf["s1_ids"].apply(lambda c: json.dumps([str(_) for _ in c]) if c is not None else c)
         self.schema_ = self._schema_ext if "exported" in gdf.columns else self._schema
         gdf.sort_values(
             by=["actid", "aoiid", "grid_id", "master", "crank"],
@@ -363,18 +347,10 @@ class Catalogue(object):
         self.schema_ = self._schemamap[schema.name] if schema else self.schema_
 
         gdf = gp.read_file(path, schemas=self.schema_)
-        gdf["grid_id"] = gdf["grid_id"].apply(
-            lambda c: uuidmod.UUID(c) if c is not None else c
-        )
-        gdf["s1_ids"] = gdf["s1_ids"].apply(
-            lambda c: [uuidmod.UUID(_) for _ in json.loads(c)] if c is not None else c
-        )
-        gdf["flood_date"] = gdf["flood_date"].apply(
-            lambda c: ciso8601.parse_datetime(c) if c is not None else c
-        )
-        gdf["source_date"] = gdf["source_date"].apply(
-            lambda c: ciso8601.parse_datetime(c).date() if c is not None else c
-        )
+        gdf["grid_id"] = gdf["grid_id"].apply(lambda c: uuidmod.UUID(c) if c is not None else c)
+        gdf["s1_ids"] = gdf["s1_ids"].apply(lambda c: [uuidmod.UUID(_) for _ in json.loads(c)] if c is not None else c)
+        gdf["flood_date"] = gdf["flood_date"].apply(lambda c: ciso8601.parse_datetime(c) if c is not None else c)
+        gdf["source_date"] = gdf["source_date"].apply(lambda c: ciso8601.parse_datetime(c).date() if c is not None else c)
         gdf["aoiid"] = gdf["aoiid"].astype("Int64")
         gdf["revision"] = gdf["revision"].astype("Int64")
         gdf["version"] = gdf["version"].astype("Int64")
@@ -418,21 +394,13 @@ _parser = None
 
 def create_parser():
     def oper(args):
-        cpath = (
-            Path(CFG["CAT_PATH"])
-            if not args.catalogue_path
-            else Path(args.catalogue_path)
-        )
+        cpath = Path(CFG["CAT_PATH"]) if not args.catalogue_path else Path(args.catalogue_path)
         dpath = Path(CFG["REPO_PATH"]) if not args.data_path else Path(args.data_path)
 
         if not cpath.exists() and cpath.is_file():
-            raise FileNotFoundError(
-                f"Provided catalogue dataset {cpath.as_posix()} does not exist"
-            )
+            raise FileNotFoundError(f"Provided catalogue dataset {cpath.as_posix()} does not exist")
         if not dpath.exists() and dpath.is_file():
-            raise FileNotFoundError(
-                f"Provided datasets repository {dpath.as_posix()} does not exist"
-            )
+            raise FileNotFoundError(f"Provided datasets repository {dpath.as_posix()} does not exist")
 
         onlyinfo = args.info
         for f in ("pcovered", "ppermwater", "pflooded", "pwater"):
@@ -440,10 +408,7 @@ def create_parser():
             if v:
                 v_ = json.loads(v)
                 assert (
-                    isinstance(v_, list)
-                    and len(v_) == 2
-                    and 0 <= v_[0] <= 100
-                    and 0 <= v_[1] <= 100
+                    isinstance(v_, list) and len(v_) == 2 and 0 <= v_[0] <= 100 and 0 <= v_[1] <= 100
                 ), "Range value error, use template e.g: [0,100]"
                 setattr(args, f, v_)
 
@@ -488,7 +453,7 @@ def create_parser():
                         gridd.path = str(gridd.path).replace("999999", str(aoi_))
                         break"""
             relative_path = str(gridd.path).split("/data/")[1]
-            
+
             if gridd.info is None:
                 print("None info for grid: ", gridd)
                 continue
@@ -499,8 +464,8 @@ def create_parser():
                 "clz": gridd.clz_id,
                 "clz_name": gridd.clz_name,
             }
-        print('Num of invalid grids: ', invalid_number)
-        print('Num of valid grids: ', len(grid_dict))
+        print("Num of invalid grids: ", invalid_number)
+        print("Num of valid grids: ", len(grid_dict))
         pickle_path = CFG["PICKLE_PATH"]
 
         Path(os.path.dirname(pickle_path)).mkdir(parents=True, exist_ok=True)
@@ -508,22 +473,22 @@ def create_parser():
             dump(grid_dict, file)
             print("Saved pickle")
 
-    _parser = argparse.ArgumentParser(
-        prog="NNFloods_oper", description="NNFloods Catalogue Operations"
-    )
+        if args.npz:
+            # Columnar index the datasets load without unpickling every grid
+            sys.path.append(str(Path(_F).parents[1]))
+            from dataset.grid_index import GridIndex, index_path
+
+            GridIndex.from_dict(grid_dict).save(index_path(pickle_path))
+            print("Saved grid index", index_path(pickle_path))
+
+    _parser = argparse.ArgumentParser(prog="NNFloods_oper", description="NNFloods Catalogue Operations")
     _parser.set_defaults(func=oper)
 
     _parser.add_argument("--version", action="version", version="1.0.0")
-    _parser.add_argument(
-        "--catalogue-path", type=str, help="Merged catalogues path or <CAT_PATH>@CONF"
-    )
-    _parser.add_argument(
-        "--data-path", type=str, help="Root datasets path or <REPO_PATH>@CONF"
-    )
+    _parser.add_argument("--catalogue-path", type=str, help="Merged catalogues path or <CAT_PATH>@CONF")
+    _parser.add_argument("--data-path", type=str, help="Root datasets path or <REPO_PATH>@CONF")
 
-    fg = _parser.add_argument_group(
-        title="Filters Group", description="Define Filters with <AND> logic"
-    )
+    fg = _parser.add_argument_group(title="Filters Group", description="Define Filters with <AND> logic")
     fg.add_argument(
         "-a",
         "--activations",
@@ -582,8 +547,11 @@ def create_parser():
         help="Total percentage of grid water (Permanent+Flooded), DEFAULT: %(default)s",
     )
 
+    _parser.add_argument("-i", "--info", action="store_true", help="Display info on filtered data")
     _parser.add_argument(
-        "-i", "--info", action="store_true", help="Display info on filtered data"
+        "--npz",
+        action="store_true",
+        help="Also write a columnar .npz grid index next to the pickle",
     )
 
     return _parser
@@ -1,16 +1,15 @@
 import os
 from compress_pickle import load, dump
+import itertools
 import random
+from functools import partial
 from pathlib import Path
 
 import albumentations as A
 import cv2 as cv
 import einops
 import numpy as np
-import numpy.ma as ma
 import pandas as pd
-import richdem as rd
-import rioxarray as rio
 import torch
 import torchvision
 from torchio.transforms import RescaleIntensity
@@ -21,65 +20,67 @@ import pyjson5 as json
 
 import utilities.utilities as utilities
 from utilities import augmentations
-
-
-def get_grids(pickle_path):
-    if not os.path.isfile(pickle_path):
-        print("Pickle file not found! ", pickle_path)
-        exit(2)
-    with open(pickle_path, "rb") as file:
-        grid_dict = load(file)
-    return grid_dict
-
-
-def find_data_path(root_path, relative_path):
-    """
-    查找数据的实际路径。数据可能存储在 00-10 的任一文件夹中。
-    
-    Args:
-        root_path: 数据根目录，如 KuroSiwo/data
-        relative_path: 相对路径，如 118/01/xxx
-    
-    Returns:
-        完整的绝对路径
-    """
-    # 首先尝试直接路径
-    direct_path = os.path.join(root_path, relative_path)
-    if os.path.exists(direct_path):
-        return direct_path
-    
-    # 如果直接路径不存在，在 00-10 文件夹中查找
-    for folder_num in range(11):  # 00 到 10
-        folder_name = f"{folder_num:02d}"
-        test_path = os.path.join(root_path, folder_name, relative_path)
-        if os.path.exists(test_path):
-            return test_path
-    
-    # 如果都找不到，返回原始路径（让后续代码报错以便调试）
-    return direct_path
+from utilities.batch_augmentations import batch_engine_enabled
+from dataset.dataset_index import DatasetIndex
+from dataset.grid_index import GridIndex
+from dataset.manifest import find_data_path
+from dataset.read_pool import ReadPool
+from dataset.records import RecordTable, RecordTableBuilder
+from dataset.ssl_shards import load_shard_index
+from dataset.tar_store import open_tar_store
+from dataset.scaling import build_scale_lookup
+from dataset.slc_reader import RasterReader
+from dataset.terrain import TerrainStore, grd_terrain, slc_gap_terrain
+from dataset.tile_store import (
+    ACQUISITION_PREFIXES,
+    MASK_PRODUCTS,
+    SAR_PRODUCTS,
+    read_tile,
+)
+
+
+# Acquisition read for each record type of the diffusion-unsup task
+TYPE_ACQUISITIONS = {"pre1": "pre_event_1", "pre2": "pre_event_2", "flood": "post_event"}
+
+
+def to_uint8(image):
+    image = image / image.max()
+    image *= 255
+    return image.astype(np.uint8)
 
 
 class Dataset(torch.utils.data.Dataset):
-    def __init__(self, mode="train", configs=None):
+    def __init__(self, mode="train", configs=None, index=None):
         self.train_acts = configs["train_acts"]
         self.val_acts = configs["val_acts"]
         self.test_acts = configs["test_acts"]
         self.mode = mode
         self.configs = configs
         self.root_path = os.path.join(self.configs["root_path"], "data")
-        
-        if (
-            self.configs["task"] == "self-supervised"
-            or self.configs["data_augmentations"]
+
+        if not self.configs["dem"] and self.configs["slope"]:
+            print("To return the slope the DEM option must be enabled. Validate the config file!")
+            exit(2)
+
+        if self.configs["task"] == "self-supervised" or (
+            self.configs["data_augmentations"] and not batch_engine_enabled(configs)
         ):
             self.augmentations = augmentations.get_augmentations(self.configs)
         else:
+            # The batch engine augments whole batches in the training loop instead
             self.augmentations = None
+        # Batches of the batch engine carry the valid pixel masks it needs
+        self.return_valid_mask = mode == "train" and batch_engine_enabled(configs)
+
+        # Grids, manifests, stats and stores are shared with the other split views
+        if index is None:
+            index = DatasetIndex(self.configs)
+        self.min_max_random_events = index.min_max_stats
+        self.scale_lookup = index.scale_lookup
+        self.tile_cache = index.tile_cache
+        self.manifest = index.manifest
+        self.non_valids = index.non_valids
 
-        self.non_valids = []
-
-        # Load precomputed min-max stats for each SAR image or calculate them anew
-        self.min_max_random_events = self.update_min_max_stats()
         self.clz_stats = {1: 0, 2: 0, 3: 0}
         self.act_stats = {}
         if self.mode == "train":
@@ -93,18 +94,18 @@ class Dataset(torch.utils.data.Dataset):
             self.pickle_path = configs["test_pickle"]
 
         self.negative_grids = None
-        total_grids = {}
-        self.positive_records = []
-        self.negative_records = []
 
         if not configs["oversampling"] or self.mode != "train":
-            self.grids = get_grids(pickle_path=self.pickle_path)
+            self.grids, act_aoi = index.load_grids(self.pickle_path)
             total_grids = self.grids
+            positive = np.ones(len(self.grids), dtype=bool)
         else:
-            self.grids = get_grids(pickle_path=self.pickle_path)
-            self.negative_grids = get_grids(pickle_path=configs["negative_pickle"])
-            total_grids.update(self.grids)
-            total_grids.update(self.negative_grids)
+            self.grids, act_aoi = index.load_grids(self.pickle_path)
+            self.negative_grids, _ = index.load_grids(configs["negative_pickle"])
+            total_grids = GridIndex.concat([self.grids, self.negative_grids])
+            act_aoi = total_grids.act_aoi(configs["track"])
+            # Grids of both pickles are positive, as `key in self.grids` was
+            positive = np.isin(total_grids.ids, self.grids.ids)
             print("=" * 20)
             print("Enabling oversampling")
             print("Length of positive grids: ", len(self.grids))
@@ -112,75 +113,86 @@ class Dataset(torch.utils.data.Dataset):
             print("Total grids: ", len(total_grids))
             print("=" * 20)
 
-        all_activations = []
-        all_activations.extend(self.train_acts)
-        all_activations.extend(self.val_acts)
-        all_activations.extend(self.test_acts)
-        self.records = []
-        for key in total_grids:
-            record = {}
-            record["id"] = key
-            record["path"] = total_grids[key]["path"]
-
-            record["info"] = total_grids[key]["info"]
-            record["type"] = None
-            record["clz"] = total_grids[key]["clz"]
-            activation = total_grids[key]["info"]["actid"]
-            aoi = total_grids[key]["info"]["aoiid"]
-            if configs["track"] == "Climatic":
-                act_aoi = str(activation) + "_" + f"{aoi:02}"
-            else:
-                act_aoi = activation
-
-            record["activation"] = activation
-            if act_aoi in self.valid_acts:
-                self.clz_stats[record["clz"]] += 1
-                if act_aoi in self.act_stats:
-                    self.act_stats[act_aoi] += 1
-                else:
-                    self.act_stats[act_aoi] = 1
-                if self.configs["task"] == "diffusion-unsup":
-                    # We will create a separate record per observation (pre1, pre2, flood) in order to
-                    # ensure that the model will see every image during an epoch
-                    # This will also allow us to compute appropriate weights for the loss functions
-                    for t in ["pre1", "pre2", "flood"]:
-                        tmp = record.copy()
-                        tmp["type"] = t
-                        self.records.append(tmp)
-                        if key in self.grids:
-                            self.positive_records.append(tmp)
-                        else:
-                            self.negative_records.append(tmp)
-                else:
-                    self.records.append(record)
-                    if key in self.grids:
-                        self.positive_records.append(record)
-                    else:
-                        self.negative_records.append(record)
-
-            if act_aoi not in all_activations and act_aoi not in self.non_valids:
-                print("Activation: ", activation, " not in Activations")
-                self.non_valids.append(act_aoi)
+        # Grids are filtered by activation with a vectorized mask over the index
+        valid = np.isin(act_aoi, self.valid_acts)
+        for clz, count in zip(*np.unique(total_grids.clz[valid], return_counts=True)):
+            self.clz_stats[int(clz)] += int(count)
+        for act, count in zip(*np.unique(act_aoi[valid], return_counts=True)):
+            self.act_stats[act.item()] = int(count)
+
+        if self.configs["task"] == "diffusion-unsup":
+            # We will create a separate record per observation (pre1, pre2, flood) in order to
+            # ensure that the model will see every image during an epoch
+            # This will also allow us to compute appropriate weights for the loss functions
+            record_types = ("pre1", "pre2", "flood")
+        else:
+            record_types = (None,)
+
+        # Records are kept in a columnar table shared by the forked loader workers
+        self.records = RecordTable.from_columns(
+            total_grids.ids[valid],
+            total_grids.paths[valid],
+            total_grids.clz[valid],
+            total_grids.actid[valid],
+            positive[valid],
+            record_types,
+        )
 
         print("Samples per Climatic zone for mode: ", self.mode)
         print(self.clz_stats)
         print("Samples per Activation for mode: ", self.mode)
         print(self.act_stats)
         self.num_examples = len(self.records)
-        self.activations = set([record["activation"] for record in self.records])
+        self.activations = self.records.activations()
+
+        if self.scale_lookup is not None:
+            missing = [act for act in self.activations if act not in self.scale_lookup]
+            if len(missing) > 0:
+                print("No min-max stats for activations: ", missing)
+                exit(2)
+
+        # Only the acquisitions, polarisations and DEM the config uses are read
+        self.acquisition_products = self.build_read_plan()
+
+        # Packed tile and terrain stores of the splits in use, grids missing from
+        # them are read from their grid folders
+        splits = ["train"] if self.mode == "train" else ["test"]
+        if self.negative_grids is not None:
+            splits.append("negative")
+        tile_stores = [index.tile_store(split) for split in splits]
+        terrain_stores = [index.terrain_store(split) for split in splits]
+        self.tile_stores = [store for store in tile_stores if store is not None]
+        self.terrain_stores = [store for store in terrain_stores if store is not None]
+
+        # File reads of a sample are issued concurrently by every loader worker
+        self.read_pool = ReadPool(self.configs.get("read_threads", 0))
 
     def __len__(self):
         return self.num_examples
 
+    def build_read_plan(self):
+        # SAR products to read for every acquisition, vv is not read for vh-only runs
+        if self.configs["channels"] == ["vh"]:
+            polarisations = ["IVH"]
+        else:
+            polarisations = ["IVV", "IVH"]
+        return {
+            acquisition: [f"{prefix}_{polarisation}" for polarisation in polarisations]
+            for acquisition, prefix in ACQUISITION_PREFIXES.items()
+        }
+
+    def sample_acquisitions(self, sample):
+        if sample["type"] is None:
+            return [acquisition for acquisition in ACQUISITION_PREFIXES if acquisition in self.configs["inputs"]]
+        return [TYPE_ACQUISITIONS[sample["type"]]]
+
     def concat(self, image1, image2):
         image1_exp = np.expand_dims(image1, 0)  # vv
         image2_exp = np.expand_dims(image2, 0)  # vh
 
         if set(self.configs["channels"]) == set(["vv", "vh", "vh/vv"]):
             eps = 1e-7
-            image = np.vstack(
-                (image1_exp, image2_exp, image2_exp / (image1_exp + eps))
-            )  # vv, vh, vh/vv
+            image = np.vstack((image1_exp, image2_exp, image2_exp / (image1_exp + eps)))  # vv, vh, vh/vv
         elif set(self.configs["channels"]) == set(["vv", "vh"]):
             image = np.vstack((image1_exp, image2_exp))  # vv, vh
         elif self.configs["channels"] == ["vh"]:
@@ -201,14 +213,10 @@ class Dataset(torch.utils.data.Dataset):
             view_1 = transform["image"]
             transform_2 = self.augmentations(image=event.permute(1, 2, 0).numpy())
             view_2 = transform_2["image"]
-            return torch.from_numpy(view_1).permute(2, 0, 1), torch.from_numpy(
-                view_2
-            ).permute(2, 0, 1)
+            return torch.from_numpy(view_1).permute(2, 0, 1), torch.from_numpy(view_2).permute(2, 0, 1)
 
         else:
-            transform = self.augmentations(
-                image=event.permute(1, 2, 0).numpy(), masks=mask
-            )
+            transform = self.augmentations(image=event.permute(1, 2, 0).numpy(), masks=mask)
             view_1 = transform["image"]
             mask1 = transform["masks"]
             return torch.from_numpy(view_1).permute(2, 0, 1), [
@@ -217,199 +225,27 @@ class Dataset(torch.utils.data.Dataset):
             ]
 
     def scale_img(self, img, valid_mask, img_name, activation):
-        if self.configs["scale_input"] == "normalize":
-            # Read dataset mean and std from configs
-            means = self.configs["data_mean"]
-            stds = self.configs["data_std"]
-
-            return means, stds, torchvision.transforms.Normalize(means, stds)(img)
-        elif self.configs["scale_input"] == "min-max":
-            if len(self.configs["channels"]) > 1:
-                mins = {}
-                maxs = {}
-
-                if "vv" in self.configs["channels"]:
-                    mins["vv"] = self.min_max_random_events[activation][
-                        f"{img_name}_vv"
-                    ][0]
-                    if self.configs["clamp_input"] is not None:
-                        maxs["vv"] = self.configs["clamp_input"]
-                    else:
-                        maxs["vv"] = self.min_max_random_events[activation][
-                            f"{img_name}_vv"
-                        ][1]
-                if "vh" in self.configs["channels"]:
-                    mins["vh"] = self.min_max_random_events[activation][
-                        f"{img_name}_vh"
-                    ][0]
-                    if self.configs["clamp_input"] is not None:
-                        maxs["vh"] = self.configs["clamp_input"]
-                    else:
-                        maxs["vh"] = self.min_max_random_events[activation][
-                            f"{img_name}_vh"
-                        ][1]
-                if "vh/vv" in self.configs["channels"]:
-                    mins["vh/vv"] = (
-                        self.min_max_random_events[activation][f"{img_name}_vh"][0]
-                        / self.min_max_random_events[activation][f"{img_name}_vv"][0]
-                    )
-                    if self.configs["clamp_input"] is not None:
-                        maxs["vh/vv"] = 1.0
-                    else:
-                        maxs["vh/vv"] = (
-                            self.min_max_random_events[activation][f"{img_name}_vh"][1]
-                            / self.min_max_random_events[activation][f"{img_name}_vv"][
-                                1
-                            ]
-                        )
-
-                new_ch = []
-                for ch_i, ch in enumerate(self.configs["channels"]):
-                    new_ch.append(
-                        ((img[ch_i, :, :] - mins[ch]) / (maxs[ch] - mins[ch]))[
-                            None, :, :
-                        ]
-                    )
-
-                return (
-                    list(mins.values()),
-                    list(maxs.values()),
-                    torch.cat(new_ch, dim=0),
-                )
-            else:
-                if self.configs["channels"] == ["vh/vv"]:
-                    mins = (
-                        self.min_max_random_events[activation][f"{img_name}_vh"][0]
-                        / self.min_max_random_events[activation][f"{img_name}_vv"][0]
-                    )
-                else:
-                    mins = self.min_max_random_events[activation][
-                        f'{img_name}_{self.configs["channels"][0]}'
-                    ][0]
-
-                if self.configs["clamp_input"] is not None:
-                    maxs = self.configs["clamp_input"]
-                elif self.configs["channels"] == ["vh/vv"]:
-                    maxs = (
-                        self.min_max_random_events[activation][f"{img_name}_vh"][1]
-                        / self.min_max_random_events[activation][f"{img_name}_vv"][1]
-                    )
-                else:
-                    maxs = self.min_max_random_events[activation][
-                        f'{img_name}_{self.configs["channels"][0]}'
-                    ][1]
-                return mins, maxs, (img - mins) / (maxs - mins)
-        elif isinstance(self.configs["scale_input"], list):
-            # The required min and max values are given
-            new_min, new_max = [torch.tensor(i) for i in self.configs["scale_input"]]
-
-            if len(self.configs["channels"]) > 1:
-                mins = {}
-                maxs = {}
-
-                if "vv" in self.configs["channels"]:
-                    mins["vv"] = self.min_max_random_events[activation][
-                        f"{img_name}_vv"
-                    ][0]
-                    if self.configs["clamp_input"] is not None:
-                        maxs["vv"] = self.configs["clamp_input"]
-                    else:
-                        maxs["vv"] = self.min_max_random_events[activation][
-                            f"{img_name}_vv"
-                        ][1]
-                if "vh" in self.configs["channels"]:
-                    mins["vh"] = self.min_max_random_events[activation][
-                        f"{img_name}_vh"
-                    ][0]
-                    if self.configs["clamp_input"] is not None:
-                        maxs["vh"] = self.configs["clamp_input"]
-                    else:
-                        maxs["vh"] = self.min_max_random_events[activation][
-                            f"{img_name}_vh"
-                        ][1]
-                if "vh/vv" in self.configs["channels"]:
-                    mins["vh/vv"] = (
-                        self.min_max_random_events[activation][f"{img_name}_vh"][0]
-                        / self.min_max_random_events[activation][f"{img_name}_vv"][0]
-                    )
-                    if self.configs["clamp_input"] is not None:
-                        maxs["vh/vv"] = 1.0
-                    else:
-                        maxs["vh/vv"] = (
-                            self.min_max_random_events[activation][f"{img_name}_vh"][1]
-                            / self.min_max_random_events[activation][f"{img_name}_vv"][
-                                1
-                            ]
-                        )
-
-                new_ch = []
-                for ch_i, ch in enumerate(self.configs["channels"]):
-                    new_ch.append(
-                        ((img[ch_i, :, :] - mins[ch]) / (maxs[ch] - mins[ch]))[
-                            None, :, :
-                        ]
-                    )
-
-                new_img = torch.cat(new_ch, dim=0)
-                new_img = torch.mul(new_img, (new_max - new_min)) + new_min
-
-                return list(mins.values()), list(maxs.values()), new_img
-            else:
-                if self.configs["channels"] == ["vh/vv"]:
-                    mins = (
-                        self.min_max_random_events[activation][f"{img_name}_vh"][0]
-                        / self.min_max_random_events[activation][f"{img_name}_vv"][0]
-                    )
-                else:
-                    mins = self.min_max_random_events[activation][
-                        f'{img_name}_{self.configs["channels"][0]}'
-                    ][0]
-
-                if self.configs["clamp_input"] is not None:
-                    maxs = self.configs["clamp_input"]
-                elif self.configs["channels"] == ["vh/vv"]:
-                    maxs = (
-                        self.min_max_random_events[activation][f"{img_name}_vh"][1]
-                        / self.min_max_random_events[activation][f"{img_name}_vv"][1]
-                    )
-                else:
-                    maxs = self.min_max_random_events[activation][
-                        f'{img_name}_{self.configs["channels"][0]}'
-                    ][1]
-                return (
-                    torch.mul((img - mins) / (maxs - mins), (new_max - new_min))
-                    + new_min
-                )
-        elif self.configs["scale_input"] == "custom":
+        # Per sample "custom" scaling, affine scalings are applied to whole batches
+        if self.configs["scale_input"] == "custom":
             # 1) Bring all values to > 0 (to avoid NaNs after the logarithm below)
             eps = 1e-7
-            offset = torch.tensor(
-                [torch.masked_select(x, valid_mask).min().item() for x in img]
-            )
+            offset = torch.tensor([torch.masked_select(x, valid_mask).min().item() for x in img])
 
             mins = {}
             maxs = {}
             if len(self.configs["channels"]) > 1:
                 if "vv" in self.configs["channels"]:
-                    mins["vv"] = self.min_max_random_events[activation][
-                        f"{img_name}_vv"
-                    ][0]
+                    mins["vv"] = self.min_max_random_events[activation][f"{img_name}_vv"][0]
                     if self.configs["clamp_input"] is not None:
                         maxs["vv"] = self.configs["clamp_input"]
                     else:
-                        maxs["vv"] = self.min_max_random_events[activation][
-                            f"{img_name}_vv"
-                        ][1]
+                        maxs["vv"] = self.min_max_random_events[activation][f"{img_name}_vv"][1]
                 if "vh" in self.configs["channels"]:
-                    mins["vh"] = self.min_max_random_events[activation][
-                        f"{img_name}_vh"
-                    ][0]
+                    mins["vh"] = self.min_max_random_events[activation][f"{img_name}_vh"][0]
                     if self.configs["clamp_input"] is not None:
                         maxs["vh"] = self.configs["clamp_input"]
                     else:
-                        maxs["vh"] = self.min_max_random_events[activation][
-                            f"{img_name}_vh"
-                        ][1]
+                        maxs["vh"] = self.min_max_random_events[activation][f"{img_name}_vh"][1]
                 if "vh/vv" in self.configs["channels"]:
                     mins["vh/vv"] = (
                         self.min_max_random_events[activation][f"{img_name}_vh"][0]
@@ -420,9 +256,7 @@ class Dataset(torch.utils.data.Dataset):
                     else:
                         maxs["vh/vv"] = (
                             self.min_max_random_events[activation][f"{img_name}_vh"][1]
-                            / self.min_max_random_events[activation][f"{img_name}_vv"][
-                                1
-                            ]
+                            / self.min_max_random_events[activation][f"{img_name}_vv"][1]
                         )
             else:
                 if self.configs["channels"] == ["vh/vv"]:
@@ -431,9 +265,9 @@ class Dataset(torch.utils.data.Dataset):
                         / self.min_max_random_events[activation][f"{img_name}_vv"][0]
                     )
                 else:
-                    mins[self.configs["channels"][0]] = self.min_max_random_events[
-                        activation
-                    ][f'{img_name}_{self.configs["channels"][0]}'][0]
+                    mins[self.configs["channels"][0]] = self.min_max_random_events[activation][
+                        f'{img_name}_{self.configs["channels"][0]}'
+                    ][0]
 
                 if self.configs["clamp_input"] is not None:
                     maxs[self.configs["channels"][0]] = self.configs["clamp_input"]
@@ -443,22 +277,16 @@ class Dataset(torch.utils.data.Dataset):
                         / self.min_max_random_events[activation][f"{img_name}_vv"][1]
                     )
                 else:
-                    maxs[self.configs["channels"][0]] = self.min_max_random_events[
-                        activation
-                    ][f'{img_name}_{self.configs["channels"][0]}'][1]
+                    maxs[self.configs["channels"][0]] = self.min_max_random_events[activation][
+                        f'{img_name}_{self.configs["channels"][0]}'
+                    ][1]
 
             if len(self.configs["channels"]) > 1:
                 new_ch = []
                 for ch_i, ch in enumerate(self.configs["channels"]):
-                    new_ch.append(
-                        ((img[ch_i, :, :] - mins[ch]) / (maxs[ch] - mins[ch]))[
-                            None, :, :
-                        ]
-                    )
+                    new_ch.append(((img[ch_i, :, :] - mins[ch]) / (maxs[ch] - mins[ch]))[None, :, :])
                     if offset[0] <= 0:
-                        new_ch.append(
-                            (img[ch_i, :, :] + (-offset[ch_i]) + eps)[None, :, :]
-                        )
+                        new_ch.append((img[ch_i, :, :] + (-offset[ch_i]) + eps)[None, :, :])
                     else:
                         new_ch.append(img[ch_i, :, :][None, :, :])
 
@@ -476,11 +304,7 @@ class Dataset(torch.utils.data.Dataset):
             if len(self.configs["channels"]) > 1:
                 new_ch = []
                 for ch_i, ch in enumerate(self.configs["channels"]):
-                    new_ch.append(
-                        ((img_scaled[ch_i, :, :] - mins[ch]) / (maxs[ch] - mins[ch]))[
-                            None, :, :
-                        ]
-                    )
+                    new_ch.append(((img_scaled[ch_i, :, :] - mins[ch]) / (maxs[ch] - mins[ch]))[None, :, :])
 
                 img_scaled = torch.cat(new_ch, dim=0)
             else:
@@ -492,11 +316,7 @@ class Dataset(torch.utils.data.Dataset):
             if len(self.configs["channels"]) > 1:
                 new_ch = []
                 for ch in range(len(self.configs["channels"])):
-                    new_ch.append(
-                        intens_scaling(
-                            img_scaled[ch, :, :][None, None, :, :]
-                        ).squeeze()[None, :, :]
-                    )
+                    new_ch.append(intens_scaling(img_scaled[ch, :, :][None, None, :, :]).squeeze()[None, :, :])
 
                 return (
                     list(mins.values()),
@@ -510,312 +330,93 @@ class Dataset(torch.utils.data.Dataset):
                     intens_scaling(img_scaled[None, :, :]).squeeze()[None, :, :],
                 )
 
-    def update_min_max_stats(self):
-        if Path("stats.pkl").exists():
-            print(f"({self.mode}) Using precalculated stats for dataset...")
-            return load(open("stats.pkl", "rb"))
-
-        print(f"({self.mode}) Calculating stats for dataset...")
-
-        records = []
-        for mode in ["train", "val", "test"]:
-            valid = self.configs[f"{mode}_acts"]
-
-            if mode == "test" or mode == "val":
-                pickle_path = self.configs["test_pickle"]
-            else:
-                pickle_path = self.configs["train_pickle"]
-
-            grids = get_grids(pickle_path=pickle_path)
-
-            for key in grids.keys():
-                record = {}
-                record["path"] = grids[key]["path"]
-
-                activation = grids[key]["info"]["actid"]
-                aoi = grids[key]["info"]["aoiid"]
-                if self.configs["track"] == "Climatic":
-                    act_aoi = str(activation) + "_" + f"{aoi:02}"
-                else:
-                    act_aoi = activation
-                record["activation"] = activation
-
-                if act_aoi in self.non_valids:
-                    continue
-
-                if act_aoi in valid:
-                    records.append(record)
-
-        min_max_random_events = {}
-        for record in records:
-            # 使用新的路径查找函数
-            filespath = find_data_path(self.root_path, record["path"])
-            filespath = Path(filespath)
-
-            # Initialize variables
-            valid_mask = None
-            flood_vv = None
-            flood_vh = None
-            sec1_vv = None
-            sec1_vh = None
-            sec2_vv = None
-            sec2_vh = None
-            
-            for file in filespath.glob("*"):
-                if "xml" not in file.name:
-                    if file.stem.startswith("MK0_MNA"):
-                        # Get mask of valid pixels
-                        valid_mask = cv.imread(str(file), cv.IMREAD_ANYDEPTH)
-                    elif file.stem.startswith("MS1_IVV"):
-                        # Get master ivv channel
-                        flood_vv = cv.imread(str(file), cv.IMREAD_ANYDEPTH)
-                    elif file.stem.startswith("MS1_IVH"):
-                        # Get master ivh channel
-                        flood_vh = cv.imread(str(file), cv.IMREAD_ANYDEPTH)
-                    elif file.stem.startswith("SL1_IVV"):
-                        # Get slave1 vv channel
-                        sec1_vv = cv.imread(str(file), cv.IMREAD_ANYDEPTH)
-                    elif file.stem.startswith("SL1_IVH"):
-                        # Get sl1 vh channel
-                        sec1_vh = cv.imread(str(file), cv.IMREAD_ANYDEPTH)
-                    elif file.stem.startswith("SL2_IVV"):
-                        # Get sl2 vv channel
-                        sec2_vv = cv.imread(str(file), cv.IMREAD_ANYDEPTH)
-                    elif file.stem.startswith("SL2_IVH"):
-                        # Get sl2 vh channel
-                        sec2_vh = cv.imread(str(file), cv.IMREAD_ANYDEPTH)
-            
-            # Skip if any required data is missing
-            if valid_mask is None:
-                print(f"Warning: Missing valid_mask for {filespath}, skipping...")
-                continue
-            
-            invalid_mask = valid_mask != 1
-
-            # Mask images with valid pixels
-            flood_vv = ma.masked_array(flood_vv, invalid_mask)
-            flood_vh = ma.masked_array(flood_vh, invalid_mask)
-            sec1_vv = ma.masked_array(sec1_vv, invalid_mask)
-            sec1_vh = ma.masked_array(sec1_vh, invalid_mask)
-            sec2_vv = ma.masked_array(sec2_vv, invalid_mask)
-            sec2_vh = ma.masked_array(sec2_vh, invalid_mask)
-
-            if record["activation"] not in min_max_random_events.keys():
-                min_max_random_events[record["activation"]] = {
-                    "pre1_vv": (ma.min(sec1_vv), ma.max(sec1_vv)),
-                    "pre1_vh": (ma.min(sec1_vh), ma.max(sec1_vh)),
-                    "pre2_vv": (ma.min(sec2_vv), ma.max(sec2_vv)),
-                    "pre2_vh": (ma.min(sec2_vh), ma.max(sec2_vh)),
-                    "flood_vv": (ma.min(flood_vv), ma.max(flood_vv)),
-                    "flood_vh": (ma.min(flood_vh), ma.max(flood_vh)),
-                }
+    def read_products(self, sample, acquisitions):
+        # Raw tiles of the products needed by `sample`, keyed by product prefix
+        products = set()
+        if sample["type"] is None:
+            products.update(MASK_PRODUCTS)
+        for acquisition in acquisitions:
+            products.update(self.acquisition_products[acquisition])
+
+        tiles, unpacked = {}, products
+        for tile_store in self.tile_stores:
+            if sample["id"] in tile_store:
+                tiles, unpacked = tile_store.read(sample["id"], products)
+                break
+
+        if unpacked:
+            files = self.manifest[sample["id"]]
+            unpacked = [product for product in unpacked if product in files]
+            read = read_tile if self.tile_cache is None else self.tile_cache.read
+            paths = [files[product] for product in unpacked]
+            for product, path, tile in zip(unpacked, paths, self.read_pool.map(read, paths)):
+                tiles[product] = tile
+                if tile is None:
+                    print(path)
+        return tiles
+
+    def load_dem(self, sample):
+        # Gap-filled DEM and slope come from the terrain store when precomputed
+        terrain = None
+        for terrain_store in self.terrain_stores:
+            if sample["id"] in terrain_store:
+                terrain = terrain_store.read(sample["id"])
+                break
+        if terrain is None:
+            layers = ("dem", "slope") if self.configs["slope"] else ("dem",)
+            terrain = grd_terrain(self.manifest[sample["id"]]["MK0_DEM"], layers)
+        dem = terrain["dem"]
+
+        # Get slope before normalization
+        if self.configs["slope"]:
+            slope = terrain["slope"]
+            if self.configs["scale_input"] is not None:
+                # Only support standarization for DEMs
+                normalization = transforms.Normalize(
+                    mean=self.configs["slope_mean"],
+                    std=self.configs["slope_std"],
+                )
+                dem = normalization(torch.from_numpy(slope))
             else:
-                min_max_random_events[record["activation"]] = {
-                    "pre1_vv": (
-                        min(
-                            ma.min(sec1_vv),
-                            min_max_random_events[record["activation"]]["pre1_vv"][0],
-                        ),
-                        max(
-                            ma.max(sec1_vv),
-                            min_max_random_events[record["activation"]]["pre1_vv"][1],
-                        ),
-                    ),
-                    "pre1_vh": (
-                        min(
-                            ma.min(sec1_vh),
-                            min_max_random_events[record["activation"]]["pre1_vh"][0],
-                        ),
-                        max(
-                            ma.max(sec1_vh),
-                            min_max_random_events[record["activation"]]["pre1_vh"][1],
-                        ),
-                    ),
-                    "pre2_vv": (
-                        min(
-                            ma.min(sec2_vv),
-                            min_max_random_events[record["activation"]]["pre2_vv"][0],
-                        ),
-                        max(
-                            ma.max(sec2_vv),
-                            min_max_random_events[record["activation"]]["pre2_vv"][1],
-                        ),
-                    ),
-                    "pre2_vh": (
-                        min(
-                            ma.min(sec2_vh),
-                            min_max_random_events[record["activation"]]["pre2_vh"][0],
-                        ),
-                        max(
-                            ma.max(sec2_vh),
-                            min_max_random_events[record["activation"]]["pre2_vh"][1],
-                        ),
-                    ),
-                    "flood_vv": (
-                        min(
-                            ma.min(flood_vv),
-                            min_max_random_events[record["activation"]]["flood_vv"][0],
-                        ),
-                        max(
-                            ma.max(flood_vv),
-                            min_max_random_events[record["activation"]]["flood_vv"][1],
-                        ),
-                    ),
-                    "flood_vh": (
-                        min(
-                            ma.min(flood_vh),
-                            min_max_random_events[record["activation"]]["flood_vh"][0],
-                        ),
-                        max(
-                            ma.max(flood_vh),
-                            min_max_random_events[record["activation"]]["flood_vh"][1],
-                        ),
-                    ),
-                }
-
-        print(f"({self.mode}) New stats:")
-        print(min_max_random_events)
-
-        dump(min_max_random_events, open("stats.pkl", "wb"))
-
-        return min_max_random_events
+                dem = slope
+        else:
+            if self.configs["scale_input"] is not None:
+                normalization = transforms.Normalize(
+                    mean=self.configs["dem_mean"],
+                    std=self.configs["dem_std"],
+                )
+                dem = normalization(torch.from_numpy(dem))
+        return dem
 
     def __getitem__(self, index):
-        if self.configs["oversampling"] and self.mode == "train":
-            choice = random.randint(0, 1)
-            if choice == 0:
-                index = random.randint(0, len(self.positive_records) - 1)
-                sample = self.positive_records[index]
-            elif choice == 1:
-                index = random.randint(0, len(self.negative_records) - 1)
-                sample = self.negative_records[index]
-        else:
-            sample = self.records[index]
+        # Oversampling is done by the train sampler, see samplers.BalancedSampler
+        sample = self.records[index]
 
-        # 使用新的路径查找函数
-        path = find_data_path(self.root_path, sample["path"])
-        files = os.listdir(path)
         clz = sample["clz"]
         activation = sample["activation"]
-        mask = None
 
-        for file in files:
-            current_path = str(os.path.join(path, file))
-            if "xml" not in file:
-                if file.startswith("MK0_MLU") and (sample["type"] is None):
-                    # Get mask of flooded/perm water pixels
-                    mask = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
-                elif file.startswith("MK0_MNA") and (sample["type"] is None):
-                    # Get mask of valid pixels
-                    valid_mask = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
-                elif file.startswith("MS1_IVV") and (
-                    sample["type"] not in ["pre1", "pre2"]
-                ):
-                    # Get master ivv channel
-                    flood_vv = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
-                    if self.configs["uint8"]:
-                        flood_vv /= flood_vv.max()
-                        flood_vv *= 255
-                        flood_vv = flood_vv.astype(np.uint8)
-                    if flood_vv is None:
-                        print(current_path)
-
-                elif file.startswith("MS1_IVH") and (
-                    sample["type"] not in ["pre1", "pre2"]
-                ):
-                    # Get master ivh channel
-                    flood_vh = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
-                    if self.configs["uint8"]:
-                        flood_vh /= flood_vh.max()
-                        flood_vh *= 255
-                        flood_vh = flood_vh.astype(np.uint8)
-
-                elif file.startswith("SL1_IVV") and (
-                    sample["type"] not in ["flood", "pre2"]
-                ):
-                    # Get slave1 vv channel
-                    sec1_vv = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
-                    if self.configs["uint8"]:
-                        sec1_vv /= sec1_vv.max()
-                        sec1_vv *= 255
-                        sec1_vv = sec1_vv.astype(np.uint8)
-
-                elif file.startswith("SL1_IVH") and (
-                    sample["type"] not in ["flood", "pre2"]
-                ):
-                    # Get sl1 vh channel
-                    sec1_vh = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
-                    if self.configs["uint8"]:
-                        sec1_vh /= sec1_vh.max()
-                        sec1_vh *= 255
-                        sec1_vh = sec1_vh.astype(np.uint8)
-
-                elif file.startswith("SL2_IVV") and (
-                    sample["type"] not in ["flood", "pre1"]
-                ):
-                    # Get sl2 vv channel
-                    sec2_vv = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
-                    if self.configs["uint8"]:
-                        sec2_vv /= sec2_vv.max()
-                        sec2_vv *= 255
-                        sec2_vv = sec2_vv.astype(np.uint8)
-
-                elif file.startswith("SL2_IVH") and (
-                    sample["type"] not in ["flood", "pre1"]
-                ):
-                    # Get sl2 vh channel
-                    sec2_vh = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
-                    if self.configs["uint8"]:
-                        sec2_vh /= sec2_vh.max()
-                        sec2_vh *= 255
-                        sec2_vh = sec2_vh.astype(np.uint8)
-
-                elif file.startswith("MK0_DEM"):
-                    # Get DEM
-                    dem = rio.open_rasterio(current_path)
-                    nans = dem.isnull()
-                    if nans.any():
-                        dem = dem.rio.interpolate_na()
-                        nans = dem.isnull()
-
-                    nodata = dem.rio.nodata
-                    dem = dem.to_numpy()
-                    if not self.configs["dem"] and self.configs["slope"]:
-                        print(
-                            "To return the slope the DEM option must be enabled. Validate the config file!"
-                        )
-                        exit(2)
-
-                    # Get slope before normalization
-                    if self.configs["slope"]:
-                        rd_dem = rd.rdarray(dem.squeeze(), no_data=nodata)
-                        slope = rd.TerrainAttribute(rd_dem, attrib="slope_riserun")
-                        slope = np.asarray(slope.data)
-                        slope = einops.rearrange(slope, "h w -> 1 h w")
-                        if self.configs["scale_input"] is not None:
-                            # Only support standarization for DEMs
-                            normalization = transforms.Normalize(
-                                mean=self.configs["slope_mean"],
-                                std=self.configs["slope_std"],
-                            )
-                            dem = normalization(torch.from_numpy(slope))
-                        else:
-                            dem = slope
-                    else:
-                        if self.configs["scale_input"] is not None:
-                            normalization = transforms.Normalize(
-                                mean=self.configs["dem_mean"],
-                                std=self.configs["dem_std"],
-                            )
-                            dem = normalization(torch.from_numpy(dem))
+        acquisitions = self.sample_acquisitions(sample)
+        if self.configs["dem"]:
+            # The DEM is read while the products are
+            dem_future = self.read_pool.submit(self.load_dem, sample)
+        tiles = self.read_products(sample, acquisitions)
+        mask = tiles.get("MK0_MLU")
+        valid_mask = tiles.get("MK0_MNA")
+        flood_vv = tiles.get("MS1_IVV")
+        flood_vh = tiles.get("MS1_IVH")
+        sec1_vv = tiles.get("SL1_IVV")
+        sec1_vh = tiles.get("SL1_IVH")
+        sec2_vv = tiles.get("SL2_IVV")
+        sec2_vh = tiles.get("SL2_IVH")
+
+        if self.configs["uint8"]:
+            flood_vv, flood_vh, sec1_vv, sec1_vh, sec2_vv, sec2_vh = [
+                None if image is None else to_uint8(image)
+                for image in (flood_vv, flood_vh, sec1_vv, sec1_vh, sec2_vv, sec2_vh)
+            ]
 
-        # Concat channels
-        if sample["type"] not in ("pre1", "pre2"):
-            flood = self.concat(flood_vv, flood_vh)
-        if sample["type"] not in ("flood", "pre2"):
-            pre_event_1 = self.concat(sec1_vv, sec1_vh)
-        if sample["type"] not in ("flood", "pre1"):
-            pre_event_2 = self.concat(sec2_vv, sec2_vh)
+        if self.configs["dem"]:
+            dem = dem_future.result()
 
         if sample["type"] is None:
             if mask is None:
@@ -823,6 +424,15 @@ class Dataset(torch.utils.data.Dataset):
 
         mask = torch.from_numpy(mask).long()
 
+        # Concat channels, acquisitions left out of the inputs have no channels
+        flood = pre_event_1 = pre_event_2 = torch.empty((0,) + tuple(mask.shape[-2:]))
+        if "post_event" in acquisitions:
+            flood = self.concat(flood_vv, flood_vh)
+        if "pre_event_1" in acquisitions:
+            pre_event_1 = self.concat(sec1_vv, sec1_vh)
+        if "pre_event_2" in acquisitions:
+            pre_event_2 = self.concat(sec2_vv, sec2_vh)
+
         # Return record given training options
         if sample["type"] == "pre1":
             return pre_event_1
@@ -833,16 +443,14 @@ class Dataset(torch.utils.data.Dataset):
 
         if self.augmentations is not None and self.mode == "train":
             events = torch.cat((pre_event_1, pre_event_2, flood), dim=0)
-            events_A, masks_A = self.create_views(
-                events, mask=[mask.numpy(), valid_mask]
-            )
+            events_A, masks_A = self.create_views(events, mask=[mask.numpy(), valid_mask])
             if torch.sum(masks_A[1]) > 0:
                 # Certain augmentation pipelines may return no valid pixels, so we discard them
-                pre_event_1 = events_A[: pre_event_1.shape[0], :, :]
-                pre_event_2 = events_A[
-                    pre_event_1.shape[0] : 2 * pre_event_1.shape[0], :, :
-                ]
-                flood = events_A[2 * pre_event_1.shape[0] :, :, :]
+                pre1_channels = pre_event_1.shape[0]
+                pre2_channels = pre_event_2.shape[0]
+                pre_event_1 = events_A[:pre1_channels, :, :]
+                pre_event_2 = events_A[pre1_channels : pre1_channels + pre2_channels, :, :]
+                flood = events_A[pre1_channels + pre2_channels :, :, :]
                 mask = masks_A[0]
                 valid_mask = masks_A[1]
         else:
@@ -850,71 +458,91 @@ class Dataset(torch.utils.data.Dataset):
 
         mask = mask.long()
 
-        # Scale images if necessary
-        if self.configs["scale_input"] is not None:
+        # Only "custom" scaling is applied per sample, see self.scale_lookup
+        if self.configs["scale_input"] == "custom":
             valid_mask = valid_mask == 1
-            flood_scale_var_1, flood_scale_var_2, flood = self.scale_img(
-                flood, valid_mask, "flood", activation
-            )
-            pre1_scale_var_1, pre1_scale_var_2, pre_event_1 = self.scale_img(
-                pre_event_1, valid_mask, "pre1", activation
-            )
-            pre2_scale_var_1, pre2_scale_var_2, pre_event_2 = self.scale_img(
-                pre_event_2, valid_mask, "pre2", activation
-            )
+            if "post_event" in acquisitions:
+                _, _, flood = self.scale_img(flood, valid_mask, "flood", activation)
+            if "pre_event_1" in acquisitions:
+                _, _, pre_event_1 = self.scale_img(pre_event_1, valid_mask, "pre1", activation)
+            if "pre_event_2" in acquisitions:
+                _, _, pre_event_2 = self.scale_img(pre_event_2, valid_mask, "pre2", activation)
+
+        masks = (mask,)
+        if self.return_valid_mask:
+            masks = (mask, (valid_mask != 0).to(torch.uint8))
 
         if not self.configs["dem"]:
-            if self.configs["scale_input"] is not None:
-                return (
-                    flood_scale_var_1,
-                    flood_scale_var_2,
-                    flood,
-                    mask,
-                    pre1_scale_var_1,
-                    pre1_scale_var_2,
-                    pre_event_1,
-                    pre2_scale_var_1,
-                    pre2_scale_var_2,
-                    pre_event_2,
-                    clz,
-                    activation,
-                )
-            else:
-                return flood, mask, pre_event_1, pre_event_2, clz, activation
+            return (flood, *masks, pre_event_1, pre_event_2, clz, activation)
         else:
-            if self.configs["scale_input"] is not None:
-                return (
-                    flood_scale_var_1,
-                    flood_scale_var_2,
-                    flood,
-                    mask,
-                    pre1_scale_var_1,
-                    pre1_scale_var_2,
-                    pre_event_1,
-                    pre2_scale_var_1,
-                    pre2_scale_var_2,
-                    pre_event_2,
-                    dem,
-                    clz,
-                    activation,
-                )
-            else:
-                return flood, mask, pre_event_1, pre_event_2, dem, clz, activation
+            return (flood, *masks, pre_event_1, pre_event_2, dem, clz, activation)
 
 
-# Dataset class for SSL MAE training
-class SSLDataset(torch.utils.data.Dataset):
+# Inputs of SSL MAE training, shared by the folder and shard datasets
+class SSLSamples:
     def __init__(self, configs=None):
-        resized_crop = A.augmentations.RandomResizedCrop(
-            height=224, width=224, p=1.0, scale=(0.2, 1.0), interpolation=3
-        )
+        resized_crop = A.augmentations.RandomResizedCrop(height=224, width=224, p=1.0, scale=(0.2, 1.0), interpolation=3)
         flip = A.augmentations.HorizontalFlip(p=0.5)
         self.augmentations = A.Compose([resized_crop, flip])
-        self.root_path = os.path.join(configs["root_path"], "data")
         self.configs = configs
+
+    def concat(self, image1, image2):
+        image1_exp = np.expand_dims(image1, 0)  # vv
+        image2_exp = np.expand_dims(image2, 0)  # vh
+
+        if set(self.configs["channels"]) == set(["vv", "vh", "vh/vv"]):
+            eps = 1e-7
+            image = np.vstack((image1_exp, image2_exp, image2_exp / (image1_exp + eps)))  # vv, vh, vh/vv
+        elif set(self.configs["channels"]) == set(["vv", "vh"]):
+            image = np.vstack((image1_exp, image2_exp))  # vv, vh
+        elif self.configs["channels"] == ["vh"]:
+            image = image2_exp  # vh
+
+        image = torch.from_numpy(image).float()
+
+        if self.configs["clamp_input"] is not None:
+            image = torch.clamp(image, min=0.0, max=self.configs["clamp_input"])
+            image = torch.nan_to_num(image, self.configs["clamp_input"])
+        else:
+            image = torch.nan_to_num(image, 200)
+        return image
+
+    def build_sample(self, flood_vv, flood_vh, sec1_vv, sec1_vh, sec2_vv, sec2_vh):
+        # Concat channels
+        flood = self.concat(flood_vv, flood_vh)
+        pre_event_1 = self.concat(sec1_vv, sec1_vh)
+        pre_event_2 = self.concat(sec2_vv, sec2_vh)
+
+        # Hardcoded mean and std for all of Kuro Siwo (labeled + unlabeled part)
+        mean = torch.tensor([0.0953, 0.0264])
+        std = torch.tensor([0.0427, 0.0215])
+
+        normalize = torchvision.transforms.Normalize(mean, std)
+        flood = normalize(flood)
+        pre_event_1 = normalize(pre_event_1)
+        pre_event_2 = normalize(pre_event_2)
+
+        image = torch.cat((flood, pre_event_1, pre_event_2), dim=0)
+        image = einops.rearrange(image, "c h w -> h w c").numpy()
+        transform = self.augmentations(image=image)
+        image = transform["image"]
+        image = einops.rearrange(image, "h w c -> c h w")
+        image = torch.from_numpy(image)
+        return image, flood, pre_event_1, pre_event_2
+
+
+# Dataset class for SSL MAE training
+class SSLDataset(SSLSamples, torch.utils.data.Dataset):
+    def __init__(self, configs=None):
+        super().__init__(configs)
+        self.root_path = os.path.join(configs["root_path"], "data")
         self.samples = []
-        events = os.listdir(self.root_path)
-        if not os.path.isfile("ssl_samples.pkl"):
+        # Grid folders are read from their batch archives when a tar store is set
+        self.tar_store = open_tar_store(configs)
+        if self.tar_store is not None:
+            self.samples = self.tar_store.folders(prefix="MS1_IVV")
+        elif not os.path.isfile("ssl_samples.pkl"):
+            events = os.listdir(self.root_path)
             for event in tqdm(events):
                 folder_dir = os.path.join(self.root_path, event)
                 folders = os.listdir(folder_dir)
@@ -929,9 +557,7 @@ class SSLDataset(torch.utils.data.Dataset):
                         for hash_folder in hashes:
                             hash_folder_dir = os.path.join(hashes_dir, hash_folder)
                             if os.path.isfile(hash_folder_dir):
-                                self.samples.append(
-                                    os.path.join(subfolder_dir, subfolder)
-                                )
+                                self.samples.append(os.path.join(subfolder_dir, subfolder))
                             else:
                                 self.samples.append(hash_folder_dir)
             with open("ssl_samples.pkl", "wb") as file:
@@ -945,91 +571,140 @@ class SSLDataset(torch.utils.data.Dataset):
     def __len__(self):
         return self.num_examples
 
-    def concat(self, image1, image2):
-        image1_exp = np.expand_dims(image1, 0)  # vv
-        image2_exp = np.expand_dims(image2, 0)  # vh
-
-        if set(self.configs["channels"]) == set(["vv", "vh", "vh/vv"]):
-            eps = 1e-7
-            image = np.vstack(
-                (image1_exp, image2_exp, image2_exp / (image1_exp + eps))
-            )  # vv, vh, vh/vv
-        elif set(self.configs["channels"]) == set(["vv", "vh"]):
-            image = np.vstack((image1_exp, image2_exp))  # vv, vh
-        elif self.configs["channels"] == ["vh"]:
-            image = image2_exp  # vh
-
-        image = torch.from_numpy(image).float()
-
-        if self.configs["clamp_input"] is not None:
-            image = torch.clamp(image, min=0.0, max=self.configs["clamp_input"])
-            image = torch.nan_to_num(image, self.configs["clamp_input"])
-        else:
-            image = torch.nan_to_num(image, 200)
-        return image
-
     def __getitem__(self, index):
         path = self.samples[index]
 
-        files = os.listdir(path)
-        for file in files:
-            current_path = os.path.join(path, file)
+        if self.tar_store is not None:
+            files = self.tar_store.folder_files(path)
+        else:
+            files = {file: os.path.join(path, file) for file in os.listdir(path)}
+        for file, current_path in files.items():
             if "xml" not in file:
                 if file.startswith("MS1_IVV"):
                     # Get master ivv channel
-                    flood_vv = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
+                    flood_vv = read_tile(current_path)
 
                     if flood_vv is None:
                         print(current_path)
 
                 elif file.startswith("MS1_IVH"):
                     # Get master ivh channel
-                    flood_vh = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
+                    flood_vh = read_tile(current_path)
 
                 elif file.startswith("SL1_IVV"):
                     # Get slave1 vv channel
-                    sec1_vv = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
+                    sec1_vv = read_tile(current_path)
 
                 elif file.startswith("SL1_IVH"):
                     # Get sl1 vh channel
-                    sec1_vh = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
+                    sec1_vh = read_tile(current_path)
 
                 elif file.startswith("SL2_IVV"):
                     # Get sl2 vv channel
-                    sec2_vv = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
+                    sec2_vv = read_tile(current_path)
 
                 elif file.startswith("SL2_IVH"):
                     # Get sl2 vh channel
-                    sec2_vh = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
+                    sec2_vh = read_tile(current_path)
 
-        # Concat channels
-        flood = self.concat(flood_vv, flood_vh)
-        pre_event_1 = self.concat(sec1_vv, sec1_vh)
-        pre_event_2 = self.concat(sec2_vv, sec2_vh)
+        return self.build_sample(flood_vv, flood_vh, sec1_vv, sec1_vh, sec2_vv, sec2_vh)
 
-        # Hardcoded mean and std for all of Kuro Siwo (labeled + unlabeled part)
-        mean = torch.tensor([0.0953, 0.0264])
-        std = torch.tensor([0.0427, 0.0215])
 
-        normalize = torchvision.transforms.Normalize(mean, std)
-        flood = normalize(flood)
-        pre_event_1 = normalize(pre_event_1)
-        pre_event_2 = normalize(pre_event_2)
+# Streaming dataset for SSL MAE training over the shards of dataset.ssl_shards. An
+# epoch yields configs["num_samples_per_epoch"] samples, split across the workers,
+# the shards are cycled through as often as that takes.
+class ShardedSSLDataset(SSLSamples, torch.utils.data.IterableDataset):
+    def __init__(self, configs=None):
+        super().__init__(configs)
+        self.shard_path = Path(configs["ssl_shards"])
+        index = load_shard_index(self.shard_path)
+        self.shards = [(shard["file"], shard["grids"]) for shard in index["shards"]]
+        self.num_examples = index["grids"]
+        if self.num_examples == 0:
+            print("SSL shards in: ", self.shard_path, " hold no grids!")
+            exit(2)
+        self.samples_per_epoch = configs["num_samples_per_epoch"]
+        self.buffer_size = max(configs.get("ssl_shuffle_buffer", 1024), 1)
+        # Shared by all workers so that they agree on the shard order of an epoch
+        self.seed = int(torch.empty((), dtype=torch.int64).random_().item())
+        self.epoch = 0
+        print("SSL shards: ", len(self.shards), " grids: ", self.num_examples)
 
-        image = torch.cat((flood, pre_event_1, pre_event_2), dim=0)
-        image = einops.rearrange(image, "c h w -> h w c").numpy()
-        transform = self.augmentations(image=image)
-        image = transform["image"]
-        image = einops.rearrange(image, "h w c -> c h w")
-        image = torch.from_numpy(image)
-        return image, flood, pre_event_1, pre_event_2
+    def __len__(self):
+        return self.samples_per_epoch
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def worker_ranges(self, worker, num_workers, cycle):
+        # Contiguous row ranges of the shards read by a worker, shards are split when
+        # there are fewer of them than workers but never into empty ranges. With fewer
+        # ranges than workers, workers share ranges so that none is left without rows
+        parts = -(-num_workers // len(self.shards))
+        units = []
+        for file, grids in self.shards:
+            shard_parts = min(parts, grids)
+            for part in range(shard_parts):
+                units.append((file, part * grids // shard_parts, (part + 1) * grids // shard_parts))
+        if not units:
+            return
+        order = np.random.default_rng((self.seed, self.epoch, cycle)).permutation(len(units))
+        for unit in order[worker % len(units) :: num_workers].tolist():
+            yield units[unit]
+
+    def stream(self, worker, num_workers):
+        # Sequential reads over the shards of a worker, cycling through them until
+        # the worker has yielded its samples of the epoch
+        for cycle in itertools.count():
+            ranges = list(self.worker_ranges(worker, num_workers, cycle))
+            if not ranges:
+                return
+            for file, start, end in ranges:
+                sar = np.load(self.shard_path / file, mmap_mode="r")
+                for row in range(start, end):
+                    yield np.array(sar[row])
+
+    def __iter__(self):
+        worker_info = torch.utils.data.get_worker_info()
+        worker, num_workers = (0, 1)
+        if worker_info is not None:
+            worker, num_workers = worker_info.id, worker_info.num_workers
+        rng = np.random.default_rng((self.seed, self.epoch, worker))
+        samples = self.samples_per_epoch // num_workers
+        samples += int(worker < self.samples_per_epoch % num_workers)
+        if samples == 0:
+            return
+
+        # Rows stream through a shuffle buffer, each step yielding a random buffered
+        # grid and buffering the next one
+        buffer = []
+        for tiles in self.stream(worker, num_workers):
+            if len(buffer) < self.buffer_size:
+                buffer.append(tiles)
+                continue
+            slot = int(rng.integers(len(buffer)))
+            sample, buffer[slot] = buffer[slot], tiles
+            yield self.build_sample(*sample)
+            samples -= 1
+            if samples == 0:
+                return
+
+
+def read_mask(path):
+    return cv.imread(path, cv.IMREAD_ANYDEPTH)
+
+
+def slc_to_uint8(image):
+    image /= image.max()
+    image *= 255
+    return image.astype(np.uint8)
 
 
 class SLCDataset(torch.utils.data.Dataset):
     def __init__(self, mode="train", configs=None):
-        print('='*20)
-        print('Initializing SLC Dataset')
-        print('='*20)
+        print("=" * 20)
+        print("Initializing SLC Dataset")
+        print("=" * 20)
         self.train_acts = configs["train_acts"]
         self.val_acts = configs["val_acts"]
         self.test_acts = configs["test_acts"]
@@ -1059,8 +734,6 @@ class SLCDataset(torch.utils.data.Dataset):
 
         self.negative_grids = None
         total_grids = {}
-        self.positive_records = []
-        self.negative_records = []
 
         self.grids = json.load(open(self.pickle_path, "r"))  # get_grids(pickle_path=self.pickle_path)
         total_grids = self.grids
@@ -1069,14 +742,9 @@ class SLCDataset(torch.utils.data.Dataset):
         all_activations.extend(self.train_acts)
         all_activations.extend(self.val_acts)
         all_activations.extend(self.test_acts)
-        self.records = []
+        records = RecordTableBuilder()
         for key in total_grids:
-            record = {}
-            record["id"] = key
-            record["path"] = total_grids[key]["path"]
-
-            record["type"] = None
-            record["clz"] = total_grids[key]["clz"]
+            clz = total_grids[key]["clz"]
             activation = total_grids[key]["actid"]
             aoi = total_grids[key]["aoiid"]
             if configs["track"] == "Climatic":
@@ -1084,9 +752,8 @@ class SLCDataset(torch.utils.data.Dataset):
             else:
                 act_aoi = activation
 
-            record["activation"] = activation
             if act_aoi in self.valid_acts:
-                self.clz_stats[record["clz"]] += 1
+                self.clz_stats[clz] += 1
                 if act_aoi in self.act_stats:
                     self.act_stats[act_aoi] += 1
                 else:
@@ -1095,40 +762,77 @@ class SLCDataset(torch.utils.data.Dataset):
                     # We will create a separate record per observation (pre1, pre2, flood) in order to
                     # ensure that the model will see every image during an epoch
                     # This will also allow us to compute appropriate weights for the loss functions
-                    for t in ["pre1", "pre2", "flood"]:
-                        tmp = record.copy()
-                        tmp["type"] = t
-                        self.records.append(tmp)
-                        if key in self.grids:
-                            self.positive_records.append(tmp)
-                        else:
-                            self.negative_records.append(tmp)
+                    record_types = ["pre1", "pre2", "flood"]
                 else:
-                    self.records.append(record)
-                    if key in self.grids:
-                        self.positive_records.append(record)
-                    else:
-                        self.negative_records.append(record)
+                    record_types = [None]
+                for t in record_types:
+                    records.append(
+                        key,
+                        total_grids[key]["path"],
+                        clz,
+                        activation,
+                        positive=key in self.grids,
+                        record_type=t,
+                    )
 
             if act_aoi not in all_activations and act_aoi not in self.non_valids:
                 print("Activation: ", activation, " not in Activations")
                 self.non_valids.append(act_aoi)
 
+        self.records = records.build()
+
         print("Samples per Climatic zone for mode: ", self.mode)
         print(self.clz_stats)
         print("Samples per Activation for mode: ", self.mode)
         print(self.act_stats)
         self.num_examples = len(self.records)
-        self.activations = set([record["activation"] for record in self.records])
+        self.activations = self.records.activations()
+
+        # SLC inputs only support standardization, applied to whole batches in the
+        # training loop through this lookup
+        self.scale_lookup = None
+        if self.configs["scale_input"] == "normalize":
+            self.scale_lookup = build_scale_lookup(self.configs, self.activations, mean_key="slc_mean", std_key="slc_std")
+
+        split = "slc_train" if self.mode == "train" else "slc_test"
+        self.terrain_stores = []
+        if self.configs["dem"] and self.configs.get("terrain_store") is not None:
+            if TerrainStore.exists(self.configs["terrain_store"], split):
+                self.terrain_stores.append(TerrainStore(self.configs["terrain_store"], split))
+            else:
+                print("No precomputed terrain for split: ", split, " reading DEM files instead")
+
+        # File reads of a sample are issued concurrently by every loader worker
+        self.read_pool = ReadPool(self.configs.get("read_threads", 0))
+        # Rasters are read as plain arrays through handles kept open by every worker
+        self.raster_reader = RasterReader(self.configs.get("slc_open_files", 64))
 
     def __len__(self):
         return self.num_examples
 
-    def normalize(self, image):
-        means = self.configs["slc_mean"]
-        stds = self.configs["slc_std"]
+    def read_terrain(self, dem_path, layers):
+        dem, nodata = self.raster_reader.read_with_nodata(dem_path)
+        return slc_gap_terrain(dem, nodata, dem_path, layers)
 
-        return means, stds, torchvision.transforms.Normalize(means, stds)(image)
+    def scale_dem(self, terrain):
+        if not self.configs["slope"]:
+            dem = terrain["dem"]
+            if self.configs["scale_input"] is not None:
+                normalization = transforms.Normalize(
+                    mean=self.configs["slc_dem_mean"],
+                    std=self.configs["slc_dem_std"],
+                )
+                dem = normalization(torch.from_numpy(dem))
+        else:
+            dem = terrain["slope"]
+            if self.configs["scale_input"] is not None:
+                # Only support standarization for DEMs
+                normalization = transforms.Normalize(
+                    mean=self.configs["slc_slope_mean"],
+                    std=self.configs["slc_slope_std"],
+                )
+                dem = normalization(torch.from_numpy(dem))
+        return dem
 
     def __getitem__(self, idx):
         sample = self.records[idx]
@@ -1140,100 +844,78 @@ class SLCDataset(torch.utils.data.Dataset):
         activation = sample["activation"]
         mask = None
 
+        # Gap-filled DEM and slope come from the terrain store when precomputed
+        terrain = None
+        for terrain_store in self.terrain_stores:
+            if sample["id"] in terrain_store:
+                terrain = terrain_store.read(sample["id"])
+                break
+
+        # Files are collected first and read concurrently, see self.read_pool
+        reads = {}
         for file in files:
             current_path = str(os.path.join(path, file))
             if "xml" not in file:
                 if file.startswith("MK0_MLU") and (sample["type"] is None):
                     # Get mask of flooded/perm water pixels
-                    mask = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
+                    reads["mask"] = (read_mask, current_path)
                 elif file.startswith("MK0_MNA") and (sample["type"] is None):
                     # Get mask of valid pixels
-                    valid_mask = cv.imread(current_path, cv.IMREAD_ANYDEPTH)
+                    reads["valid_mask"] = (read_mask, current_path)
                 elif file.startswith("MS1"):
                     # Get master ivv channel
-                    flood = rio.open_rasterio(current_path).to_numpy()  # cv.imread(current_path, cv.IMREAD_ANYDEPTH)
-                    if self.configs["uint8"]:
-                        flood /= flood.max()
-                        flood *= 255
-                        flood = flood.astype(np.uint8)
-                    if flood is None:
-                        print(current_path)
-
+                    reads["flood"] = (self.raster_reader.read, current_path)
                 elif file.startswith("SL1"):
                     # Get slave1 vv channel
-                    sec1 = rio.open_rasterio(current_path).to_numpy()
-                    if self.configs["uint8"]:
-                        sec1 /= sec1.max()
-                        sec1 *= 255
-                        sec1 = sec1.astype(np.uint8)
-
+                    reads["sec1"] = (self.raster_reader.read, current_path)
                 elif file.startswith("SL2") and (sample["type"] not in ["flood", "pre1"]):
                     # Get sl2 vv channel
-                    sec2 = rio.open_rasterio(current_path).to_numpy()
-                    if self.configs["uint8"]:
-                        sec2 /= sec2.max()
-                        sec2 *= 255
-                        sec2 = sec2.astype(np.uint8)
-                elif file.startswith("MK0_DEM"):
-                    # Get DEM
-                    dem = rio.open_rasterio(current_path)
-
-                    # NOTE: Nodata values are not NaN but a rather high float number
-                    # Here we convert the nodata value to NaN and interpolate
-                    nodata = dem.rio.nodata
-                    dem_arr = dem.to_numpy()
-                    nans = dem == nodata
-                    if nans.any().item():
-                        dem_arr[nans] = np.nan
-                        dem[:] = dem_arr
-
-                    dem = dem.rio.write_nodata(np.nan)
-                    dem = dem.rio.interpolate_na()
-
-                    dem = dem.to_numpy()
-
-                    if self.configs['dem'] and not self.configs['slope']:
-                        if self.configs["scale_input"] is not None:
-                            normalization = transforms.Normalize(
-                                mean=self.configs["slc_dem_mean"],
-                                std=self.configs["slc_dem_std"],
-                            )
-                            dem = normalization(torch.from_numpy(dem))
-                    elif self.configs['dem'] and self.configs['slope']:
-                        # Get slope
-                        rd_dem = rd.rdarray(dem.squeeze(), no_data=nodata)
-                        slope = rd.TerrainAttribute(rd_dem, attrib="slope_riserun")
-                        slope = np.asarray(slope.data)
-                        dem = einops.rearrange(slope, "h w -> 1 h w")
-
-                        if self.configs["scale_input"] is not None:
-                            # Only support standarization for DEMs
-                            normalization = transforms.Normalize(
-                                mean=self.configs["slc_slope_mean"],
-                                std=self.configs["slc_slope_std"],
-                            )
-                            dem = normalization(torch.from_numpy(dem))
+                    reads["sec2"] = (self.raster_reader.read, current_path)
+                elif file.startswith("MK0_DEM") and self.configs["dem"] and terrain is None:
+                    # Get gap-filled DEM and slope
+                    layers = ("dem", "slope") if self.configs["slope"] else ("dem",)
+                    reads["terrain"] = (partial(self.read_terrain, layers=layers), current_path)
+
+        arrays = dict(zip(reads, self.read_pool.map(lambda read: read[0](read[1]), list(reads.values()))))
+        mask = arrays.get("mask")
+        valid_mask = arrays.get("valid_mask")
+        terrain = arrays.get("terrain", terrain)
+        flood = arrays.get("flood")
+        sec1 = arrays.get("sec1")
+        sec2 = arrays.get("sec2")
+        if "flood" in reads and flood is None:
+            print(reads["flood"][1])
+        if self.configs["uint8"]:
+            flood, sec1, sec2 = [None if image is None else slc_to_uint8(image) for image in (flood, sec1, sec2)]
+
+        if self.configs["dem"]:
+            dem = self.scale_dem(terrain)
+
         try:
-            if flood.shape!= (4,224,224) or sec1.shape!= (4,224,224) or sec2.shape!= (4,224,224):
-                #pad using albumentations
-                pad = A.Compose([A.PadIfNeeded(
-                    min_height=224,  # Optional[int]
-                    min_width=224,  # Optional[int]
-                    border_mode=cv.BORDER_CONSTANT,  # int
-                    value=int(flood.mean()),  # Union[float, Sequence[float], NoneType]
-                    mask_value=3,  # Union[float, Sequence[float], NoneType]
-                    p=1.0,  # float
-                )])
-                flood = einops.rearrange(flood,"c h w -> h w c")
-                sec1 = einops.rearrange(sec1,"c h w -> h w c")
-                sec2 = einops.rearrange(sec2,"c h w -> h w c")
+            if flood.shape != (4, 224, 224) or sec1.shape != (4, 224, 224) or sec2.shape != (4, 224, 224):
+                # pad using albumentations
+                pad = A.Compose(
+                    [
+                        A.PadIfNeeded(
+                            min_height=224,  # Optional[int]
+                            min_width=224,  # Optional[int]
+                            border_mode=cv.BORDER_CONSTANT,  # int
+                            value=int(flood.mean()),  # Union[float, Sequence[float], NoneType]
+                            mask_value=3,  # Union[float, Sequence[float], NoneType]
+                            p=1.0,  # float
+                        )
+                    ]
+                )
+                flood = einops.rearrange(flood, "c h w -> h w c")
+                sec1 = einops.rearrange(sec1, "c h w -> h w c")
+                sec2 = einops.rearrange(sec2, "c h w -> h w c")
 
                 try:
-                    transform = pad(image=flood,mask=mask)
+                    transform = pad(image=flood, mask=mask)
                 except Exception as e:
                     print(e)
-                    print(sample['path'])
-                    print(flood.shape,sec1.shape,sec2.shape,mask.shape,flush=True)
+                    print(sample["path"])
+                    print(flood.shape, sec1.shape, sec2.shape, mask.shape, flush=True)
                     exit(2)
 
                 flood = transform["image"]
@@ -1244,30 +926,23 @@ class SLCDataset(torch.utils.data.Dataset):
                 sec1 = transform["image"]
                 transform = pad(image=sec2)
                 sec2 = transform["image"]
-                flood = einops.rearrange(flood,"h w c -> c h w")
-                sec1 = einops.rearrange(sec1,"h w c -> c h w")
-                sec2 = einops.rearrange(sec2,"h w c -> c h w")
+                flood = einops.rearrange(flood, "h w c -> c h w")
+                sec1 = einops.rearrange(sec1, "h w c -> c h w")
+                sec2 = einops.rearrange(sec2, "h w c -> c h w")
         except:
-            print(sample['path'])
+            print(sample["path"])
 
-        if self.configs['scale_input'] == "normalize":
+        if self.configs["scale_input"] == "normalize":
+            # Standardization itself is applied to the batch, see self.scale_lookup
             flood = torch.from_numpy(flood).float()
             sec1 = torch.from_numpy(sec1).float()
             sec2 = torch.from_numpy(sec2).float()
             mask = torch.from_numpy(mask).long()
-            sc_mean, scale_stdf , flood = self.normalize(flood)
-            sc1, sc_std1 , sec1 = self.normalize(sec1)
-            sc2, sc_std2, sec2 = self.normalize(sec2)
 
-            if not self.configs["dem"]:
-                return sc_mean, scale_stdf, flood, mask, sc1, sc_std1, sec1, sc2, sc_std2, sec2, clz, activation
-            else:
-                return sc_mean, scale_stdf, flood, mask, sc1, sc_std1, sec1, sc2, sc_std2, sec2, dem, clz, activation
+        if not self.configs["dem"]:
+            return flood, mask, sec1, sec2, clz, activation
         else:
-            if not self.configs["dem"]:
-                return flood, mask, sec1, sec2, clz, activation
-            else:
-                return flood, mask, sec1, sec2, dem, clz, activation
+            return flood, mask, sec1, sec2, dem, clz, activation
 
 
 if __name__ == "__main__":
@@ -1278,4 +953,4 @@ if __name__ == "__main__":
         "clamp_input": 0.15,
     }
     a = SSLDataset(configs=configs)
-    a.__getitem__(0)
\ No newline at end of file
+    a.__getitem__(0)
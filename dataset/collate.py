@@ -0,0 +1,189 @@
+import torch
+from torch.utils.data import default_collate, get_worker_info
+
+# Acquisitions of a Dataset / SLCDataset sample and their scaling names
+ACQUISITIONS = {"post_event": "flood", "pre_event_1": "pre1", "pre_event_2": "pre2"}
+
+
+def sample_fields(configs, valid_mask=False):
+    # Fields of a Dataset / SLCDataset sample tuple, in order. Train samples of the
+    # batch augmentation engine carry the valid pixel mask after the mask.
+    masks = ("mask", "valid_mask") if valid_mask else ("mask",)
+    if configs["dem"]:
+        return ("post_event",) + masks + ("pre_event_1", "pre_event_2", "dem", "clz", "activation")
+    return ("post_event",) + masks + ("pre_event_1", "pre_event_2", "clz", "activation")
+
+
+def input_layout(configs):
+    """
+    Frames of the model input of the configured trainer, every frame being the sample
+    fields concatenated along channels. Returns (frames, temporal), a temporal input
+    stacks its frames as [B, T, C, H, W], otherwise the single frame is [B, C, H, W]:
+
+        segmentation    post-event (+DEM) and pre-event images concatenated, or the
+                        (pre2, pre1, post) frames of the vivit/convlstm architectures
+        cd / convlstm   a frame per configs["inputs"] entry, each with the DEM
+    """
+    dem = ["dem"] if configs["dem"] else []
+    inputs = configs["inputs"]
+    if configs["task"] == "cd" or configs["method"] == "convlstm":
+        return [[acquisition] + dem for acquisition in inputs], True
+
+    # Same precedence as the input branches of the segmentation trainer
+    if inputs == ["post_event"]:
+        return [["post_event"] + dem], False
+    if set(inputs) == set(["pre_event_1", "post_event"]):
+        return [["post_event"] + dem + ["pre_event_1"]], False
+    if set(inputs) == set(["pre_event_2", "post_event"]):
+        return [["post_event"] + dem + ["pre_event_2"]], False
+    if configs.get("architecture") in ["vivit", "convlstm"]:
+        return [["pre_event_2"], ["pre_event_1"], ["post_event"] + dem], True
+    if set(inputs) == set(["pre_event_1", "pre_event_2", "post_event"]):
+        return [["post_event"] + dem + ["pre_event_1", "pre_event_2"]], False
+    print('Invalid configuration for "inputs". Exiting...')
+    exit(1)
+
+
+def empty_batch(shape, dtype):
+    if get_worker_info() is not None:
+        # Built in shared memory, so that it is sent to the main process without a copy
+        return torch.empty(shape, dtype=dtype).share_memory_()
+    # Built in page-locked memory, so that the DataLoader does not pin a copy of it
+    return torch.empty(shape, dtype=dtype, pin_memory=torch.cuda.is_available())
+
+
+class InputBatch:
+    """
+    Batch of a Dataset / SLCDataset loader with its acquisitions already laid out as
+    the model input, moved to the device in a single copy. `slots` maps every field
+    of the input to its (frame, first channel, channels) locations. `valid` holds the
+    valid pixel masks of batches collated for the batch augmentation engine.
+    """
+
+    def __init__(self, inputs, mask, clz, activation, slots, temporal, valid=None):
+        self.inputs = inputs
+        self.mask = mask
+        self.clz = clz
+        self.activation = activation
+        self.slots = slots
+        self.temporal = temporal
+        self.valid = valid
+
+    def tensors(self):
+        return (self.inputs, self.mask, self.clz, self.activation, self.valid)
+
+    def rebuild(self, tensors):
+        inputs, mask, clz, activation, valid = tensors
+        return InputBatch(inputs, mask, clz, activation, self.slots, self.temporal, valid)
+
+    def pin_memory(self):
+        # Called by the pinning thread of the DataLoader, batches built in the main
+        # process are pinned already
+        return self.rebuild(
+            None if tensor is None or tensor.is_pinned() else tensor.pin_memory() for tensor in self.tensors()
+        )
+
+    def to(self, device):
+        # The sample keys travel along, so that scaling and metrics never copy them
+        # to the device with a blocking copy
+        return self.rebuild(None if tensor is None else tensor.to(device, non_blocking=True) for tensor in self.tensors())
+
+    def frame(self, index):
+        return self.inputs[:, index] if self.temporal else self.inputs
+
+    def field(self, name):
+        # [B, C, H, W] view of a field of the inputs, without channels if not an input
+        if name not in self.slots:
+            shape = (self.inputs.shape[0], 0) + tuple(self.inputs.shape[-2:])
+            return self.inputs.new_empty(shape)
+        frame, start, channels = self.slots[name][0]
+        return self.frame(frame).narrow(1, start, channels)
+
+    def update(self, fields, mask=None):
+        """
+        Write new values of input fields (e.g. scaled or augmented acquisitions) into
+        the inputs. Fields of another spatial size, from resizing augmentations, are
+        laid out again into a new input tensor.
+        """
+        if mask is not None:
+            self.mask = mask
+        spatial = tuple(self.inputs.shape[-2:])
+        if all(tuple(value.shape[-2:]) == spatial for value in fields.values()):
+            for name, value in fields.items():
+                for frame, start, channels in self.slots.get(name, []):
+                    self.frame(frame).narrow(1, start, channels).copy_(value)
+            return
+
+        values = {name: self.field(name) for name in self.slots}
+        values.update(fields)
+        frames = [[] for _ in range(self.inputs.shape[1] if self.temporal else 1)]
+        for name, locations in self.slots.items():
+            for frame, start, _ in locations:
+                frames[frame].append((start, values[name]))
+        frames = [torch.cat([value for _, value in sorted(frame, key=lambda s: s[0])], dim=1) for frame in frames]
+        self.inputs = torch.stack(frames, dim=1) if self.temporal else frames[0]
+
+
+class InputCollate:
+    """
+    Collates Dataset / SLCDataset samples straight into a preallocated batch tensor in
+    the input layout of the configured trainer (see `input_layout`), replacing the
+    field-by-field stacking of `default_collate` and the concatenations of the
+    trainers. Records returning a single acquisition are collated as before.
+    """
+
+    def __init__(self, configs, valid_mask=False):
+        self.fields = sample_fields(configs, valid_mask)
+        self.valid_mask = valid_mask
+        self.frames, self.temporal = input_layout(configs)
+
+    def slots(self, sample):
+        channels = {name: sample[name].shape[0] for name in self.fields[:-2]}
+        slots = {}
+        widths = []
+        for index, frame in enumerate(self.frames):
+            start = 0
+            for name in frame:
+                slots.setdefault(name, []).append((index, start, channels[name]))
+                start += channels[name]
+            widths.append(start)
+        if self.temporal and len(set(widths)) > 1:
+            print("Frames of a temporal input need the same channels, got: ", widths)
+            exit(2)
+        return slots, widths[0]
+
+    def __call__(self, samples):
+        if not isinstance(samples[0], tuple) or len(samples[0]) != len(self.fields):
+            return default_collate(samples)
+
+        # Arrays of SLCDataset samples are read in place as tensors
+        samples = [
+            {
+                name: value if name in ["clz", "activation"] else torch.as_tensor(value)
+                for name, value in zip(self.fields, sample)
+            }
+            for sample in samples
+        ]
+        slots, channels = self.slots(samples[0])
+        spatial = tuple(samples[0]["mask"].shape[-2:])
+        shape = (len(samples), channels) + spatial
+        if self.temporal:
+            shape = (len(samples), len(self.frames), channels) + spatial
+
+        inputs = empty_batch(shape, torch.float32)
+        mask = empty_batch((len(samples),) + spatial, torch.long)
+        valid = None
+        if self.valid_mask:
+            valid = empty_batch((len(samples),) + spatial, torch.uint8)
+        for i, sample in enumerate(samples):
+            for name, locations in slots.items():
+                for frame, start, width in locations:
+                    target = inputs[i, frame] if self.temporal else inputs[i]
+                    target.narrow(0, start, width).copy_(sample[name])
+            mask[i].copy_(sample["mask"])
+            if valid is not None:
+                valid[i].copy_(sample["valid_mask"])
+
+        clz = default_collate([sample["clz"] for sample in samples])
+        activation = default_collate([sample["activation"] for sample in samples])
+        return InputBatch(inputs, mask, clz, activation, slots, self.temporal, valid)
@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+
+import dataset.stats as stats
+from dataset.manifest import get_grids, load_manifest
+from dataset.scaling import build_scale_lookup
+from dataset.tar_store import open_tar_store
+from dataset.terrain import TerrainStore
+from dataset.tile_cache import SharedTileCache
+from dataset.tile_store import PackedTileStore
+
+
+class DatasetIndex:
+    """
+    Grids, file manifests, min-max stats and stores of the GRD splits, loaded once and
+    shared by the `Dataset` split views built on top of it. Grid pickles and stores are
+    loaded on first use, so a view only pays for the pickles of its own split.
+    """
+
+    def __init__(self, configs):
+        self.configs = configs
+        self.root_path = os.path.join(configs["root_path"], "data")
+        self.all_activations = configs["train_acts"] + configs["val_acts"] + configs["test_acts"]
+
+        # Load precomputed min-max stats for each SAR image or calculate them anew
+        self.min_max_stats = stats.get_min_max_stats(configs, self.root_path)
+
+        # Affine scalings are applied to whole batches in the training loop through
+        # this lookup (see utilities.scale_img), only "custom" scaling runs per sample
+        self.scale_lookup = build_scale_lookup(configs, self.min_max_stats.keys(), self.min_max_stats)
+
+        # Tiles decoded from grid folders are kept in memory shared by all workers
+        self.tile_cache = None
+        if configs.get("tile_cache_bytes"):
+            self.tile_cache = SharedTileCache(configs["tile_cache_bytes"])
+
+        # Product files of the grids of every loaded pickle, keyed by grid id
+        self.manifest = {}
+        self.non_valids = []
+        self.grids = {}
+        self.tile_stores = {}
+        self.terrain_stores = {}
+
+    def load_grids(self, pickle_path):
+        # GridIndex of a pickle and the activation (or activation/AOI) of its grids
+        if pickle_path not in self.grids:
+            grids = get_grids(pickle_path=pickle_path)
+            act_aoi = grids.act_aoi(self.configs["track"])
+            self.manifest.update(load_manifest(pickle_path, grids, self.root_path, open_tar_store(self.configs)))
+
+            unknown = act_aoi[~np.isin(act_aoi, self.all_activations)]
+            for act in np.unique(unknown).tolist():
+                if act not in self.non_valids:
+                    print("Activation: ", act, " not in Activations")
+                    self.non_valids.append(act)
+
+            self.grids[pickle_path] = (grids, act_aoi)
+        return self.grids[pickle_path]
+
+    def tile_store(self, split):
+        # Packed tiles of a split, None if not packed (grid folders are read instead)
+        if split not in self.tile_stores:
+            self.tile_stores[split] = None
+            if self.configs.get("tile_store") is not None:
+                if PackedTileStore.exists(self.configs["tile_store"], split):
+                    self.tile_stores[split] = PackedTileStore(self.configs["tile_store"], split)
+                else:
+                    print(
+                        "No packed tiles for split: ",
+                        split,
+                        " reading grid folders instead",
+                    )
+        return self.tile_stores[split]
+
+    def terrain_store(self, split):
+        # Precomputed terrain of a split, None if not packed (DEM files are read instead)
+        if split not in self.terrain_stores:
+            self.terrain_stores[split] = None
+            if self.configs["dem"] and self.configs.get("terrain_store") is not None:
+                if TerrainStore.exists(self.configs["terrain_store"], split):
+                    self.terrain_stores[split] = TerrainStore(self.configs["terrain_store"], split)
+                else:
+                    print(
+                        "No precomputed terrain for split: ",
+                        split,
+                        " reading DEM files instead",
+                    )
+        return self.terrain_stores[split]
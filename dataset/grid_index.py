@@ -0,0 +1,129 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+from compress_pickle import load
+
+# Columns of a grid index file, one row per grid
+COLUMNS = ("ids", "paths", "actid", "aoiid", "clz")
+
+# Stored for grids without an AOI or climatic zone
+UNKNOWN = -1
+
+
+def none_to_unknown(value):
+    return UNKNOWN if value is None else value
+
+
+class GridIndex:
+    """
+    Columnar index of the grids of a split, read from the .npz written by
+    `GridIndex.save` or converted from a grid pickle:
+
+        ids    str    grid ids
+        paths  str    grid folders, relative to the data root
+        actid  int64  activation ids
+        aoiid  int64  AOI ids (UNKNOWN when missing)
+        clz    int8   climatic zones (UNKNOWN when missing)
+
+    Iterating an index yields its grid ids, as iterating a grid pickle dict did.
+    """
+
+    def __init__(self, ids, paths, actid, aoiid, clz):
+        self.ids = ids
+        self.paths = paths
+        self.actid = actid
+        self.aoiid = aoiid
+        self.clz = clz
+        self._rows = None
+
+    @classmethod
+    def from_dict(cls, grid_dict):
+        # Index of a grid pickle as written by catalogue.py
+        keys = list(grid_dict)
+        grids = [grid_dict[key] for key in keys]
+        return cls(
+            np.array(keys, dtype=str),
+            np.array([grid["path"] for grid in grids], dtype=str),
+            np.array([grid["info"]["actid"] for grid in grids], dtype=np.int64),
+            np.array(
+                [none_to_unknown(grid["info"]["aoiid"]) for grid in grids],
+                dtype=np.int64,
+            ),
+            np.array([none_to_unknown(grid["clz"]) for grid in grids], dtype=np.int8),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(*(data[column] for column in COLUMNS))
+
+    def save(self, path):
+        with open(path, "wb") as file:
+            np.savez(file, **{column: getattr(self, column) for column in COLUMNS})
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __contains__(self, grid_id):
+        if self._rows is None:
+            self._rows = {key: row for row, key in enumerate(self.ids.tolist())}
+        return grid_id in self._rows
+
+    def take(self, rows):
+        return GridIndex(*(getattr(self, column)[rows] for column in COLUMNS))
+
+    @staticmethod
+    def concat(indices):
+        # Grids of all indices merged as dict.update merges grid pickles: a grid id
+        # listed twice keeps its first position and the values of its last occurrence
+        merged = GridIndex(*(np.concatenate([getattr(index, column) for index in indices]) for column in COLUMNS))
+        _, first = np.unique(merged.ids, return_index=True)
+        _, last = np.unique(merged.ids[::-1], return_index=True)
+        last = len(merged) - 1 - last
+        return merged.take(last[np.argsort(first)])
+
+    def act_aoi(self, track):
+        # Activation of every grid as listed in the configs, "<actid>_<aoiid>" for
+        # the Climatic track
+        if track == "Climatic":
+            aoi = np.char.zfill(self.aoiid.astype(str), 2)
+            return np.char.add(np.char.add(self.actid.astype(str), "_"), aoi)
+        return self.actid
+
+    def select(self, acts, track):
+        # Boolean mask of the grids whose activation is in `acts`
+        return np.isin(self.act_aoi(track), list(acts))
+
+
+def load_grid_index(path):
+    # Grid index of an .npz index or of a (compressed) grid pickle
+    if Path(path).suffix == ".npz":
+        return GridIndex.load(path)
+    with open(path, "rb") as file:
+        return GridIndex.from_dict(load(file))
+
+
+def index_path(pickle_path):
+    # pickle/KuroV2_grid_dict.gz -> pickle/KuroV2_grid_dict.npz
+    pickle_path = Path(pickle_path)
+    return pickle_path.with_name(pickle_path.name.split(".")[0] + ".npz")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert grid pickles to columnar .npz grid indices")
+    parser.add_argument("pickles", nargs="+", help="Grid pickles to convert")
+    args = parser.parse_args()
+
+    for pickle_path in args.pickles:
+        grids = load_grid_index(pickle_path)
+        out_path = index_path(pickle_path)
+        grids.save(out_path)
+        print(f"Wrote {len(grids)} grids to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import os
+from pathlib import Path
+
+from compress_pickle import dump, load
+from tqdm import tqdm
+
+from dataset.grid_index import load_grid_index
+from dataset.tile_store import list_grid_folder, match_products
+
+# Products every GRD grid folder is expected to contain
+REQUIRED_PRODUCTS = (
+    "MS1_IVV",
+    "MS1_IVH",
+    "SL1_IVV",
+    "SL1_IVH",
+    "SL2_IVV",
+    "SL2_IVH",
+    "MK0_MLU",
+    "MK0_MNA",
+)
+
+# Grid indices loaded in this process, keyed by path, size and modification time
+_LOADED_GRIDS = {}
+
+
+def get_grids(pickle_path):
+    # GridIndex of a grid pickle or .npz index, loaded once per process
+    if not os.path.isfile(pickle_path):
+        print("Pickle file not found! ", pickle_path)
+        exit(2)
+    stat = os.stat(pickle_path)
+    key = (os.path.abspath(pickle_path), stat.st_size, stat.st_mtime)
+    if key not in _LOADED_GRIDS:
+        _LOADED_GRIDS[key] = load_grid_index(pickle_path)
+    return _LOADED_GRIDS[key]
+
+
+def find_data_path(root_path, relative_path):
+    """
+    查找数据的实际路径。数据可能存储在 00-10 的任一文件夹中。
+
+    Args:
+        root_path: 数据根目录，如 KuroSiwo/data
+        relative_path: 相对路径，如 118/01/xxx
+
+    Returns:
+        完整的绝对路径
+    """
+    # 首先尝试直接路径
+    direct_path = os.path.join(root_path, relative_path)
+    if os.path.exists(direct_path):
+        return direct_path
+
+    # 如果直接路径不存在，在 00-10 文件夹中查找
+    for folder_num in range(11):  # 00 到 10
+        folder_name = f"{folder_num:02d}"
+        test_path = os.path.join(root_path, folder_name, relative_path)
+        if os.path.exists(test_path):
+            return test_path
+
+    # 如果都找不到，返回原始路径（让后续代码报错以便调试）
+    return direct_path
+
+
+def manifest_path(pickle_path):
+    # The manifest is stored next to its grid pickle, e.g.
+    # pickle/KuroV2_grid_dict.gz -> pickle/KuroV2_grid_dict.manifest.gz
+    pickle_path = Path(pickle_path)
+    return pickle_path.with_name(pickle_path.name.split(".")[0] + ".manifest.gz")
+
+
+def manifest_header(pickle_path, root_path):
+    # A persisted manifest is only reused for the same pickle and data root
+    stat = os.stat(pickle_path)
+    return {
+        "pickle_size": stat.st_size,
+        "pickle_mtime": stat.st_mtime,
+        "root_path": os.path.abspath(root_path),
+    }
+
+
+def build_manifest(grids, root_path):
+    """
+    Resolve the batch folder of every grid in `grids` and map each grid id to the
+    absolute path of every product found in it.
+    """
+    manifest = {}
+    missing_folders = 0
+    incomplete = 0
+    for key, relative_path in tqdm(zip(grids.ids.tolist(), grids.paths.tolist()), total=len(grids)):
+        path = os.path.abspath(find_data_path(root_path, relative_path))
+        if not os.path.isdir(path):
+            missing_folders += 1
+            manifest[key] = {}
+            continue
+        manifest[key] = list_grid_folder(path)
+        if not all(product in manifest[key] for product in REQUIRED_PRODUCTS):
+            incomplete += 1
+
+    if missing_folders > 0:
+        print(f"Warning: {missing_folders} grid folders not found under {root_path}")
+    if incomplete > 0:
+        print(f"Warning: {incomplete} grid folders are missing products")
+    return manifest
+
+
+def build_tar_manifest(grids, tar_store):
+    # Map each grid id to the archive member of every product found in its folder
+    manifest = {}
+    for key, relative_path in zip(grids.ids.tolist(), grids.paths.tolist()):
+        manifest[key] = match_products(tar_store.folder_files(relative_path))
+
+    missing_folders = sum(1 for files in manifest.values() if len(files) == 0)
+    if missing_folders > 0:
+        print(f"Warning: {missing_folders} grid folders not found in the tar archives")
+    return manifest
+
+
+def load_manifest(pickle_path, grids, root_path, tar_store=None):
+    # Load the manifest persisted next to `pickle_path` or build and persist it anew,
+    # grids of a tar store are looked up in its offset index instead
+    if tar_store is not None:
+        return build_tar_manifest(grids, tar_store)
+
+    path = manifest_path(pickle_path)
+    header = manifest_header(pickle_path, root_path)
+    if path.exists():
+        with open(path, "rb") as file:
+            stored = load(file, compression="gzip")
+        if stored["header"] == header and set(stored["grids"]) == set(grids):
+            return stored["grids"]
+        print(f"Manifest {path} is stale, rebuilding...")
+
+    print(f"Building file manifest for {pickle_path}...")
+    manifest = build_manifest(grids, root_path)
+    try:
+        with open(path, "wb") as file:
+            dump({"header": header, "grids": manifest}, file, compression="gzip")
+    except OSError:
+        print(f"Could not write manifest {path}, it will be rebuilt on the next run")
+    return manifest
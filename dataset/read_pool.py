@@ -0,0 +1,46 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class ReadPool:
+    """
+    Small thread pool issuing the file reads of a sample concurrently, so that the
+    latency of a sample on network storage is close to its slowest read rather than
+    the sum of its reads. Decoders (cv.imread, rasterio) release the GIL while reading.
+
+    Every process (each DataLoader worker) lazily starts its own pool on first use,
+    with `threads` <= 1 reads run one after another in the calling thread.
+    """
+
+    def __init__(self, threads=0):
+        self.threads = threads
+        self.executor = None
+        self.pid = None
+
+    def __getstate__(self):
+        # Spawned workers start their own pool
+        state = self.__dict__.copy()
+        state["executor"] = None
+        state["pid"] = None
+        return state
+
+    def get_executor(self):
+        if self.pid != os.getpid():
+            # Threads of the parent are not running in a forked worker
+            self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="read_pool")
+            self.pid = os.getpid()
+        return self.executor
+
+    def submit(self, function, *args):
+        # Future of `function(*args)`, already done when reads are not pooled
+        if self.threads <= 1:
+            future = Future()
+            future.set_result(function(*args))
+            return future
+        return self.get_executor().submit(function, *args)
+
+    def map(self, function, items):
+        # List of `function(item)` for every item, in order
+        if self.threads <= 1 or len(items) <= 1:
+            return [function(item) for item in items]
+        return list(self.get_executor().map(function, items))
@@ -0,0 +1,118 @@
+import numpy as np
+
+# Record types of the diffusion-unsup task, stored as their index (0 is a full sample)
+RECORD_TYPES = (None, "pre1", "pre2", "flood")
+
+RECORD_DTYPE = np.dtype(
+    [
+        ("id", np.int32),  # string index of the grid id
+        ("path", np.int32),  # string index of the grid folder
+        ("type", np.int8),  # index in RECORD_TYPES
+        ("clz", np.int8),
+        ("activation", np.int16),  # index in RecordTable.activation_ids
+        ("positive", np.bool_),  # grid of the positive pickle (not oversampled negative)
+    ]
+)
+
+
+class RecordTable:
+    """
+    Read-only columnar table of dataset records. Forked DataLoader workers share its
+    few NumPy arrays, unlike lists of dicts whose pages are copied into every worker
+    as soon as their reference counts are touched:
+
+        rows            structured RECORD_DTYPE array, one row per record
+        strings         utf-8 grid ids and paths interned in one contiguous buffer
+        offsets         start of every string in `strings`, followed by the end
+        activation_ids  activation id of every activation code
+
+    Indexing returns the record as a dict with the keys of the former record dicts.
+    """
+
+    def __init__(self, rows, strings, offsets, activation_ids):
+        self.rows = rows
+        self.strings = strings
+        self.offsets = offsets
+        self.activation_ids = activation_ids
+
+    @classmethod
+    def from_columns(cls, ids, paths, clz, activation, positive, record_types=(None,)):
+        # Table of one record per grid and record type, from the columns of the grids
+        codes, activation_codes = np.unique(activation, return_inverse=True)
+        num_grids = len(ids)
+        encoded = np.char.encode(np.concatenate((ids, paths)).astype(str), "utf-8")
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.char.str_len(encoded), out=offsets[1:])
+        strings = np.frombuffer(b"".join(encoded.tolist()), dtype=np.uint8)
+
+        grid_rows = np.repeat(np.arange(num_grids), len(record_types))
+        rows = np.empty(len(grid_rows), dtype=RECORD_DTYPE)
+        rows["id"] = grid_rows
+        rows["path"] = num_grids + grid_rows
+        rows["type"] = np.tile([RECORD_TYPES.index(record_type) for record_type in record_types], num_grids)
+        rows["clz"] = np.asarray(clz)[grid_rows]
+        rows["activation"] = activation_codes.reshape(-1)[grid_rows]
+        rows["positive"] = np.asarray(positive)[grid_rows]
+        return cls(rows, strings, offsets, codes.astype(np.int64))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def string(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.strings[start:end].tobytes().decode()
+
+    def __getitem__(self, index):
+        row = self.rows[index]
+        return {
+            "id": self.string(row["id"]),
+            "path": self.string(row["path"]),
+            "type": RECORD_TYPES[row["type"]],
+            "clz": int(row["clz"]),
+            "activation": int(self.activation_ids[row["activation"]]),
+        }
+
+    def take(self, indices):
+        # Table of the records at `indices`, sharing the interned strings
+        return RecordTable(self.rows[indices], self.strings, self.offsets, self.activation_ids)
+
+    def paths(self):
+        # Grid folder of every record
+        return [self.string(index) for index in self.rows["path"].tolist()]
+
+    def activations(self):
+        codes = np.unique(self.rows["activation"])
+        return set(int(activation) for activation in self.activation_ids[codes])
+
+
+class RecordTableBuilder:
+    # Collects records one at a time and packs them into a RecordTable
+
+    def __init__(self):
+        self.rows = []
+        self.string_index = {}
+        self.activation_index = {}
+
+    def intern(self, string):
+        return self.string_index.setdefault(string, len(self.string_index))
+
+    def append(self, grid_id, path, clz, activation, positive, record_type=None):
+        self.rows.append(
+            (
+                self.intern(str(grid_id)),
+                self.intern(path),
+                RECORD_TYPES.index(record_type),
+                clz,
+                self.activation_index.setdefault(activation, len(self.activation_index)),
+                positive,
+            )
+        )
+
+    def build(self):
+        encoded = [string.encode() for string in self.string_index]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        strings = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        activation_ids = np.array(list(self.activation_index), dtype=np.int64)
+        rows = np.array(self.rows, dtype=RECORD_DTYPE)
+        return RecordTable(rows, strings, offsets, activation_ids)
@@ -0,0 +1,128 @@
+import os
+
+import numpy as np
+import torch
+
+
+class LocalityShuffleSampler(torch.utils.data.Sampler):
+    """
+    Shuffles a dataset in chunks of physically adjacent grids instead of uniformly, so
+    that consecutive reads hit the same activation/AOI folder and the page cache:
+
+        1. grids are grouped by the folder holding them, in path order within a folder
+        2. every epoch visits the folders in a random order
+        3. indices stream through a shuffle buffer of `buffer_size` records, each step
+           yielding a random buffered index and buffering the next one of the stream
+
+    A larger buffer mixes more folders at once, at the cost of more folders being
+    read at the same time.
+    """
+
+    def __init__(self, paths, buffer_size, seed=None):
+        self.buffer_size = max(int(buffer_size), 1)
+        if seed is None:
+            # Derived from the torch seed, as for a shuffled DataLoader
+            seed = int(torch.empty((), dtype=torch.int64).random_().item())
+        self.seed = seed
+        self.epoch = 0
+
+        paths = np.asarray(paths, dtype=str)
+        folders = np.array([os.path.dirname(path) for path in paths.tolist()], dtype=str)
+        order = np.lexsort((paths, folders))
+        _, starts = np.unique(folders[order], return_index=True)
+        self.chunks = np.split(order, starts[1:])
+        self.num_samples = len(paths)
+
+    def __len__(self):
+        return self.num_samples
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        rng = np.random.default_rng((self.seed, self.epoch))
+        # Epochs differ even if set_epoch is not called
+        self.epoch += 1
+        if self.num_samples == 0:
+            return
+
+        chunk_order = rng.permutation(len(self.chunks))
+        stream = np.concatenate([self.chunks[chunk] for chunk in chunk_order]).tolist()
+        buffer = stream[: self.buffer_size]
+        draws = rng.integers(0, len(buffer), size=max(self.num_samples - len(buffer), 0)).tolist()
+        for slot, index in zip(draws, stream[len(buffer) :]):
+            yield buffer[slot]
+            buffer[slot] = index
+        yield from (buffer[i] for i in rng.permutation(len(buffer)).tolist())
+
+
+class BalancedSampler(torch.utils.data.Sampler):
+    """
+    Oversampling sampler drawing a `positive_ratio` share of every epoch from the
+    `positive` records and the rest from the negative ones. Each pool is consumed in
+    random order without repetition, and only starts over once exhausted, so a batch
+    never repeats a record unless the epoch holds more draws than the pool.
+
+    Epochs are seeded by (seed, epoch), independently of the loader workers. The
+    state (seed, epoch, offset) can be saved with `state_dict` and restored with
+    `load_state_dict` to resume an epoch after its first `offset` indices. `offset`
+    counts the indices handed to the loader, which runs ahead of the training loop
+    by its prefetched batches.
+    """
+
+    def __init__(self, positive, positive_ratio=0.5, num_samples=None, seed=None):
+        positive = np.asarray(positive, dtype=bool)
+        self.positives = np.flatnonzero(positive)
+        self.negatives = np.flatnonzero(~positive)
+        if len(self.positives) == 0 or len(self.negatives) == 0:
+            print("Oversampling needs both positive and negative records!")
+            exit(2)
+        self.num_samples = len(positive) if num_samples is None else num_samples
+        self.num_positives = int(round(self.num_samples * positive_ratio))
+        if seed is None:
+            # Derived from the torch seed, as for a shuffled DataLoader
+            seed = int(torch.empty((), dtype=torch.int64).random_().item())
+        self.seed = seed
+        self.epoch = 0
+        self.offset = 0
+
+    def __len__(self):
+        return self.num_samples
+
+    def set_epoch(self, epoch):
+        # A restored epoch keeps its offset
+        if epoch != self.epoch:
+            self.epoch = epoch
+            self.offset = 0
+
+    def state_dict(self):
+        return {"seed": self.seed, "epoch": self.epoch, "offset": self.offset}
+
+    def load_state_dict(self, state_dict):
+        self.seed = state_dict["seed"]
+        self.epoch = state_dict["epoch"]
+        self.offset = state_dict["offset"]
+
+    def draw(self, rng, pool, count):
+        # `count` records of `pool`, every record once before any repeats
+        passes = max(-(-count // len(pool)), 1)
+        return np.concatenate([rng.permutation(pool) for _ in range(passes)])[:count]
+
+    def epoch_indices(self):
+        rng = np.random.default_rng((self.seed, self.epoch))
+        indices = np.concatenate(
+            (
+                self.draw(rng, self.positives, self.num_positives),
+                self.draw(rng, self.negatives, self.num_samples - self.num_positives),
+            )
+        )
+        return indices[rng.permutation(len(indices))]
+
+    def __iter__(self):
+        indices = self.epoch_indices()[self.offset :].tolist()
+        for index in indices:
+            self.offset += 1
+            yield index
+        # Epochs differ even if set_epoch is not called
+        self.epoch += 1
+        self.offset = 0
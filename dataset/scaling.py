@@ -0,0 +1,95 @@
+import numpy as np
+import torch
+
+# Acquisitions along the second axis of a scale lookup, named as in the min-max stats
+SCALE_ACQUISITIONS = ("flood", "pre1", "pre2")
+
+
+class ScaleLookup:
+    """
+    Dense per channel scale parameters of every activation and acquisition, so that a
+    scaled image is `image * scale + offset`:
+
+        ids     int64   [A] sorted activation ids
+        params  float32 [A, len(SCALE_ACQUISITIONS), len(channels), 2] (offset, scale)
+    """
+
+    def __init__(self, ids, params):
+        self.ids = ids
+        self.params = params
+
+    def __contains__(self, activation):
+        return bool((self.ids == activation).any())
+
+    @property
+    def device(self):
+        return self.params.device
+
+    def to(self, device):
+        return ScaleLookup(self.ids.to(device), self.params.to(device))
+
+    def lookup(self, activation, acquisition):
+        # [..., C, 2] parameters of an activation id or a tensor of activation ids
+        activation = torch.as_tensor(activation, device=self.ids.device)
+        rows = torch.searchsorted(self.ids, activation)
+        return self.params[rows, SCALE_ACQUISITIONS.index(acquisition)]
+
+
+def channel_min_max(stats, acquisition, channel, configs):
+    # Min and max of a channel of `acquisition`, the clamp value replaces the max
+    clamp = configs["clamp_input"]
+    if channel == "vh/vv":
+        vh = stats[f"{acquisition}_vh"]
+        vv = stats[f"{acquisition}_vv"]
+        ch_min = vh[0] / vv[0]
+        if clamp is None:
+            ch_max = vh[1] / vv[1]
+        elif len(configs["channels"]) == 1:
+            ch_max = clamp
+        else:
+            ch_max = 1.0
+    else:
+        ch_min, ch_max = stats[f"{acquisition}_{channel}"]
+        if clamp is not None:
+            ch_max = clamp
+    return ch_min, ch_max
+
+
+def build_scale_lookup(configs, activations, min_max_stats=None, mean_key="data_mean", std_key="data_std"):
+    """
+    Scale lookup of `activations` for the "normalize", "min-max" and [min, max]
+    scalings of `configs`. Returns None when inputs are not scaled or the scaling is
+    not affine ("custom"), in which case it is left to the datasets.
+    """
+    scale_input = configs["scale_input"]
+    if scale_input is None or scale_input == "custom":
+        return None
+
+    ids = sorted(activations)
+    if scale_input == "normalize":
+        # One mean and std per input channel, e.g. the four SLC channels
+        means = np.atleast_1d(np.asarray(configs[mean_key], np.float64))
+        stds = np.atleast_1d(np.asarray(configs[std_key], np.float64))
+        params = np.empty((len(ids), len(SCALE_ACQUISITIONS), len(means), 2))
+        params[..., 0] = -means / stds
+        params[..., 1] = 1.0 / stds
+    else:
+        channels = configs["channels"]
+        params = np.empty((len(ids), len(SCALE_ACQUISITIONS), len(channels), 2))
+        if isinstance(scale_input, list):
+            new_min, new_max = [np.broadcast_to(np.asarray(i, np.float64), len(channels)) for i in scale_input]
+        else:
+            new_min, new_max = np.zeros(len(channels)), np.ones(len(channels))
+
+        for row, activation in enumerate(ids):
+            for i, acquisition in enumerate(SCALE_ACQUISITIONS):
+                for ch_i, channel in enumerate(channels):
+                    ch_min, ch_max = channel_min_max(min_max_stats[activation], acquisition, channel, configs)
+                    scale = (new_max[ch_i] - new_min[ch_i]) / (ch_max - ch_min)
+                    params[row, i, ch_i, 0] = new_min[ch_i] - ch_min * scale
+                    params[row, i, ch_i, 1] = scale
+
+    return ScaleLookup(
+        torch.tensor(ids, dtype=torch.int64),
+        torch.from_numpy(params).float(),
+    )
@@ -0,0 +1,51 @@
+import os
+import threading
+from collections import OrderedDict
+
+import rasterio
+
+
+class RasterReader:
+    """
+    Reads SLC rasters as plain [bands, height, width] arrays through rasterio handles
+    kept open between samples, instead of building an xarray object (CRS, coordinates)
+    per product with rioxarray.
+
+    Every thread of every worker keeps its own LRU cache of up to `max_handles`
+    handles, rasterio datasets must not be shared by threads or processes.
+    """
+
+    def __init__(self, max_handles=64):
+        self.max_handles = max(max_handles, 1)
+        self.local = threading.local()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.local = threading.local()
+
+    def handle(self, path):
+        if getattr(self.local, "pid", None) != os.getpid():
+            # Handles inherited by a forked worker share file offsets with the parent
+            self.local.handles = OrderedDict()
+            self.local.pid = os.getpid()
+        handles = self.local.handles
+        if path in handles:
+            handles.move_to_end(path)
+            return handles[path]
+        if len(handles) >= self.max_handles:
+            _, oldest = handles.popitem(last=False)
+            oldest.close()
+        handles[path] = rasterio.open(path)
+        return handles[path]
+
+    def read(self, path):
+        return self.handle(path).read()
+
+    def read_with_nodata(self, path):
+        dataset = self.handle(path)
+        return dataset.read(), dataset.nodata
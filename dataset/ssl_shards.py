@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import random
+from multiprocessing import Pool
+from pathlib import Path
+
+import numpy as np
+import pyjson5
+from tqdm import tqdm
+
+from dataset.tile_store import SAR_PRODUCTS, TILE_SIZE, list_grid_folder, read_tile
+
+
+def list_event_folders(event_dir):
+    # Grid folders of an event folder of data/, walked as SSLDataset does
+    samples = []
+    for folder in os.listdir(event_dir):
+        if ".gpkg" in folder:
+            continue
+        subfolder_dir = os.path.join(event_dir, folder)
+        for subfolder in os.listdir(subfolder_dir):
+            hashes_dir = os.path.join(subfolder_dir, subfolder)
+            for hash_folder in os.listdir(hashes_dir):
+                hash_folder_dir = os.path.join(hashes_dir, hash_folder)
+                if os.path.isfile(hash_folder_dir):
+                    samples.append(hashes_dir)
+                else:
+                    samples.append(hash_folder_dir)
+    return samples
+
+
+def save_json(obj, path):
+    # Written to a temporary file first so that an interrupted run leaves no partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(obj, file)
+    os.replace(tmp_path, path)
+
+
+def list_grid_folders(root_path, out_path, workers):
+    # Every grid folder of the archive, listed once and reused by resumed runs
+    folders_path = out_path / "folders.json"
+    if folders_path.is_file():
+        with open(folders_path, "r") as file:
+            return json.load(file)
+
+    events = [os.path.join(root_path, event) for event in sorted(os.listdir(root_path))]
+    events = [event for event in events if os.path.isdir(event)]
+    folders = []
+    with Pool(workers) as pool:
+        for samples in tqdm(pool.imap_unordered(list_event_folders, events), total=len(events)):
+            folders.extend(samples)
+
+    # Shards mix grids of every event, as the shuffled SSLDataset samples did
+    folders.sort()
+    random.Random(999).shuffle(folders)
+    save_json(folders, folders_path)
+    return folders
+
+
+def write_shard(job):
+    # Stack the SAR tiles of the grid folders of a shard, unless written by a previous run
+    shard_path, folders = job
+    if os.path.isfile(shard_path):
+        return shard_path, len(np.load(shard_path, mmap_mode="r"))
+
+    shape = (TILE_SIZE, TILE_SIZE)
+    grids = []
+    for folder in folders:
+        files = list_grid_folder(folder)
+        tiles = [read_tile(files[product]) if product in files else None for product in SAR_PRODUCTS]
+        if any(tile is None or tile.shape != shape for tile in tiles):
+            print(f"Skipping grid {folder}: missing or unexpected SAR tiles")
+            continue
+        grids.append(np.stack(tiles).astype(np.float32))
+
+    sar = np.empty((0, len(SAR_PRODUCTS)) + shape, dtype=np.float32)
+    if len(grids) > 0:
+        sar = np.stack(grids)
+    tmp_path = f"{shard_path}.tmp"
+    with open(tmp_path, "wb") as file:
+        np.save(file, sar)
+    os.replace(tmp_path, shard_path)
+    return shard_path, len(sar)
+
+
+def build_shards(root_path, out_path, shard_size=256, workers=None):
+    """
+    Write the SAR tiles of every grid folder under `root_path` into sequential shards:
+
+        <out>/folders.json       grid folders, in shard order
+        <out>/shard_00000.npy    float32 [n, 6, 224, 224]  (SAR_PRODUCTS order)
+        <out>/index.json         shard files and their number of grids
+
+    Shards are built in parallel and written atomically. An interrupted run is resumed
+    by running it again, only the missing shards are written. The index is written last
+    so that an incomplete set of shards is never read.
+    """
+    out_path = Path(out_path)
+    out_path.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count()
+    folders = list_grid_folders(root_path, out_path, workers)
+
+    jobs = [
+        (str(out_path / f"shard_{shard:05}.npy"), folders[start : start + shard_size])
+        for shard, start in enumerate(range(0, len(folders), shard_size))
+    ]
+    counts = {}
+    with Pool(workers) as pool:
+        for shard_path, count in tqdm(pool.imap_unordered(write_shard, jobs), total=len(jobs)):
+            counts[shard_path] = count
+
+    shards = [
+        {"file": Path(shard_path).name, "grids": counts[shard_path]} for shard_path, _ in jobs if counts[shard_path] > 0
+    ]
+    save_json({"shards": shards, "grids": sum(counts.values())}, out_path / "index.json")
+    print(f"Wrote {sum(counts.values())} grids in {len(shards)} shards to {out_path}")
+
+
+def load_shard_index(shard_path):
+    index_path = Path(shard_path) / "index.json"
+    if not index_path.is_file():
+        print(
+            "No SSL shards found in: ",
+            shard_path,
+            " build them with `python -m dataset.ssl_shards`",
+        )
+        exit(2)
+    with open(index_path, "r") as file:
+        return json.load(file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack the SAR tiles of the unlabeled archive into SSL shards")
+    parser.add_argument("--out", default=None, help="Shard path (default: configs ssl_shards)")
+    parser.add_argument("--shard-size", type=int, default=256, help="Grids per shard")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel readers (default: CPU count)")
+    args = parser.parse_args()
+
+    configs = pyjson5.load(open("configs/config.json", "r"))
+    configs.update(pyjson5.load(open("configs/train/data_config.json", "r")))
+    out = args.out if args.out is not None else configs["ssl_shards"]
+    if out is None:
+        print("No shard path given! Set ssl_shards in the data config or pass --out")
+        exit(2)
+
+    root_path = os.path.join(configs["root_path"], "data")
+    build_shards(root_path, out, args.shard_size, args.workers)
+
+
+if __name__ == "__main__":
+    main()
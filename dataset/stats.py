@@ -0,0 +1,213 @@
+import hashlib
+import json
+import multiprocessing
+import os
+from pathlib import Path
+
+import numpy as np
+from compress_pickle import dump, load
+from tqdm import tqdm
+
+from dataset.manifest import get_grids, load_manifest
+from dataset.tar_store import open_tar_store
+from dataset.tile_store import read_tile
+
+# Min-max stats entries of an activation and the product each one is computed on
+STAT_PRODUCTS = {
+    "pre1_vv": "SL1_IVV",
+    "pre1_vh": "SL1_IVH",
+    "pre2_vv": "SL2_IVV",
+    "pre2_vh": "SL2_IVH",
+    "flood_vv": "MS1_IVV",
+    "flood_vh": "MS1_IVH",
+}
+
+# Number of grids sent to a worker at a time
+CHUNK_SIZE = 64
+
+# Stats loaded in this process, keyed by `stats_key`
+_LOADED_STATS = {}
+_FILE_DIGESTS = {}
+
+
+def file_digest(path):
+    # SHA-1 of the contents of `path`, recomputed only when the file changes
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    if memo_key not in _FILE_DIGESTS:
+        digest = hashlib.sha1()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        _FILE_DIGESTS[memo_key] = digest.hexdigest()
+    return _FILE_DIGESTS[memo_key]
+
+
+def stats_key(configs):
+    # Stats depend on the grids of the pickles, the activations of every split and
+    # the track that maps grids to activations
+    key = {
+        "train_pickle": file_digest(configs["train_pickle"]),
+        "test_pickle": file_digest(configs["test_pickle"]),
+        "train_acts": configs["train_acts"],
+        "val_acts": configs["val_acts"],
+        "test_acts": configs["test_acts"],
+        "track": configs["track"],
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def atomic_dump(obj, path):
+    # Runs sharing the cache directory never see a partially written file
+    tmp_path = Path(f"{path}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as file:
+        dump(obj, file, compression=None)
+    os.replace(tmp_path, path)
+
+
+def grid_min_max(files):
+    # [len(STAT_PRODUCTS), 2] array with the min and max of the valid pixels of every
+    # product, or None if the grid misses a product
+    if "MK0_MNA" not in files or any(product not in files for product in STAT_PRODUCTS.values()):
+        return None
+    valid = read_tile(files["MK0_MNA"]) == 1
+    grid_stats = np.empty((len(STAT_PRODUCTS), 2), dtype=np.float64)
+    for i, product in enumerate(STAT_PRODUCTS.values()):
+        image = read_tile(files[product])
+        grid_stats[i, 0] = np.min(image, where=valid, initial=np.inf)
+        grid_stats[i, 1] = np.max(image, where=valid, initial=-np.inf)
+    return grid_stats
+
+
+def merge_min_max(partial, group, grid_stats):
+    if group not in partial:
+        partial[group] = grid_stats.copy()
+    else:
+        merged = partial[group]
+        np.minimum(merged[:, 0], grid_stats[:, 0], out=merged[:, 0])
+        np.maximum(merged[:, 1], grid_stats[:, 1], out=merged[:, 1])
+
+
+def scan_grids(jobs):
+    # Reduce a chunk of (grid id, group, files) jobs to per group stats
+    partial = {}
+    missing = []
+    for key, group, files in jobs:
+        grid_stats = grid_min_max(files)
+        if grid_stats is None:
+            missing.append(key)
+            continue
+        merge_min_max(partial, group, grid_stats)
+    return partial, missing
+
+
+def to_dict(array):
+    return {name: (float(array[i, 0]), float(array[i, 1])) for i, name in enumerate(STAT_PRODUCTS)}
+
+
+def compute_min_max_stats(jobs, partial=None, num_workers=1):
+    """
+    Scan the grids of `jobs`, a list of (grid id, group, {product: file}), over a
+    pool of `num_workers` processes and merge their min-max arrays into `partial`.
+    """
+    partial = {} if partial is None else partial
+    chunks = [jobs[i : i + CHUNK_SIZE] for i in range(0, len(jobs), CHUNK_SIZE)]
+    missing = []
+
+    if num_workers > 1 and len(chunks) > 1:
+        with multiprocessing.Pool(min(num_workers, len(chunks))) as pool:
+            results = list(tqdm(pool.imap_unordered(scan_grids, chunks), total=len(chunks)))
+    else:
+        results = [scan_grids(chunk) for chunk in tqdm(chunks)]
+
+    for chunk_stats, chunk_missing in results:
+        missing.extend(chunk_missing)
+        for group, group_stats in chunk_stats.items():
+            merge_min_max(partial, group, group_stats)
+
+    if len(missing) > 0:
+        print(f"Warning: {len(missing)} grids are missing products, skipping them...")
+    return partial
+
+
+def update_grid_stats(pickle_path, grids, valid_acts, configs, root_path):
+    """
+    Min-max arrays of the grids of `pickle_path` per (activation/AOI, activation).
+    They are kept in the stats cache along with the scanned grid ids, keyed by the
+    pickle and the track that maps grids to activations/AOIs, so grids of activations
+    added to a config later are the only ones read.
+    """
+    key = {"pickle": file_digest(pickle_path), "track": configs["track"]}
+    key = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    store_path = Path(configs["stats_cache"]) / f"grids_{key}.pkl"
+    if store_path.exists():
+        with open(store_path, "rb") as file:
+            store = load(file, compression=None)
+    else:
+        store = {"scanned": set(), "partial": {}}
+
+    act_aoi = grids.act_aoi(configs["track"])
+    rows = np.flatnonzero(grids.select(valid_acts, configs["track"]))
+    jobs = [
+        (key, (group_act_aoi, activation))
+        for key, group_act_aoi, activation in zip(
+            grids.ids[rows].tolist(),
+            act_aoi[rows].tolist(),
+            grids.actid[rows].tolist(),
+        )
+        if key not in store["scanned"]
+    ]
+
+    if len(jobs) > 0:
+        print(f"Calculating stats for {len(jobs)} new grids of {pickle_path}...")
+        manifest = load_manifest(pickle_path, grids, root_path, open_tar_store(configs))
+        compute_min_max_stats(
+            [(key, group, manifest[key]) for key, group in jobs],
+            partial=store["partial"],
+            num_workers=configs["num_workers"],
+        )
+        store["scanned"].update(key for key, _ in jobs)
+        atomic_dump(store, store_path)
+
+    return store["partial"]
+
+
+def get_min_max_stats(configs, root_path):
+    """
+    Per activation min-max stats of the SAR images of every split, loaded from the
+    stats cache entry of `stats_key(configs)` or calculated anew.
+    """
+    key = stats_key(configs)
+    if key in _LOADED_STATS:
+        return _LOADED_STATS[key]
+
+    cache_dir = Path(configs["stats_cache"])
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    stats_path = cache_dir / f"{key}.pkl"
+    if stats_path.exists():
+        print(f"Using precalculated stats {stats_path}")
+        with open(stats_path, "rb") as file:
+            _LOADED_STATS[key] = load(file, compression=None)
+        return _LOADED_STATS[key]
+
+    min_max = {}
+    for mode in ["train", "val", "test"]:
+        valid = configs[f"{mode}_acts"]
+        if mode == "test" or mode == "val":
+            pickle_path = configs["test_pickle"]
+        else:
+            pickle_path = configs["train_pickle"]
+
+        grids = get_grids(pickle_path=pickle_path)
+        partial = update_grid_stats(pickle_path, grids, valid, configs, root_path)
+        for (act_aoi, activation), group_stats in partial.items():
+            if act_aoi in valid:
+                merge_min_max(min_max, activation, group_stats)
+
+    min_max_random_events = {activation: to_dict(array) for activation, array in min_max.items()}
+    print("New stats:")
+    print(min_max_random_events)
+
+    atomic_dump(min_max_random_events, stats_path)
+    _LOADED_STATS[key] = min_max_random_events
+    return min_max_random_events
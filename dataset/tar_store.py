@@ -0,0 +1,198 @@
+import argparse
+import os
+import tarfile
+from multiprocessing import Pool
+from pathlib import Path
+
+import numpy as np
+
+# Members are addressed by GDAL subfile paths, so that rasterio reads them in place
+# as well: /vsisubfile/<offset>_<size>,<archive>
+SUBFILE_PREFIX = "/vsisubfile/"
+
+# Descriptors of the archives opened by this process, shared by its threads
+_ARCHIVE_FDS = {}
+
+# Tar stores opened by this process, keyed by directory
+_OPENED_STORES = {}
+
+
+def member_path(archive, offset, size):
+    return f"{SUBFILE_PREFIX}{offset}_{size},{archive}"
+
+
+def read_member(path):
+    # Bytes of an archive member as a uint8 array, read without extracting it
+    spec, archive = path[len(SUBFILE_PREFIX) :].split(",", 1)
+    offset, size = (int(i) for i in spec.split("_"))
+    if archive not in _ARCHIVE_FDS:
+        # pread does not move the file offset, forked workers can share descriptors
+        _ARCHIVE_FDS[archive] = os.open(archive, os.O_RDONLY)
+    return np.frombuffer(os.pread(_ARCHIVE_FDS[archive], size, offset), dtype=np.uint8)
+
+
+def index_path(archive):
+    # data/00.tar -> data/00.tar.index.npz
+    return Path(f"{archive}.index.npz")
+
+
+def archive_header(archive):
+    stat = os.stat(archive)
+    return np.array([stat.st_size, int(stat.st_mtime)], dtype=np.int64)
+
+
+def index_archive(archive):
+    """
+    Write the offset index of the file members of an uncompressed tar archive next to
+    it, unless a fresh one exists. Returns the number of indexed members.
+    """
+    archive = str(archive)
+    path = index_path(archive)
+    header = archive_header(archive)
+    if path.is_file():
+        with np.load(path) as index:
+            if np.array_equal(index["header"], header):
+                return len(index["names"])
+
+    names, offsets, sizes = [], [], []
+    # Headers are read one after another, member data is skipped with seeks
+    with tarfile.open(archive, "r:") as tar:
+        for member in tar:
+            if member.isfile():
+                names.append(os.path.normpath(member.name))
+                offsets.append(member.offset_data)
+                sizes.append(member.size)
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as file:
+        np.savez(
+            file,
+            header=header,
+            names=np.array(names, dtype=str),
+            offsets=np.array(offsets, dtype=np.int64),
+            sizes=np.array(sizes, dtype=np.int64),
+        )
+    os.replace(tmp_path, path)
+    return len(names)
+
+
+def grid_folder(name, batch):
+    # Folder of a member relative to its batch folder, as the grid paths of the
+    # pickles are, e.g. 00/118/01/<hash>/MS1_IVV.tif -> 118/01/<hash>
+    parts = Path(name).parent.parts
+    for i, part in enumerate(parts):
+        if part.isdigit():
+            # Only the first numbered folder can be the batch folder, later ones are
+            # activations and AOIs
+            if part == batch:
+                parts = parts[i + 1 :]
+            break
+    return "/".join(parts)
+
+
+class TarStore:
+    """
+    Grid folders of the batch archives (00.tar ... 10.tar) in `tar_dir`, read in place
+    through the offset index written by `index_archive`. Gzip streams cannot be read
+    at an offset, so the downloaded .tar.gz batches are decompressed once
+    (`gunzip -k`), which keeps the dataset in 11 files.
+    """
+
+    def __init__(self, tar_dir):
+        self.archives = sorted(str(path.resolve()) for path in Path(tar_dir).glob("*.tar"))
+        if len(self.archives) == 0:
+            print("No .tar archives found in: ", tar_dir)
+            exit(2)
+
+        folders, names, archive_ids, offsets, sizes = [], [], [], [], []
+        for archive_id, archive in enumerate(self.archives):
+            path = index_path(archive)
+            if not path.is_file():
+                print(
+                    "No offset index for: ",
+                    archive,
+                    " build it with `python -m dataset.tar_store`",
+                )
+                exit(2)
+            with np.load(path) as index:
+                if not np.array_equal(index["header"], archive_header(archive)):
+                    print("Stale offset index for: ", archive, " rebuild it")
+                    exit(2)
+                # Metadata members are never read
+                rows = np.flatnonzero(~np.char.endswith(index["names"], ".xml"))
+                member_names = index["names"][rows].tolist()
+                batch = Path(archive).name.split(".")[0]
+                folders.extend(grid_folder(name, batch) for name in member_names)
+                names.extend(os.path.basename(name) for name in member_names)
+                archive_ids.append(np.full(len(rows), archive_id, dtype=np.int16))
+                offsets.append(index["offsets"][rows])
+                sizes.append(index["sizes"][rows])
+
+        # Members sorted by folder, every folder maps to its range of members. Names
+        # are kept as bytes, millions of members would take GBs as unicode arrays.
+        folders = np.array(folders, dtype=str)
+        order = np.argsort(folders, kind="stable")
+        self.names = np.char.encode(np.array(names, dtype=str)[order], "utf-8")
+        self.archive_ids = np.concatenate(archive_ids)[order]
+        self.offsets = np.concatenate(offsets)[order]
+        self.sizes = np.concatenate(sizes)[order]
+        keys, self.starts = np.unique(folders[order], return_index=True)
+        self.keys = keys.tolist()
+        ends = np.append(self.starts[1:], len(order))
+        self.ranges = dict(zip(self.keys, zip(self.starts.tolist(), ends.tolist())))
+        print(f"Indexed {len(order)} members of {len(self.archives)} archives")
+
+    def __contains__(self, folder):
+        return folder in self.ranges
+
+    def folders(self, prefix=None):
+        # Archived folders, only those holding a file starting with `prefix` if given
+        if prefix is None:
+            return list(self.keys)
+        members = np.flatnonzero(np.char.startswith(self.names, prefix.encode()))
+        folders = np.unique(np.searchsorted(self.starts, members, side="right") - 1)
+        return [self.keys[folder] for folder in folders.tolist()]
+
+    def folder_files(self, folder):
+        # {file name: member path} of a grid folder, empty if not archived
+        if folder not in self.ranges:
+            return {}
+        start, end = self.ranges[folder]
+        return {
+            self.names[i].decode(): member_path(self.archives[self.archive_ids[i]], self.offsets[i], self.sizes[i])
+            for i in range(start, end)
+        }
+
+
+def open_tar_store(configs):
+    # Tar store of the configs, None if the data is read from extracted folders
+    tar_dir = configs.get("tar_store")
+    if tar_dir is None:
+        return None
+    if tar_dir not in _OPENED_STORES:
+        _OPENED_STORES[tar_dir] = TarStore(tar_dir)
+    return _OPENED_STORES[tar_dir]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the members of uncompressed batch archives for in-place reads")
+    parser.add_argument("archives", nargs="+", help="Batch archives or directories holding them")
+    parser.add_argument("--workers", type=int, default=None, help="Archives indexed in parallel (default: CPU count)")
+    args = parser.parse_args()
+
+    archives = []
+    for path in args.archives:
+        if os.path.isdir(path):
+            archives.extend(sorted(str(archive) for archive in Path(path).glob("*.tar")))
+        elif path.endswith(".gz"):
+            print(f"Skipping {path}: gzip streams cannot be read at an offset, decompress it with `gunzip -k` first")
+        else:
+            archives.append(path)
+
+    with Pool(args.workers or os.cpu_count()) as pool:
+        for archive, count in zip(archives, pool.map(index_archive, archives)):
+            print(f"Indexed {count} members of {archive}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import argparse
+import json
+import multiprocessing
+import os
+from pathlib import Path
+
+import einops
+import numpy as np
+import pyjson5
+import richdem as rd
+import rioxarray as rio
+from tqdm import tqdm
+
+from dataset.tile_store import TILE_SIZE
+
+# Terrain layers of a store, aspect is only computed on request
+LAYERS = ("dem", "slope")
+ASPECT_LAYERS = LAYERS + ("aspect",)
+
+# Packed splits and the config entry holding the grids of each one
+GRD_SPLITS = {
+    "train": "train_pickle",
+    "test": "test_pickle",
+    "negative": "negative_pickle",
+}
+SLC_SPLITS = {
+    "slc_train": "train_json",
+    "slc_test": "test_json",
+}
+
+
+def terrain_attributes(dem, nodata, layers):
+    # Slope and aspect are computed on the gap-filled DEM, before any normalization
+    terrain = {"dem": dem}
+    rd_dem = rd.rdarray(dem.squeeze(), no_data=nodata)
+    if "slope" in layers:
+        slope = rd.TerrainAttribute(rd_dem, attrib="slope_riserun")
+        terrain["slope"] = einops.rearrange(np.asarray(slope.data), "h w -> 1 h w")
+    if "aspect" in layers:
+        aspect = rd.TerrainAttribute(rd_dem, attrib="aspect")
+        terrain["aspect"] = einops.rearrange(np.asarray(aspect.data), "h w -> 1 h w")
+    return terrain
+
+
+def grd_terrain(dem_path, layers=LAYERS):
+    # GRD DEMs mark gaps with NaNs
+    dem = rio.open_rasterio(dem_path)
+    nans = dem.isnull()
+    if nans.any():
+        dem = dem.rio.interpolate_na()
+
+    nodata = dem.rio.nodata
+    return terrain_attributes(dem.to_numpy(), nodata, layers)
+
+
+def slc_terrain(dem_path, layers=LAYERS):
+    # NOTE: Nodata values of SLC DEMs are not NaN but a rather high float number
+    # Here we convert the nodata value to NaN and interpolate
+    dem = rio.open_rasterio(dem_path)
+    nodata = dem.rio.nodata
+    dem_arr = dem.to_numpy()
+    nans = dem == nodata
+    if nans.any().item():
+        dem_arr[nans] = np.nan
+        dem[:] = dem_arr
+
+    dem = dem.rio.write_nodata(np.nan)
+    dem = dem.rio.interpolate_na()
+    return terrain_attributes(dem.to_numpy(), nodata, layers)
+
+
+def slc_gap_terrain(dem, nodata, dem_path, layers=LAYERS):
+    # Terrain of an SLC DEM already read as an array, only DEMs with gaps go through the
+    # xarray interpolation of slc_terrain
+    gaps = np.isnan(dem)
+    if nodata is not None:
+        gaps |= dem == nodata
+    if gaps.any():
+        return slc_terrain(dem_path, layers)
+    return terrain_attributes(dem, nodata, layers)
+
+
+class TerrainStore:
+    """
+    Read-only view over the terrain layers of a split written by `pack_terrain`:
+
+        <store>/<split>/terrain.npy  float32 [N, len(layers), 224, 224]
+        <store>/<split>/index.json   grid ids in row order, layers and tile shapes
+    """
+
+    def __init__(self, store_path, split):
+        self.path = Path(store_path) / split
+        with open(self.path / "index.json", "r") as file:
+            index = json.load(file)
+        self.rows = {grid_id: row for row, grid_id in enumerate(index["ids"])}
+        self.layers = index["layers"]
+        self.shapes = index["shapes"]
+        self._terrain = None
+
+    @staticmethod
+    def exists(store_path, split):
+        return (Path(store_path) / split / "index.json").is_file()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, grid_id):
+        return grid_id in self.rows
+
+    def __getstate__(self):
+        # The memory map is reopened lazily in every DataLoader worker
+        state = self.__dict__.copy()
+        state["_terrain"] = None
+        return state
+
+    def read(self, grid_id):
+        # {layer: [1, H, W] array} of the grid
+        if self._terrain is None:
+            self._terrain = np.load(self.path / "terrain.npy", mmap_mode="r")
+        row = self.rows[grid_id]
+        height, width = self.shapes[row]
+        return {layer: np.array(self._terrain[row, i, None, :height, :width]) for i, layer in enumerate(self.layers)}
+
+
+def compute_terrain(job):
+    grid_id, dem_path, slc, layers = job
+    if dem_path is None:
+        return grid_id, None
+    if slc:
+        return grid_id, slc_terrain(dem_path, layers)
+    return grid_id, grd_terrain(dem_path, layers)
+
+
+def pack_terrain(grid_dems, out_path, slc=False, layers=LAYERS, num_workers=1):
+    """
+    Compute the terrain layers of `grid_dems` (a list of (grid id, DEM file) pairs)
+    over `num_workers` processes and write them to `out_path`. Grids without a DEM
+    or with DEMs larger than a tile are left out and read from their files.
+    """
+    out_path = Path(out_path)
+    out_path.mkdir(parents=True, exist_ok=True)
+    # Drop the index of a previous run before its arrays are overwritten
+    (out_path / "index.json").unlink(missing_ok=True)
+    terrain = np.lib.format.open_memmap(
+        out_path / "terrain.npy",
+        mode="w+",
+        dtype=np.float32,
+        shape=(len(grid_dems), len(layers), TILE_SIZE, TILE_SIZE),
+    )
+
+    ids = []
+    shapes = []
+    jobs = [(grid_id, dem_path, slc, layers) for grid_id, dem_path in grid_dems]
+    if num_workers > 1:
+        pool = multiprocessing.Pool(num_workers)
+        results = pool.imap(compute_terrain, jobs, chunksize=16)
+    else:
+        pool = None
+        results = map(compute_terrain, jobs)
+
+    for grid_id, grid_terrain in tqdm(results, total=len(jobs)):
+        if grid_terrain is None:
+            print(f"Skipping grid {grid_id}: no DEM")
+            continue
+        height, width = grid_terrain["dem"].shape[-2:]
+        if height > TILE_SIZE or width > TILE_SIZE:
+            print(f"Skipping grid {grid_id}: DEM of shape {(height, width)}")
+            continue
+        row = len(ids)
+        for i, layer in enumerate(layers):
+            terrain[row, i, :height, :width] = grid_terrain[layer][0]
+        ids.append(grid_id)
+        shapes.append((height, width))
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+    terrain.flush()
+
+    # The index is written last so that an interrupted run is never picked up
+    with open(out_path / "index.json.tmp", "w") as file:
+        json.dump({"ids": ids, "layers": list(layers), "shapes": shapes}, file)
+    os.replace(out_path / "index.json.tmp", out_path / "index.json")
+
+    print(f"Packed terrain of {len(ids)} grids into {out_path}")
+
+
+def main():
+    from dataset.manifest import find_data_path, get_grids, load_manifest
+    from dataset.tar_store import open_tar_store
+
+    parser = argparse.ArgumentParser(description="Precompute the gap-filled DEM and slope of every configured grid")
+    parser.add_argument("--out", default=None, help="Store path (default: configs terrain_store)")
+    parser.add_argument(
+        "--splits",
+        nargs="+",
+        default=["train", "test"],
+        choices=list(GRD_SPLITS) + list(SLC_SPLITS),
+    )
+    parser.add_argument("--aspect", action="store_true", help="Also store the aspect")
+    args = parser.parse_args()
+
+    configs = pyjson5.load(open("configs/config.json", "r"))
+    configs.update(pyjson5.load(open("configs/train/data_config.json", "r")))
+    configs.update(pyjson5.load(open("configs/train/train_config.json", "r")))
+    out = args.out if args.out is not None else configs["terrain_store"]
+    if out is None:
+        print("No store path given! Set terrain_store in the data config or pass --out")
+        exit(2)
+    layers = ASPECT_LAYERS if args.aspect else LAYERS
+
+    for split in args.splits:
+        if split in GRD_SPLITS:
+            pickle_path = configs[GRD_SPLITS[split]]
+            if pickle_path is None:
+                continue
+            root_path = os.path.join(configs["root_path"], "data")
+            grids = get_grids(pickle_path=pickle_path)
+            manifest = load_manifest(pickle_path, grids, root_path, open_tar_store(configs))
+            grid_dems = [(key, files.get("MK0_DEM")) for key, files in manifest.items()]
+            slc = False
+        else:
+            json_path = configs[SLC_SPLITS[split]]
+            grids = pyjson5.load(open(json_path, "r"))
+            grid_dems = []
+            for key in grids:
+                path = find_data_path(configs["slc_root_path"], grids[key]["path"])
+                dem_files = [file for file in os.listdir(path) if file.startswith("MK0_DEM") and "xml" not in file]
+                dem_path = os.path.join(path, dem_files[0]) if dem_files else None
+                grid_dems.append((key, dem_path))
+            slc = True
+
+        print(f"Packing terrain of {len(grid_dems)} grids ({split})")
+        pack_terrain(
+            grid_dems,
+            Path(out) / split,
+            slc=slc,
+            layers=layers,
+            num_workers=configs["num_workers"],
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import atexit
+import contextlib
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from dataset.tile_store import TILE_SIZE, read_tile
+
+# A slot holds one decoded tile of up to TILE_SIZE x TILE_SIZE float32 pixels
+SLOT_BYTES = TILE_SIZE * TILE_SIZE * 4
+
+# Slots per set, the tile of a file may only be cached in the set of its key
+WAYS = 8
+
+# Writers of a set lock one of these byte ranges of the lock file, readers never lock
+LOCK_STRIPES = 32
+
+# Dtypes a slot can hold, stored as their index + 1 (0 marks an empty slot)
+DTYPES = (
+    np.uint8,
+    np.int8,
+    np.uint16,
+    np.int16,
+    np.uint32,
+    np.int32,
+    np.float32,
+    np.float64,
+)
+DTYPE_CODES = {np.dtype(dtype): code for code, dtype in enumerate(DTYPES, start=1)}
+
+
+def file_key(path):
+    # Non-zero 64 bit key of a file path, 0 marks an empty slot
+    digest = hashlib.blake2b(str(path).encode(), digest_size=8).digest()
+    return np.uint64(int.from_bytes(digest, "little") or 1)
+
+
+class SharedTileCache:
+    """
+    Decoded tiles kept in a shared memory segment of `budget_bytes`, visible to the
+    DataLoader workers of every split. The segment is a set-associative cache of
+    fixed-size slots keyed by file path, each set evicting with the CLOCK policy.
+
+    Writers of a set hold a striped lock, a byte range of a lock file so that workers
+    of any start method share it. Readers are lock-free: every slot carries a sequence
+    number that is odd while the slot is written, and a read is only kept if the key
+    and the (even) sequence number did not change while copying the tile.
+    """
+
+    def __init__(self, budget_bytes):
+        self.num_sets = budget_bytes // (SLOT_BYTES * WAYS)
+        if self.num_sets == 0:
+            print(f"Tile cache budget of {budget_bytes} bytes holds less than {WAYS} " "tiles! Increase tile_cache_bytes")
+            exit(2)
+        self.num_slots = self.num_sets * WAYS
+        if os.path.isdir("/dev/shm"):
+            # Segments are backed by /dev/shm, writing past its size kills the workers
+            shm_stat = os.statvfs("/dev/shm")
+            if shm_stat.f_bavail * shm_stat.f_frsize < self.segment_size():
+                print(
+                    f"Tile cache of {self.segment_size()} bytes does not fit in "
+                    "/dev/shm! Reduce tile_cache_bytes or enlarge /dev/shm"
+                )
+                exit(2)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.segment_size())
+        lock_fd, self.lock_path = tempfile.mkstemp(prefix="tile_cache_", suffix=".lock")
+        os.close(lock_fd)
+        self.owner = os.getpid()
+        self.map_segment()
+        self.open_locks()
+        atexit.register(self.close)
+
+        print(f"Caching up to {self.num_slots} decoded tiles " f"({self.shm.size / 2**30:.2f} GiB) in shared memory")
+
+    def segment_size(self):
+        return self.data_offset() + self.num_slots * SLOT_BYTES
+
+    def data_offset(self):
+        # keys, sequence numbers, (dtype, height, width), reference bits, set hands
+        header = self.num_slots * (8 + 8 + 12 + 1) + self.num_sets
+        return -(-header // 64) * 64
+
+    def map_segment(self):
+        buffer = self.shm.buf
+        slots = self.num_slots
+        self.keys = np.ndarray((slots,), np.uint64, buffer, offset=0)
+        self.seqs = np.ndarray((slots,), np.uint64, buffer, offset=8 * slots)
+        self.meta = np.ndarray((slots, 3), np.int32, buffer, offset=16 * slots)
+        self.refs = np.ndarray((slots,), np.uint8, buffer, offset=28 * slots)
+        self.hands = np.ndarray((self.num_sets,), np.uint8, buffer, offset=29 * slots)
+        self.data = np.ndarray((slots, SLOT_BYTES), np.uint8, buffer, offset=self.data_offset())
+
+    def open_locks(self):
+        # fcntl locks are held per process, threads of a process also take a lock
+        self.lock_pid = os.getpid()
+        self.lock_file = open(self.lock_path, "r+b")
+        self.thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    @contextlib.contextmanager
+    def lock(self, set_index):
+        if self.lock_pid != os.getpid():
+            # Forked workers inherit the lock file, whose fcntl locks they do not own
+            self.open_locks()
+        stripe = set_index % LOCK_STRIPES
+        with self.thread_locks[stripe]:
+            fcntl.lockf(self.lock_file, fcntl.LOCK_EX, 1, stripe)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self.lock_file, fcntl.LOCK_UN, 1, stripe)
+
+    def __getstate__(self):
+        # Spawned workers attach to the segment by name, they share the resource
+        # tracker of the process that created it, which unlinks it on close
+        state = self.__dict__.copy()
+        for view in ("shm", "keys", "seqs", "meta", "refs", "hands", "data"):
+            del state[view]
+        del state["lock_file"], state["thread_locks"]
+        state["name"] = self.shm.name
+        return state
+
+    def __setstate__(self, state):
+        name = state.pop("name")
+        self.__dict__.update(state)
+        self.shm = shared_memory.SharedMemory(name=name)
+        self.map_segment()
+        self.open_locks()
+
+    def close(self):
+        if self.shm is None:
+            return
+        del self.keys, self.seqs, self.meta, self.refs, self.hands, self.data
+        self.lock_file.close()
+        self.shm.close()
+        if os.getpid() == self.owner:
+            self.shm.unlink()
+            os.remove(self.lock_path)
+        self.shm = None
+
+    def get(self, path):
+        # Copy of the cached tile of `path`, or None on a miss
+        key = file_key(path)
+        base = int(key % self.num_sets) * WAYS
+        hits = np.flatnonzero(self.keys[base : base + WAYS] == key)
+        if len(hits) == 0:
+            return None
+        slot = base + hits[0]
+        seq = int(self.seqs[slot])
+        if seq & 1:
+            return None
+
+        code, height, width = (int(i) for i in self.meta[slot])
+        dtype = np.dtype(DTYPES[code - 1])
+        nbytes = height * width * dtype.itemsize
+        tile = self.data[slot, :nbytes].view(dtype).reshape(height, width).copy()
+        if self.keys[slot] != key or int(self.seqs[slot]) != seq:
+            # Evicted while copying
+            return None
+        self.refs[slot] = 1
+        return tile
+
+    def victim(self, set_index):
+        # Empty slot of the set if any, otherwise the first one the clock hand finds
+        # with its reference bit cleared
+        base = set_index * WAYS
+        empty = np.flatnonzero(self.keys[base : base + WAYS] == 0)
+        if len(empty) > 0:
+            return base + empty[0]
+        hand = int(self.hands[set_index])
+        while self.refs[base + hand]:
+            self.refs[base + hand] = 0
+            hand = (hand + 1) % WAYS
+        self.hands[set_index] = (hand + 1) % WAYS
+        return base + hand
+
+    def put(self, path, tile):
+        code = DTYPE_CODES.get(tile.dtype)
+        if code is None or tile.ndim != 2 or tile.nbytes > SLOT_BYTES:
+            return
+        key = file_key(path)
+        set_index = int(key % self.num_sets)
+        base = set_index * WAYS
+        with self.lock(set_index):
+            if (self.keys[base : base + WAYS] == key).any():
+                # Cached by another worker in the meantime
+                return
+            slot = self.victim(set_index)
+            self.seqs[slot] += 1
+            self.keys[slot] = 0
+            self.meta[slot] = (code, tile.shape[0], tile.shape[1])
+            self.data[slot, : tile.nbytes] = np.ascontiguousarray(tile).view(np.uint8).reshape(-1)
+            self.keys[slot] = key
+            self.refs[slot] = 1
+            self.seqs[slot] += 1
+
+    def read(self, path):
+        # Decoded tile of `path`, read from its file and cached on a miss
+        tile = self.get(path)
+        if tile is None:
+            tile = read_tile(path)
+            if tile is not None:
+                self.put(path, tile)
+        return tile
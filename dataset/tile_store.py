@@ -0,0 +1,329 @@
+import argparse
+import json
+import os
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+import pyjson5
+from tqdm import tqdm
+
+from dataset.tar_store import SUBFILE_PREFIX, read_member
+
+# Product prefixes of a GRD grid folder. SAR and mask products are packed in this
+# channel order, the DEM is always read from the grid folder.
+SAR_PRODUCTS = ("MS1_IVV", "MS1_IVH", "SL1_IVV", "SL1_IVH", "SL2_IVV", "SL2_IVH")
+MASK_PRODUCTS = ("MK0_MLU", "MK0_MNA")
+GRD_PRODUCTS = SAR_PRODUCTS + MASK_PRODUCTS + ("MK0_DEM",)
+
+# Product prefix of each acquisition in `configs["inputs"]`
+ACQUISITION_PREFIXES = {
+    "pre_event_1": "SL1",
+    "pre_event_2": "SL2",
+    "post_event": "MS1",
+}
+
+TILE_SIZE = 224
+
+# Per product state of a packed grid: missing from the grid folder, stored in the
+# packed arrays, or left in the grid folder because its tile could not be packed
+ABSENT, PACKED, UNPACKED = 0, 1, 2
+
+# Packed splits and the config entry holding the grid pickle of each one
+SPLIT_PICKLES = {
+    "train": "train_pickle",
+    "test": "test_pickle",
+    "negative": "negative_pickle",
+}
+
+
+def match_products(files):
+    # Map every product prefix found among {file name: path} to its path
+    products = {}
+    for file, path in files.items():
+        if "xml" in file:
+            continue
+        for product in GRD_PRODUCTS:
+            if file.startswith(product):
+                products[product] = path
+                break
+    return products
+
+
+def list_grid_folder(path):
+    # Map every product prefix found in a grid folder to its file
+    return match_products({file: os.path.join(path, file) for file in os.listdir(path)})
+
+
+# Storage of the packed SAR tiles. float16 and uint16_db keep a per tile (offset, scale)
+# in sar_params.npy and are dequantized to float32 on read:
+#   float16    x / peak of the tile, relative error ~5e-4 down to ~6e-5 of the peak
+#              (smaller values lose precision)
+#   uint16_db  dB quantized over the [min, max] dB range of the tile (bounded relative
+#              error), zero and non-finite pixels use reserved codes (read as 0, NaN)
+QUANTIZATIONS = {"float32": np.float32, "float16": np.float16, "uint16_db": np.uint16}
+ZERO_CODE, NAN_CODE = 0, np.iinfo(np.uint16).max
+
+
+def quantize_tile(tile, quantization):
+    # Stored tile and its (offset, scale)
+    if quantization == "float16":
+        peak = np.max(np.abs(tile), where=np.isfinite(tile), initial=0.0)
+        scale = peak if peak > 0 else 1.0
+        return (tile / scale).astype(np.float16), (0.0, scale)
+
+    positive = np.isfinite(tile) & (tile > 0)
+    db = np.zeros(tile.shape, dtype=np.float64)
+    np.log10(tile, out=db, where=positive)
+    db *= 10
+    low = db.min(initial=np.inf, where=positive)
+    high = db.max(initial=-np.inf, where=positive)
+    if not positive.any():
+        low, high = 0.0, 0.0
+    step = (high - low) / (NAN_CODE - 2) if high > low else 1.0
+
+    codes = np.full(tile.shape, ZERO_CODE, dtype=np.uint16)
+    codes[positive] = 1 + np.rint((db[positive] - low) / step).astype(np.uint16)
+    codes[~np.isfinite(tile)] = NAN_CODE
+    return codes, (low - step, step)
+
+
+def dequantize_tile(stored, params, quantization):
+    if quantization == "float32":
+        return np.array(stored)
+    offset, scale = params
+    if quantization == "float16":
+        return stored.astype(np.float32) * np.float32(scale)
+
+    tile = np.power(10.0, (stored * scale + offset) / 10.0).astype(np.float32)
+    tile[stored == ZERO_CODE] = 0.0
+    tile[stored == NAN_CODE] = np.nan
+    return tile
+
+
+def read_tile(path):
+    path = str(path)
+    if path.startswith(SUBFILE_PREFIX):
+        # Member of a tar archive, see dataset.tar_store
+        return cv.imdecode(read_member(path), cv.IMREAD_ANYDEPTH)
+    return cv.imread(path, cv.IMREAD_ANYDEPTH)
+
+
+class PackedTileStore:
+    """
+    Read-only view over a split packed by `pack_grids`:
+
+        <store>/<split>/sar.npy         QUANTIZATIONS dtype [N, 6, 224, 224]  (SAR_PRODUCTS order)
+        <store>/<split>/sar_params.npy  float32 [N, 6, 2]  (offset, scale), unless float32
+        <store>/<split>/masks.npy       uint8   [N, 2, 224, 224]  (MASK_PRODUCTS order)
+        <store>/<split>/state.npy       uint8   [N, 8]            (ABSENT, PACKED or UNPACKED)
+        <store>/<split>/index.json      grid ids in row order and the quantization
+    """
+
+    def __init__(self, store_path, split):
+        self.path = Path(store_path) / split
+        with open(self.path / "index.json", "r") as file:
+            index = json.load(file)
+        self.rows = {grid_id: row for row, grid_id in enumerate(index["ids"])}
+        self.quantization = index.get("quantization", "float32")
+        self.state = np.load(self.path / "state.npy")
+        self.params = None
+        if self.quantization != "float32":
+            self.params = np.load(self.path / "sar_params.npy")
+        self._sar = None
+        self._masks = None
+
+    @staticmethod
+    def exists(store_path, split):
+        return (Path(store_path) / split / "index.json").is_file()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, grid_id):
+        return grid_id in self.rows
+
+    def __getstate__(self):
+        # Memory maps are reopened lazily in every DataLoader worker
+        state = self.__dict__.copy()
+        state["_sar"] = None
+        state["_masks"] = None
+        return state
+
+    def _open(self):
+        if self._sar is None:
+            self._sar = np.load(self.path / "sar.npy", mmap_mode="r")
+            self._masks = np.load(self.path / "masks.npy", mmap_mode="r")
+
+    def read(self, grid_id, products=GRD_PRODUCTS):
+        # Return copies of the requested packed products, plus the requested products
+        # that have to be read from the grid folder instead
+        self._open()
+        row = self.rows[grid_id]
+        tiles = {}
+        unpacked = set()
+        for channel, product in enumerate(SAR_PRODUCTS + MASK_PRODUCTS):
+            if product not in products:
+                continue
+            if self.state[row, channel] == UNPACKED:
+                unpacked.add(product)
+            elif self.state[row, channel] == PACKED:
+                if channel < len(SAR_PRODUCTS):
+                    tiles[product] = dequantize_tile(
+                        self._sar[row, channel],
+                        None if self.params is None else self.params[row, channel],
+                        self.quantization,
+                    )
+                else:
+                    tiles[product] = np.array(self._masks[row, channel - len(SAR_PRODUCTS)])
+        return tiles, unpacked
+
+
+def pack_grids(grid_files, out_path, quantization="float32"):
+    """
+    Pack the SAR and mask tiles of `grid_files` (a list of (grid id, {product: file})
+    pairs, as in the file manifest) into contiguous memory-mapped arrays under
+    `out_path`, the SAR tiles stored as `quantization` (see QUANTIZATIONS).
+    """
+    out_path = Path(out_path)
+    out_path.mkdir(parents=True, exist_ok=True)
+    # Repacking rewrites the arrays in place, the index of the old store must not
+    # outlive an interrupted run
+    (out_path / "index.json").unlink(missing_ok=True)
+    num_grids = len(grid_files)
+    shape = (TILE_SIZE, TILE_SIZE)
+
+    sar = np.lib.format.open_memmap(
+        out_path / "sar.npy",
+        mode="w+",
+        dtype=QUANTIZATIONS[quantization],
+        shape=(num_grids, len(SAR_PRODUCTS)) + shape,
+    )
+    params = np.zeros((num_grids, len(SAR_PRODUCTS), 2), dtype=np.float32)
+    masks = np.lib.format.open_memmap(
+        out_path / "masks.npy",
+        mode="w+",
+        dtype=np.uint8,
+        shape=(num_grids, len(MASK_PRODUCTS)) + shape,
+    )
+    state = np.full((num_grids, len(SAR_PRODUCTS) + len(MASK_PRODUCTS)), ABSENT, dtype=np.uint8)
+
+    for row, (grid_id, files) in enumerate(tqdm(grid_files)):
+        for channel, product in enumerate(SAR_PRODUCTS + MASK_PRODUCTS):
+            if product not in files:
+                continue
+            tile = read_tile(files[product])
+            if tile is None or tile.shape != shape:
+                # Left to the folder reader, which handles unusual tiles as before
+                print(f"Skipping {product} of grid {grid_id}: unexpected tile")
+                state[row, channel] = UNPACKED
+                continue
+            if channel < len(SAR_PRODUCTS):
+                if quantization == "float32":
+                    sar[row, channel] = tile
+                else:
+                    sar[row, channel], params[row, channel] = quantize_tile(tile, quantization)
+            else:
+                masks[row, channel - len(SAR_PRODUCTS)] = tile
+            state[row, channel] = PACKED
+
+    sar.flush()
+    masks.flush()
+    np.save(out_path / "state.npy", state)
+    if quantization != "float32":
+        np.save(out_path / "sar_params.npy", params)
+
+    # The index is written last, through a temporary file, so that an interrupted
+    # run is never picked up
+    tmp_path = out_path / "index.json.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(
+            {
+                "ids": [grid_id for grid_id, _ in grid_files],
+                "quantization": quantization,
+            },
+            file,
+        )
+    os.replace(tmp_path, out_path / "index.json")
+
+    print(f"Packed {num_grids} grids into {out_path}")
+
+
+def verify_store(store, grid_files, clamp=None):
+    """
+    Compare the dequantized SAR tiles of a packed split to the tiles of `grid_files`
+    they were packed from and print the largest errors, also after clamping both to
+    `clamp` as the datasets do. Returns the largest absolute error.
+    """
+    abs_error, rel_error, clamped_error = 0.0, 0.0, 0.0
+    nan_mismatches, tiles = 0, 0
+    for grid_id, files in tqdm(grid_files):
+        if grid_id not in store:
+            continue
+        packed, _ = store.read(grid_id, SAR_PRODUCTS)
+        for product, tile in packed.items():
+            original = read_tile(files[product]).astype(np.float64)
+            finite = np.isfinite(original)
+            nan_mismatches += int(np.count_nonzero(finite != np.isfinite(tile)))
+            error = np.abs(tile[finite] - original[finite])
+            if error.size == 0:
+                continue
+            abs_error = max(abs_error, float(error.max()))
+            nonzero = original[finite] != 0
+            if nonzero.any():
+                rel_error = max(
+                    rel_error,
+                    float((error[nonzero] / np.abs(original[finite][nonzero])).max()),
+                )
+            if clamp is not None:
+                clamped = np.abs(np.clip(tile[finite], 0.0, clamp) - np.clip(original[finite], 0.0, clamp))
+                clamped_error = max(clamped_error, float(clamped.max()))
+            tiles += 1
+
+    print(f"Verified {tiles} SAR tiles stored as {store.quantization}")
+    print(f"Max absolute error: {abs_error:.6g}")
+    print(f"Max relative error: {rel_error:.6g}")
+    if clamp is not None:
+        print(f"Max absolute error after clamping to {clamp}: {clamped_error:.6g}")
+    print(f"Non-finite pixel mismatches: {nan_mismatches}")
+    return abs_error
+
+
+def main():
+    from dataset.manifest import get_grids, load_manifest
+    from dataset.tar_store import open_tar_store
+
+    parser = argparse.ArgumentParser(description="Pack the grids of the configured pickles into memory-mapped tiles")
+    parser.add_argument("--out", default=None, help="Store path (default: configs tile_store)")
+    parser.add_argument("--splits", nargs="+", default=["train", "test"], choices=list(SPLIT_PICKLES))
+    parser.add_argument("--quantization", default="float32", choices=list(QUANTIZATIONS), help="Storage of the SAR tiles")
+    parser.add_argument(
+        "--verify", action="store_true", help="Report the quantization error of packed splits instead of packing"
+    )
+    args = parser.parse_args()
+
+    configs = pyjson5.load(open("configs/config.json", "r"))
+    configs.update(pyjson5.load(open("configs/train/data_config.json", "r")))
+    out = args.out if args.out is not None else configs["tile_store"]
+    if out is None:
+        print("No store path given! Set tile_store in the data config or pass --out")
+        exit(2)
+
+    root_path = os.path.join(configs["root_path"], "data")
+    for split in args.splits:
+        pickle_path = configs[SPLIT_PICKLES[split]]
+        if pickle_path is None:
+            continue
+        grids = get_grids(pickle_path=pickle_path)
+        manifest = load_manifest(pickle_path, grids, root_path, open_tar_store(configs))
+        if args.verify:
+            print(f"Verifying {split} against the grids of {pickle_path}")
+            store = PackedTileStore(out, split)
+            verify_store(store, list(manifest.items()), configs["clamp_input"])
+            continue
+        print(f"Packing {len(manifest)} grids of {pickle_path} ({split})")
+        pack_grids(list(manifest.items()), Path(out) / split, args.quantization)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,26 +2,30 @@ import argparse
 import pyjson5 as json
 import pprint
 import random
+from functools import partial
 from pathlib import Path
 
 import numpy as np
 import torch
 import wandb
 from models.model_utilities import *
-from torchmetrics import Accuracy, F1Score, Precision, Recall
 
 import training.train_mae
+from training.engine import (
+    Trainer,
+    call_image,
+    call_pair,
+    call_sequence,
+    load_best_model,
+)
 from training.change_detection_trainer import (
     eval_change_detection,
-    train_change_detection,
 )
 from training.segmentation_trainer import (
     eval_semantic_segmentation,
-    train_semantic_segmentation,
 )
 from training.recurrent_trainer import (
     eval_recurrent_segmentation,
-    train_recurrent_segmentation
 )
 from utilities.utilities import *
 
@@ -29,8 +33,8 @@ from utilities.utilities import *
 parser = argparse.ArgumentParser()
 parser.add_argument("--method", default=None)
 parser.add_argument("--backbone", default=None)
-parser.add_argument("--dem", action='store_true', default=False)
-parser.add_argument("--slope", action='store_true', default=False)
+parser.add_argument("--dem", action="store_true", default=False)
+parser.add_argument("--slope", action="store_true", default=False)
 parser.add_argument("--batch_size", default=None)
 parser.add_argument("--inputs", nargs="+", default=None)
 parser.add_argument("--seed", type=int, default=999)
@@ -54,9 +58,7 @@ if __name__ == "__main__":
         model_configs = json.load(open("configs/method/temporal/vivit.json", "r"))
     else:
         model_configs = json.load(
-            open(
-                f'configs/method/{configs["method"].lower()}/{configs["method"].lower().replace("-", "_")}.json'
-            )
+            open(f'configs/method/{configs["method"].lower()}/{configs["method"].lower().replace("-", "_")}.json')
         )
         if args.backbone is not None:
             model_configs["backbone"] = args.backbone
@@ -81,32 +83,31 @@ if __name__ == "__main__":
 
     # Begin Training
     if configs["task"] == "segmentation":
-        if configs['method'] == 'convlstm':
-            if not configs['test']:
+        if configs["method"] == "convlstm":
+            if not configs["test"]:
                 model = initialize_recurrent_model(configs, model_configs)
 
-                train_recurrent_segmentation(
+                Trainer(
                     model,
-                    train_loader,
-                    val_loader,
-                    test_loader,
-                    configs=configs,
-                    model_configs=model_configs,
-                )
+                    configs,
+                    model_configs,
+                    call_sequence,
+                    partial(
+                        eval_recurrent_segmentation,
+                        ckpt_path=Path(configs["checkpoint_path"]),
+                        configs=configs,
+                        model_configs=model_configs,
+                    ),
+                ).fit(train_loader, val_loader)
 
             # Evaluate on Test Set
             model = initialize_recurrent_model(configs, model_configs)
-
-            ckpt_path = Path(configs["checkpoint_path"]) / "best_segmentation.pt"
-
-            print(f"Loading model from: {ckpt_path}")
-            checkpoint = torch.load(ckpt_path, map_location=configs['device'])
-            model.load_state_dict(checkpoint["model_state_dict"])
+            model = execution_model(load_best_model(model, configs), configs)
 
             test_acc, test_score, miou = eval_recurrent_segmentation(
                 model,
                 test_loader,
-                ckpt_path.parent,
+                Path(configs["checkpoint_path"]),
                 settype="Test",
                 configs=configs,
                 model_configs=model_configs,
@@ -118,22 +119,23 @@ if __name__ == "__main__":
             # Create model
             model = initialize_segmentation_model(configs, model_configs)
             if not configs["test"]:
-                train_semantic_segmentation(
+                Trainer(
                     model,
-                    train_loader,
-                    val_loader,
-                    test_loader,
-                    configs=configs,
-                    model_configs=model_configs,
-                )
+                    configs,
+                    model_configs,
+                    call_image,
+                    partial(
+                        eval_semantic_segmentation,
+                        configs=configs,
+                        model_configs=model_configs,
+                    ),
+                ).fit(train_loader, val_loader)
             else:
                 if configs["wandb_activate"]:
                     # Store wandb id to continue run
 
                     id = wandb.util.generate_id()
-                    json.dump(
-                        {"run_id": id}, open(configs["checkpoint_path"] + "/id.json", "w")
-                    )
+                    json.dump({"run_id": id}, open(configs["checkpoint_path"] + "/id.json", "w"))
                     wandb.init(
                         project=configs["wandb_project"],
                         entity=configs["wandb_entity"],
@@ -144,11 +146,7 @@ if __name__ == "__main__":
                     wandb.watch(model, log_freq=20)
 
             # Evaluate on Test Set
-            print(
-                "Loading model from: ",
-                configs["checkpoint_path"] + "/" + "best_segmentation.pt",
-            )
-            model = torch.load(configs["checkpoint_path"] + "/" + "best_segmentation.pt")
+            model = execution_model(load_best_model(model, configs), configs)
             test_acc, test_score, miou = eval_semantic_segmentation(
                 model,
                 test_loader,
@@ -164,25 +162,20 @@ if __name__ == "__main__":
     elif configs["task"] == "cd":
         model = initialize_cd_model(configs, model_configs, "train")
 
-        train_change_detection(
+        if len(configs["inputs"]) != 2:
+            print("Change detection needs exactly two inputs, got: ", configs["inputs"])
+            exit(2)
+
+        Trainer(
             model,
-            train_loader,
-            val_loader,
-            test_loader,
-            configs=configs,
-            model_configs=model_configs,
-        )
+            configs,
+            model_configs,
+            call_pair,
+            partial(eval_change_detection, configs=configs, model_configs=model_configs),
+        ).fit(train_loader, val_loader)
 
         # Evaluate on Test Set
-        print(
-            "Loading model from: ",
-            configs["checkpoint_path"] + "/" + "best_segmentation.pt",
-        )
-
-        checkpoint = torch.load(
-            configs["checkpoint_path"] + "/" + "best_segmentation.pt", map_location=configs['device']
-        )
-        model.load_state_dict(checkpoint["model_state_dict"])
+        model = execution_model(load_best_model(model, configs), configs)
 
         test_acc, test_score, miou = eval_change_detection(
             model,
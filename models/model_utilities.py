@@ -1,7 +1,10 @@
+import os
+import warnings
 from pathlib import Path
 
 import einops
-#import segmentation_models_pytorch as smp
+
+# import segmentation_models_pytorch as smp
 import torch
 import torch.nn as nn
 from denoising_diffusion_pytorch import GaussianDiffusion, Unet
@@ -29,9 +32,7 @@ class Decoder(nn.Module):
         self.up = nn.Upsample(scale_factor=2)
 
         self.deconv2 = nn.ConvTranspose2d(128, 64, kernel_size=4, stride=2, padding=1)
-        self.deconv3 = nn.ConvTranspose2d(
-            64, output_channels, kernel_size=4, stride=2, padding=1
-        )
+        self.deconv3 = nn.ConvTranspose2d(64, output_channels, kernel_size=4, stride=2, padding=1)
 
     def forward(self, x):
         x = self.deconv1(x)
@@ -63,13 +64,9 @@ class FinetunerSegmentation(nn.Module):
                     nn.Conv2d(512, configs["num_classes"], kernel_size=1),
                 )
             elif configs["decoder"]:
-                self.head = Decoder(
-                    encoder.mlp_head.in_features, configs["num_classes"]
-                )
+                self.head = Decoder(encoder.mlp_head.in_features, configs["num_classes"])
             else:
-                self.head = nn.Conv2d(
-                    encoder.mlp_head.in_features, configs["num_classes"], kernel_size=1
-                )
+                self.head = nn.Conv2d(encoder.mlp_head.in_features, configs["num_classes"], kernel_size=1)
         else:
             self.head = nn.Linear(
                 encoder.mlp_head.in_features,
@@ -94,6 +91,74 @@ class FinetunerSegmentation(nn.Module):
         return x
 
 
+# Options of configs["execution_mode"]
+EXECUTION_MODES = ["eager", "channels_last", "compile"]
+
+
+class ExecutionModel(nn.Module):
+    """
+    Runs a model in the configured execution mode (see `execution_model`): image
+    inputs are passed channels-last and, if given, through its torch.compile'd version.
+    A model that fails to compile (one of `compile_errors`) is run eagerly from then
+    on, any other error is raised. Checkpoints are saved from the wrapped `model`, the
+    state dict of this module holds it twice.
+    """
+
+    def __init__(self, model, channels_last, compiled=None, compile_errors=()):
+        super().__init__()
+        self.model = model
+        self.channels_last = channels_last
+        self.compiled = compiled
+        self.compile_errors = compile_errors
+
+    def forward(self, *inputs):
+        if self.channels_last:
+            inputs = [x.contiguous(memory_format=torch.channels_last) if x.dim() == 4 else x for x in inputs]
+        if self.compiled is not None:
+            try:
+                return self.compiled(*inputs)
+            except self.compile_errors as error:
+                warnings.warn(f"Compiling {type(self.model).__name__} failed, running it eagerly: {error}")
+                self.compiled = None
+        return self.model(*inputs)
+
+
+def execution_model(model, configs):
+    """
+    Model to run for configs["execution_mode"], the model itself for "eager".
+    "channels_last" converts the conv weights and image inputs to channels-last,
+    "compile" adds torch.compile (inductor, also on CPU) on top, with the compiled
+    kernels kept in configs["compile_cache_dir"] between runs. Without torch.compile
+    (torch < 2.0) models run channels-last only.
+    """
+    mode = configs["execution_mode"]
+    if mode not in EXECUTION_MODES:
+        print(f'Invalid execution_mode "{mode}", options: ', EXECUTION_MODES)
+        exit(2)
+    model = model.to(configs["device"])
+    if mode == "eager":
+        return model
+
+    model = model.to(memory_format=torch.channels_last)
+    compiled, compile_errors = None, ()
+    if mode == "compile":
+        if not hasattr(torch, "compile"):
+            print(f"torch {torch.__version__} has no torch.compile, running channels-last")
+        else:
+            if configs["compile_cache_dir"] is not None:
+                os.environ["TORCHINDUCTOR_CACHE_DIR"] = str(configs["compile_cache_dir"])
+            import torch._inductor.config as inductor_config
+
+            if hasattr(inductor_config, "fx_graph_cache"):
+                # Reuse compiled graphs of earlier runs, not only their kernels
+                inductor_config.fx_graph_cache = True
+            from torch._dynamo.exc import BackendCompilerFailed, TorchRuntimeError, Unsupported
+
+            compiled = torch.compile(model, backend="inductor")
+            compile_errors = (BackendCompilerFailed, TorchRuntimeError, Unsupported)
+    return ExecutionModel(model, channels_last=True, compiled=compiled, compile_errors=compile_errors)
+
+
 def initialize_segmentation_model(config, model_configs):
     if config["task"] == "diffusion-unsup":
         model = Unet(dim=64, dim_mults=(1, 2, 4, 8), channels=2)
@@ -110,15 +175,11 @@ def initialize_segmentation_model(config, model_configs):
         if config["method"].lower() == "unet":
             classes = config["num_classes"]
             model = smp.Unet(
-                encoder_name=model_configs[
-                    "backbone"
-                ],  # choose encoder, e.g. mobilenet_v2 or efficientnet-b7
+                encoder_name=model_configs["backbone"],  # choose encoder, e.g. mobilenet_v2 or efficientnet-b7
                 encoder_weights=model_configs[
                     "encoder_weights"
                 ],  # use `imagenet` pre-trained weights for encoder initialization
-                in_channels=config[
-                    "num_channels"
-                ],  # model input channels (1 for gray-scale images, 3 for RGB, etc.)
+                in_channels=config["num_channels"],  # model input channels (1 for gray-scale images, 3 for RGB, etc.)
                 classes=classes,  # model output channels (number of classes in your dataset)
             )
         elif config["method"].lower() == "upernet":
@@ -126,34 +187,22 @@ def initialize_segmentation_model(config, model_configs):
 
         elif config["method"].lower() == "unetplusplus":
             model = smp.UnetPlusPlus(
-                encoder_name=model_configs[
-                    "backbone"
-                ],  # choose encoder, e.g. mobilenet_v2 or efficientnet-b7
+                encoder_name=model_configs["backbone"],  # choose encoder, e.g. mobilenet_v2 or efficientnet-b7
                 encoder_weights=model_configs[
                     "encoder_weights"
                 ],  # use `imagenet` pre-trained weights for encoder initialization
-                in_channels=config[
-                    "num_channels"
-                ],  # model input channels (1 for gray-scale images, 3 for RGB, etc.)
-                classes=config[
-                    "num_classes"
-                ],  # model output channels (number of classes in your dataset)
+                in_channels=config["num_channels"],  # model input channels (1 for gray-scale images, 3 for RGB, etc.)
+                classes=config["num_classes"],  # model output channels (number of classes in your dataset)
             )
 
         elif config["method"].lower() == "deeplabv3":
             model = smp.DeepLabV3Plus(
-                encoder_name=model_configs[
-                    "backbone"
-                ],  # choose encoder, e.g. mobilenet_v2 or efficientnet-b7
+                encoder_name=model_configs["backbone"],  # choose encoder, e.g. mobilenet_v2 or efficientnet-b7
                 encoder_weights=model_configs[
                     "encoder_weights"
                 ],  # use `imagenet` pre-trained weights for encoder initialization
-                in_channels=config[
-                    "num_channels"
-                ],  # model input channels (1 for gray-scale images, 3 for RGB, etc.)
-                classes=config[
-                    "num_classes"
-                ],  # model output channels (number of classes in your dataset)
+                in_channels=config["num_channels"],  # model input channels (1 for gray-scale images, 3 for RGB, etc.)
+                classes=config["num_classes"],  # model output channels (number of classes in your dataset)
             )
         elif config["method"] == "finetune":
             encoder = torch.load(config["encoder"], map_location="cpu")
@@ -168,8 +217,10 @@ def initialize_segmentation_model(config, model_configs):
 
 
 def initialize_recurrent_model(configs, model_configs, phase="train"):
-    if configs['method'] == 'convlstm':
-        model = ConvLSTM(in_channels=configs['num_channels'], num_classes=configs['num_classes'], inp_size=224, device=configs['device'])
+    if configs["method"] == "convlstm":
+        model = ConvLSTM(
+            in_channels=configs["num_channels"], num_classes=configs["num_classes"], inp_size=224, device=configs["device"]
+        )
 
     if configs["resume_checkpoint"]:
         checkpoint = torch.load(configs["resume_checkpoint"])
@@ -181,13 +232,9 @@ def initialize_recurrent_model(configs, model_configs, phase="train"):
 
 def initialize_cd_model(configs, model_configs, phase="train"):
     if configs["method"].lower() == "siam-conc":
-        model = SiamUnet_conc(
-            input_nbr=configs["num_channels"], label_nbr=configs["num_classes"]
-        )
+        model = SiamUnet_conc(input_nbr=configs["num_channels"], label_nbr=configs["num_classes"])
     elif configs["method"].lower() == "siam-diff":
-        model = SiamUnet_diff(
-            input_nbr=configs["num_channels"], label_nbr=configs["num_classes"]
-        )
+        model = SiamUnet_diff(input_nbr=configs["num_channels"], label_nbr=configs["num_classes"])
     elif configs["method"].lower() == "bit-cd":
         model = define_G(model_configs, in_channels=configs["num_channels"])
     elif configs["method"].lower() == "hfa-net":
@@ -203,34 +250,27 @@ def initialize_cd_model(configs, model_configs, phase="train"):
             output_nc=configs["num_classes"],
             decoder_softmax=model_configs["decoder_softmax"],
         )
-    elif configs['method'].lower() == 'snunet':
-        model = SNUNet_ECAM(
-            configs['num_channels'],
-            configs['num_classes'],
-            base_channel=model_configs['base_channel']
-        )
-    elif configs['method'].lower() == 'adhr-cdnet':
-        model = ADHR(
-            in_channels=configs['num_channels'],
-            num_classes=configs['num_classes']
-        )
-    elif configs['method'].lower() == 'transunet-cd':
+    elif configs["method"].lower() == "snunet":
+        model = SNUNet_ECAM(configs["num_channels"], configs["num_classes"], base_channel=model_configs["base_channel"])
+    elif configs["method"].lower() == "adhr-cdnet":
+        model = ADHR(in_channels=configs["num_channels"], num_classes=configs["num_classes"])
+    elif configs["method"].lower() == "transunet-cd":
         model = TransUNet_CD(
             img_dim=224,
-            in_channels=configs['num_channels'],
-            out_channels=configs['out_channels'],
-            head_num=configs['head_num'],
-            mlp_dim=configs['mlp_dim'],
-            block_num=configs['block_num'],
-            patch_dim=configs['patch_dim'],
-            class_num=configs['num_classes'],
-            siamese=configs['siamese']
+            in_channels=configs["num_channels"],
+            out_channels=configs["out_channels"],
+            head_num=configs["head_num"],
+            mlp_dim=configs["mlp_dim"],
+            block_num=configs["block_num"],
+            patch_dim=configs["patch_dim"],
+            class_num=configs["num_classes"],
+            siamese=configs["siamese"],
         )
 
-    model = model.to(configs['device'])
+    model = model.to(configs["device"])
 
     if configs["resume_checkpoint"]:
-        checkpoint = torch.load(configs["resume_checkpoint"], map_location=configs['device'])
+        checkpoint = torch.load(configs["resume_checkpoint"], map_location=configs["device"])
         model.load_state_dict(checkpoint["model_state_dict"])
 
     print(model)
@@ -0,0 +1,105 @@
+import pytest
+import torch
+
+from utilities.metrics import WATER_CLASSES, ConfusionMetrics, confusion_scores, merge_classes
+
+torchmetrics = pytest.importorskip("torchmetrics")
+
+NUM_CLASSES = 4
+IGNORE_INDEX = 3
+
+
+def torchmetrics_scores(predictions, target, num_classes=NUM_CLASSES, ignore_index=IGNORE_INDEX):
+    # Scores of the torchmetrics setup the trainers used before ConfusionMetrics
+    kwargs = dict(
+        task="multiclass",
+        num_classes=num_classes,
+        average="none",
+        multidim_average="global",
+        ignore_index=ignore_index,
+    )
+    return {
+        "accuracy": torchmetrics.Accuracy(**kwargs)(predictions, target),
+        "fscore": torchmetrics.F1Score(**kwargs)(predictions, target),
+        "precision": torchmetrics.Precision(**kwargs)(predictions, target),
+        "recall": torchmetrics.Recall(**kwargs)(predictions, target),
+        "iou": torchmetrics.JaccardIndex(**kwargs)(predictions, target),
+    }
+
+
+def random_batch(seed, batch_size=4, size=16):
+    generator = torch.Generator().manual_seed(seed)
+    predictions = torch.randint(0, 3, (batch_size, size, size), generator=generator)
+    target = torch.randint(0, NUM_CLASSES, (batch_size, size, size), generator=generator)
+    return predictions, target
+
+
+def confusion(predictions, target, num_classes=NUM_CLASSES):
+    metrics = ConfusionMetrics(num_classes, ignore_index=IGNORE_INDEX)
+    metrics.update(predictions, target)
+    return metrics.confusion()
+
+
+def assert_scores_close(scores, expected, classes):
+    for name, values in expected.items():
+        torch.testing.assert_close(scores[name][:classes], values[:classes].float(), msg=name)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_confusion_scores_match_torchmetrics(seed):
+    predictions, target = random_batch(seed)
+    scores = confusion_scores(confusion(predictions, target))
+    assert_scores_close(scores, torchmetrics_scores(predictions, target), classes=3)
+
+
+def test_classes_without_support_score_zero():
+    predictions = torch.zeros(2, 8, 8, dtype=torch.long)
+    target = torch.zeros(2, 8, 8, dtype=torch.long)
+    target[:, 0] = IGNORE_INDEX
+    scores = confusion_scores(confusion(predictions, target))
+    assert_scores_close(scores, torchmetrics_scores(predictions, target), classes=3)
+
+
+def test_grouped_scores_match_torchmetrics_per_group():
+    predictions, target = random_batch(0, batch_size=6)
+    activation = torch.tensor([10, 20, 10, 30, 20, 10])
+    metrics = ConfusionMetrics(NUM_CLASSES, {"activation": [10, 20, 30]}, ignore_index=IGNORE_INDEX)
+    metrics.update(predictions[:3], target[:3], activation=activation[:3])
+    metrics.update(predictions[3:], target[3:], activation=activation[3:])
+
+    assert_scores_close(metrics.compute(), torchmetrics_scores(predictions, target), classes=3)
+    for key in [10, 20, 30]:
+        samples = activation == key
+        assert metrics.sample_count("activation", key) == int(samples.sum())
+        expected = torchmetrics_scores(predictions[samples], target[samples])
+        assert_scores_close(metrics.compute("activation", key), expected, classes=3)
+
+
+def test_merged_water_classes_match_torchmetrics():
+    predictions, target = random_batch(1)
+    # Permanent waters and floods as a single water class, invalid pixels kept apart
+    water_predictions = (predictions > 0).long()
+    water_target = torch.where(target == IGNORE_INDEX, target.new_tensor(2), (target > 0).long())
+    expected = torchmetrics_scores(water_predictions, water_target, num_classes=3, ignore_index=2)
+
+    counts = confusion(predictions, target)
+    assert_scores_close(confusion_scores(merge_classes(counts, WATER_CLASSES)), expected, classes=2)
+
+    metrics = ConfusionMetrics(NUM_CLASSES, ignore_index=IGNORE_INDEX)
+    metrics.update(predictions, target)
+    assert_scores_close(metrics.compute(classes=WATER_CLASSES), expected, classes=2)
+
+
+def test_keys_outside_grouping_are_discarded():
+    predictions, target = random_batch(2)
+    activation = torch.tensor([10, 15, 20, 40])
+    metrics = ConfusionMetrics(NUM_CLASSES, {"activation": [10, 20, 30]}, ignore_index=IGNORE_INDEX)
+    metrics.update(predictions, target, activation=activation)
+
+    assert_scores_close(metrics.compute(), torchmetrics_scores(predictions, target), classes=3)
+    for key, sample in [(10, 0), (20, 2)]:
+        assert metrics.sample_count("activation", key) == 1
+        expected = torchmetrics_scores(predictions[sample : sample + 1], target[sample : sample + 1])
+        assert_scores_close(metrics.compute("activation", key), expected, classes=3)
+    assert metrics.sample_count("activation", 30) == 0
+    assert int(metrics.confusion("activation", 30).sum()) == 0
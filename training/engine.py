@@ -0,0 +1,380 @@
+from pathlib import Path
+
+import pyjson5
+import torch
+import torch.nn.functional as F
+import wandb
+from tqdm import tqdm
+
+from models.model_utilities import execution_model
+
+from utilities.batch_augmentations import get_batch_augmentations
+from utilities.metrics import METRICS, ConfusionMetrics
+from utilities.precision import PrecisionPolicy
+from utilities.utilities import (
+    create_loss,
+    create_optimizer,
+    init_lr_scheduler,
+    prepare_batch,
+)
+
+CLASS_LABELS = {0: "No water", 1: "Permanent Waters", 2: "Floods", 3: "Invalid pixels"}
+
+# Labels of METRICS in printed and logged scores
+METRIC_LABELS = ("Accuracy", "F-Score", "Precision", "Recall", "IoU")
+
+
+def score_log(prefix, scores):
+    # W&B entries of the per-class scores of the three classes
+    return {
+        f"{prefix} {label} ({CLASS_LABELS[cls]})": 100 * scores[name][cls].item()
+        for label, name in zip(METRIC_LABELS, METRICS)
+        for cls in range(3)
+    }
+
+
+# Model-call signatures of the collated inputs, see dataset.collate.input_layout
+def call_image(model, inputs):
+    # model(x) with the [B, C, H, W] channel concatenation of the acquisitions
+    return model(inputs)
+
+
+def call_pair(model, inputs):
+    # model(pre, post) with a [B, C, H, W] tensor per acquisition
+    return model(*inputs.unbind(1))
+
+
+def call_sequence(model, inputs):
+    # model(seq) with the [B, T, C, H, W] sequence of the acquisitions
+    return model(inputs)
+
+
+MODEL_CALLS = {"image": call_image, "pair": call_pair, "sequence": call_sequence}
+
+
+# Output adapters, turning model outputs into the loss and the predictions
+def default_outputs(output, mask, criterion, configs, model_configs):
+    return criterion(output, mask), output.argmax(1)
+
+
+def contrastive_outputs(output, mask, criterion, configs, model_configs):
+    # Only the first channels of contrastive models are class scores
+    output = output[:, : configs["num_classes"]]
+    return criterion(output, mask), output.argmax(1)
+
+
+def resize_mask(mask, size):
+    return F.interpolate(mask[:, None].float(), size=size, mode="nearest")[:, 0].long()
+
+
+def changeformer_outputs(output, mask, criterion, configs, model_configs):
+    # ChangeFormer predicts at several scales, the last one at full resolution
+    if model_configs["multi_scale_train"]:
+        loss = 0.0
+        for weight, pred in zip(model_configs["multi_pred_weights"], output):
+            target = mask
+            if pred.size(2) != mask.size(2):
+                target = resize_mask(mask, pred.shape[-2:])
+            loss = loss + weight * criterion(pred, target)
+    else:
+        loss = criterion(output[-1], mask)
+
+    final_output = output[-1]
+    if model_configs["multi_scale_infer"]:
+        size = final_output.shape[-2:]
+        final_output = sum(
+            F.interpolate(pred, size=size, mode="nearest") if pred.shape[-2:] != size else pred for pred in output
+        ) / len(output)
+    return loss, final_output.argmax(1)
+
+
+def output_adapter(configs):
+    if configs["method"] == "contrastive":
+        return contrastive_outputs
+    if configs["method"] == "changeformer":
+        return changeformer_outputs
+    return default_outputs
+
+
+def load_best_model(model, configs):
+    # Best checkpoint of a run, whole-model pickles of older runs are returned as is
+    path = Path(configs["checkpoint_path"]) / "best_segmentation.pt"
+    print("Loading model from: ", path)
+    checkpoint = torch.load(path, map_location=configs["device"])
+    if isinstance(checkpoint, torch.nn.Module):
+        return checkpoint
+    model.load_state_dict(checkpoint["model_state_dict"])
+    return model
+
+
+class Trainer:
+    """
+    Training loop shared by the segmentation, change detection and recurrent tasks.
+    A task configures it with:
+
+        model_call   how the collated input tensor is passed to the model, one of
+                     MODEL_CALLS (model(x), model(pre, post) or model(seq))
+        evaluate     evaluate(model, loader, settype=..., precision=...)
+                     -> (accuracy, fscore, miou)
+
+    Everything else (device transfer, scaling and augmentation of the batches,
+    execution mode, AMP, optimizer, LR schedule, metrics, checkpoints and W&B) is the
+    same for every task.
+    Checkpoints are written to configs["checkpoint_path"]: checkpoint_epoch=<n>.pt
+    every train_save_checkpoint_freq epochs, checkpoint_step.pt every
+    train_save_step_freq steps (0 disables it) and best_segmentation.pt for the best
+    validation mIoU, all holding the model, optimizer and LR scheduler states. With a
+    resumable sampler (see BalancedSampler) they also hold its position, so that
+    training resumed from checkpoint_step.pt continues its epoch after the samples
+    already trained on.
+    """
+
+    def __init__(self, model, configs, model_configs, model_call, evaluate):
+        self.model = model
+        self.configs = configs
+        self.model_configs = model_configs
+        self.model_call = model_call
+        self.evaluate = evaluate
+        self.outputs = output_adapter(configs)
+        self.precision = PrecisionPolicy.from_configs(configs)
+        self.eval_precision = PrecisionPolicy.eval_from_configs(configs)
+        self.checkpoint_path = Path(configs["checkpoint_path"])
+        self.checkpoint_path.mkdir(parents=True, exist_ok=True)
+
+    def init_wandb(self):
+        id_path = self.checkpoint_path / "id.json"
+        if self.configs["resume_wandb"]:
+            wid = pyjson5.load(open(id_path, "rb"))["run_id"]
+        else:
+            # Store wandb id to continue run
+            wid = wandb.util.generate_id()
+            pyjson5.dump({"run_id": str(wid)}, open(id_path, "wb"), quote_keys=True)
+        wandb.init(
+            project=self.configs["wandb_project"],
+            entity=self.configs["wandb_entity"],
+            config=self.configs,
+            id=wid,
+            resume="allow",
+        )
+        wandb.watch(self.model, log_freq=20)
+
+    def save(self, name, epoch, loss, sampler_state=None):
+        # `epoch` is the last completed epoch, `sampler_state` where the train sampler
+        # resumes
+        checkpoint = {
+            "epoch": epoch,
+            "model_state_dict": self.model.state_dict(),
+            "optimizer_state_dict": self.optimizer.state_dict(),
+            "lr_scheduler_state_dict": self.lr_scheduler.state_dict(),
+            "loss": loss,
+        }
+        if sampler_state is not None:
+            checkpoint["sampler_state_dict"] = sampler_state
+        torch.save(checkpoint, self.checkpoint_path / name)
+
+    def log_train(self, epoch, index, loss, metrics, activations):
+        # `loss` is the loss tensor of the step, the metrics cover its batch
+        configs = self.configs
+        if not (configs["on_screen_prints"] or configs["wandb_activate"]):
+            return
+        loss = loss.item()
+        scores = metrics.compute()
+        mean_iou = scores["iou"][:3].mean().item()
+        lr = self.lr_scheduler.get_last_lr()[0]
+        if configs["on_screen_prints"]:
+            print(f"Epoch: {epoch}")
+            print(f"Iteration: {index}")
+            print(f"Train Loss: {loss}")
+            for label, name in zip(METRIC_LABELS, METRICS):
+                for cls in range(3):
+                    value = 100 * scores[name][cls].item()
+                    print(f"Train {label} ({CLASS_LABELS[cls]}): {value}")
+            print(f"Train MeanIoU: {mean_iou * 100}")
+            print(f"lr: {lr}")
+        elif configs["wandb_activate"]:
+            log_dict = {"Epoch": epoch, "Iteration": index, "Train Loss": loss}
+            log_dict.update(score_log("Train", scores))
+            log_dict.update({"Train MeanIoU": mean_iou * 100, "lr": lr})
+            if configs["log_AOI_metrics"]:
+                for activ_i in activations:
+                    activ_scores = metrics.compute("activation", activ_i)
+                    log_dict.update(score_log(f"Train AOI {activ_i}", activ_scores))
+                    log_dict[f"Train AOI {activ_i} MeanIoU"] = activ_scores["iou"][:3].mean().item() * 100
+            wandb.log(log_dict)
+
+    def train_epoch(self, epoch, loader, criterion, metrics):
+        """
+        Train for an epoch and return the loss of its last step. The train metrics
+        logged every print_frequency steps are those of the batch of that step, as in
+        the trainers before the engine, the progress bar shows the mean loss of the
+        epoch's samples so far. With configs["sync_free_step"] the loss is accumulated
+        on the device and only read back every print_frequency steps and at the end
+        of the epoch, so that steps are queued without waiting for the device.
+        """
+        configs = self.configs
+        sync_free = configs["sync_free_step"]
+        self.runner.train()
+        # Running sum of the batch losses, in double as the Python floats it replaces
+        train_loss = torch.zeros((), dtype=torch.float64, device=configs["device"])
+        samples_seen = 0
+        loss_val = None
+        # The loader prefetches ahead of training, even into the next epoch, so step
+        # checkpoints resume the sampler state of the epoch start after the samples
+        # trained on
+        sampler_state = None
+        if hasattr(loader.sampler, "state_dict"):
+            sampler_state = loader.sampler.state_dict()
+            start_offset = sampler_state["offset"]
+        step_freq = configs["train_save_step_freq"]
+        with tqdm(total=len(loader), desc=f"Epoch {epoch}") as pbar:
+            for index, batch in enumerate(loader):
+                self.optimizer.zero_grad()
+                # Inputs arrive laid out by the loader's InputCollate, they are
+                # augmented and scaled in fp32
+                batch = prepare_batch(batch, configs, self.scale_lookup, self.batch_augmentations)
+                with self.precision.autocast():
+                    output = self.model_call(self.runner, batch.inputs)
+                    loss, predictions = self.outputs(output, batch.mask, criterion, configs, self.model_configs)
+
+                if self.scaler is not None:
+                    self.scaler.scale(loss).backward()
+                    self.scaler.step(self.optimizer)
+                    self.scaler.update()
+                else:
+                    loss.backward()
+                    self.optimizer.step()
+
+                # The loss is averaged over the batch, multiplied back by its size
+                loss_val = loss.detach().double()
+                train_loss += loss_val * batch.inputs.size(0)
+                samples_seen += batch.inputs.size(0)
+                if not sync_free:
+                    # Read back every step, as the loops before the engine did
+                    loss_val.item()
+
+                if index % configs["print_frequency"] == 0:
+                    mean_loss = (train_loss / samples_seen).item()
+                    pbar.set_description(f"({epoch}) Train Loss: {mean_loss:.4f}")
+                    # The logging window is the batch of this step alone
+                    metrics.update(predictions, batch.mask, activation=batch.activation)
+                    self.log_train(epoch, index, loss_val, metrics, loader.dataset.activations)
+                    metrics.reset()
+                if step_freq and (index + 1) % step_freq == 0:
+                    if sampler_state is not None:
+                        sampler_state["offset"] = start_offset + samples_seen
+                    self.save(
+                        "checkpoint_step.pt",
+                        epoch - 1,
+                        loss_val.item(),
+                        sampler_state=sampler_state,
+                    )
+                pbar.update(1)
+        return None if loss_val is None else loss_val.item()
+
+    def fit(self, train_loader, val_loader):
+        configs = self.configs
+        if configs["wandb_activate"]:
+            self.init_wandb()
+
+        # Forward passes run in configs["execution_mode"], checkpoints hold self.model
+        self.runner = execution_model(self.model, configs)
+        criterion = create_loss(configs, mode="train")
+        self.optimizer = create_optimizer(self.model, configs, self.model_configs)
+        self.lr_scheduler = init_lr_scheduler(self.optimizer, configs, self.model_configs, steps=len(train_loader))
+        # Creates a GradScaler once at the beginning of training, fp16 only
+        self.scaler = self.precision.grad_scaler()
+
+        # Augmentations of the batch engine run on the training device
+        self.batch_augmentations = get_batch_augmentations(configs)
+
+        # Inputs are scaled per batch on the training device
+        self.scale_lookup = train_loader.dataset.scale_lookup
+        if self.scale_lookup is not None:
+            self.scale_lookup = self.scale_lookup.to(configs["device"])
+
+        start_epoch = 0
+        if configs["resume_checkpoint"]:
+            checkpoint = torch.load(configs["resume_checkpoint"], map_location="cpu")
+            start_epoch = checkpoint.get("epoch", -1) + 1
+
+        groupings = {}
+        if configs["log_AOI_metrics"]:
+            groupings["activation"] = train_loader.dataset.activations
+
+        print(f"===== checkpoint_path: {self.checkpoint_path} ====")
+        best_val = 0.0
+        val_scores = None
+        # Confusion of the logged train steps, reset after every log
+        metrics = ConfusionMetrics(configs["num_classes"] + 1, groupings, device=configs["device"])
+        for epoch in range(start_epoch, configs["epochs"]):
+            loss_val = self.train_epoch(epoch, train_loader, criterion, metrics)
+
+            if epoch % configs["train_save_checkpoint_freq"] == 0:
+                # The sampler has moved on to the next epoch
+                train_sampler_state = None
+                if hasattr(train_loader.sampler, "state_dict"):
+                    train_sampler_state = train_loader.sampler.state_dict()
+                self.save(
+                    f"checkpoint_epoch={epoch}.pt",
+                    epoch,
+                    loss_val,
+                    sampler_state=train_sampler_state,
+                )
+
+            # Update LR scheduler
+            self.lr_scheduler.step()
+
+            # Evaluate on validation set
+            self.runner.eval()
+            val_scores = self.evaluate(self.runner, val_loader, settype="Validation", precision=self.eval_precision)
+            val_acc, val_score, miou = val_scores
+
+            if miou > best_val:
+                print("Epoch: ", epoch)
+                print("New best validation mIoU: ", miou)
+                if configs["wandb_activate"]:
+                    wandb.log({"Best Validation mIOU": miou})
+                print("Saving model to: ", self.checkpoint_path / "best_segmentation.pt")
+                best_val = miou
+                self.save("best_segmentation.pt", epoch, loss_val)
+                with open(self.checkpoint_path / "best_segmentation.txt", "w") as f:
+                    f.write(f"{epoch}\n")
+                    f.write(f"{miou}")
+
+        reduced = self.precision.reduced or self.eval_precision.reduced
+        if val_scores is not None and reduced and configs["precision_delta"]:
+            self.report_precision_delta(val_loader, val_scores)
+
+    def report_precision_delta(self, loader, scores):
+        """
+        Validation scores of the final model in reduced precision minus those in fp32.
+        `scores` are those of its last validation, in eval_precision, the other side
+        is evaluated anew: fp32 for a reduced eval_precision, else the training
+        precision.
+        """
+        if self.eval_precision.reduced:
+            precision = self.eval_precision
+            fp32_scores = self.evaluate(
+                self.runner,
+                loader,
+                settype="Validation fp32",
+                precision=PrecisionPolicy("fp32", self.configs["device"]),
+            )
+        else:
+            precision, fp32_scores = self.precision, scores
+            scores = self.evaluate(
+                self.runner,
+                loader,
+                settype=f"Validation {precision.precision}",
+                precision=precision,
+            )
+        name = precision.precision
+        log_dict = {}
+        for label, value, fp32_value in zip(("Accuracy", "F-Score", "mIoU"), scores, fp32_scores):
+            delta = torch.as_tensor(value) - torch.as_tensor(fp32_value)
+            # Mean over the three classes for per-class scores
+            delta = delta.flatten()[:3].mean().item()
+            print(f"Validation {label} delta ({name} - fp32): {delta}")
+            log_dict[f"Validation {label} delta ({name} - fp32)"] = delta
+        if self.configs["wandb_activate"]:
+            wandb.log(log_dict)
@@ -9,6 +9,7 @@ from tqdm import tqdm
 from models.vision_transformer import ViT
 import dataset.Dataset as Dataset
 from models import mae as mae_model
+from utilities.precision import PrecisionPolicy
 
 
 def adjust_learning_rate(optimizer, epoch, configs):
@@ -17,12 +18,7 @@ def adjust_learning_rate(optimizer, epoch, configs):
         lr = configs["lr"] * epoch / configs["warmup_epochs"]
     else:
         lr = configs["min_lr"] + (configs["lr"] - configs["min_lr"]) * 0.5 * (
-            1.0
-            + math.cos(
-                math.pi
-                * (epoch - configs["warmup_epochs"])
-                / (configs["epochs"] - configs["warmup_epochs"])
-            )
+            1.0 + math.cos(math.pi * (epoch - configs["warmup_epochs"]) / (configs["epochs"] - configs["warmup_epochs"]))
         )
     for param_group in optimizer.param_groups:
         if "lr_scale" in param_group:
@@ -37,11 +33,9 @@ def get_current_learning_rate(optimizer):
         return param_group["lr"]
 
 
-def train_epoch(loader, mae, optimizer, epoch, configs, scaler):
+def train_epoch(loader, mae, optimizer, epoch, configs, scaler, precision):
     mae.train()
-    configs["num_steps_per_epoch"] = (
-        configs["num_samples_per_epoch"] // configs["batch_size"]
-    )
+    configs["num_steps_per_epoch"] = configs["num_samples_per_epoch"] // configs["batch_size"]
     num_steps_per_epoch = configs["num_steps_per_epoch"]
 
     device = configs["gpu"]
@@ -68,16 +62,14 @@ def train_epoch(loader, mae, optimizer, epoch, configs, scaler):
             or (idx + 1) == num_steps_per_epoch
         ):
             optimizer.zero_grad()
-        with torch.cuda.amp.autocast(enabled=configs["mixed_precision"]):
+        with precision.autocast():
             if (
                 configs["accumulate_gradients"] is None
                 or (idx + 1) % batches_to_accumulate == 0
                 or (idx + 1) == num_steps_per_epoch
             ):
                 # we use a per iteration (instead of per epoch) lr scheduler as done in official MAE implementation
-                adjust_learning_rate(
-                    optimizer, idx / num_steps_per_epoch + epoch, configs
-                )
+                adjust_learning_rate(optimizer, idx / num_steps_per_epoch + epoch, configs)
 
             image, flood, pre_event_1, pre_event_2 = batch
 
@@ -114,7 +106,7 @@ def train_epoch(loader, mae, optimizer, epoch, configs, scaler):
             or (idx + 1) % batches_to_accumulate == 0
             or (idx + 1) == num_steps_per_epoch
         ):
-            if configs["mixed_precision"]:
+            if scaler is not None:
                 scaler.scale(loss).backward()
                 scaler.step(optimizer)
                 scaler.update()
@@ -133,13 +125,15 @@ def train(configs):
     print("=" * 20)
     mae_configs = json.load(open("configs/method/mae/mae.json", "r"))
     configs.update(mae_configs)
-    if configs["mixed_precision"]:
-        # Creates a GradScaler once at the beginning of training.
-        scaler = torch.cuda.amp.GradScaler()
-    else:
-        scaler = None
+    precision = PrecisionPolicy.from_configs(configs)
+    # Creates a GradScaler once at the beginning of training, fp16 only.
+    scaler = precision.grad_scaler()
 
-    train_dataset = Dataset.SSLDataset(configs=configs)
+    if configs.get("ssl_shards") is not None:
+        # Sequential shards streamed by every worker through a shuffle buffer
+        train_dataset = Dataset.ShardedSSLDataset(configs=configs)
+    else:
+        train_dataset = Dataset.SSLDataset(configs=configs)
 
     loader = torch.utils.data.DataLoader(
         train_dataset,
@@ -175,9 +169,7 @@ def train(configs):
     )
     model = mae_model.MAE(
         encoder=v,
-        masking_ratio=configs[
-            "masked_ratio"
-        ],  # the paper recommended 75% masked patches
+        masking_ratio=configs["masked_ratio"],  # the paper recommended 75% masked patches
         decoder_dim=configs["decoder_dim"],  # paper showed good results with just 512
         decoder_depth=configs["decoder_depth"],  # anywhere from 1 to 8
         decoder_heads=configs["decoder_heads"],  # attention heads for decoder
@@ -202,26 +194,22 @@ def train(configs):
     else:
         start_epoch = configs["start_epoch"]
     for epoch in range(start_epoch, configs["epochs"]):
-        train_epoch(loader, model, optimizer, epoch, configs, scaler)
+        if isinstance(train_dataset, Dataset.ShardedSSLDataset):
+            train_dataset.set_epoch(epoch)
+        train_epoch(loader, model, optimizer, epoch, configs, scaler, precision)
         if epoch % 1 == 0:
             torch.save(
                 model.state_dict(),
-                os.path.join(
-                    configs["checkpoint_path"], "mae_" + str(epoch) + ".pt"
-                ),
+                os.path.join(configs["checkpoint_path"], "mae_" + str(epoch) + ".pt"),
             )
             torch.save(
                 model.encoder,
-                os.path.join(
-                    configs["checkpoint_path"], "vit_" + str(epoch) + ".pt"
-                ),
+                os.path.join(configs["checkpoint_path"], "vit_" + str(epoch) + ".pt"),
             )
 
     torch.save(
         model.encoder.state_dict(),
-        os.path.join(
-            configs["checkpoint_path"], "mae_vit_" + str(configs["epochs"]) + ".pt"
-        ),
+        os.path.join(configs["checkpoint_path"], "mae_vit_" + str(configs["epochs"]) + ".pt"),
     )
     torch.save(
         model.encoder,
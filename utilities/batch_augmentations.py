@@ -0,0 +1,335 @@
+import math
+
+import torch
+import torch.nn.functional as F
+
+# OpenCV interpolation and border flags used in the augmentation config
+INTERPOLATIONS = {0: "nearest", 1: "bilinear", 2: "bicubic", 3: "bilinear", 4: "bicubic"}
+BORDER_MODES = {0: "zeros", 1: "border", 2: "reflection", 4: "reflection"}
+
+
+def sample_uniform(low, high, batch_size, device):
+    return torch.empty(batch_size, device=device).uniform_(low, high)
+
+
+def sample_apply(p, batch_size, device):
+    # Per sample draw of whether an op is applied
+    return torch.rand(batch_size, device=device) < p
+
+
+def gaussian_blur(images, sigma, kernel_size):
+    """
+    Blur every sample of `images` [B, C, H, W] with its own `sigma` [B] using a
+    separable kernel of `kernel_size` and reflected borders.
+    """
+    batch_size, channels, height, width = images.shape
+    kernel_size = min(kernel_size, 2 * (min(height, width) - 1) + 1)
+    radius = kernel_size // 2
+    x = torch.arange(-radius, radius + 1, device=images.device, dtype=images.dtype)
+    kernel = torch.exp(-(x[None, :] ** 2) / (2 * sigma[:, None].to(images.dtype) ** 2))
+    kernel = kernel / kernel.sum(dim=1, keepdim=True)
+    kernel = kernel.repeat_interleave(channels, dim=0)
+
+    # Every (sample, channel) pair is a separate group of a single convolution
+    out = images.reshape(1, batch_size * channels, height, width)
+    out = F.pad(out, (radius, radius, 0, 0), mode="reflect")
+    out = F.conv2d(out, kernel[:, None, None, :], groups=batch_size * channels)
+    out = F.pad(out, (0, 0, radius, radius), mode="reflect")
+    out = F.conv2d(out, kernel[:, None, :, None], groups=batch_size * channels)
+    return out.reshape(batch_size, channels, height, width)
+
+
+def remap(images, masks, grid, mode="bilinear", padding_mode="zeros"):
+    # Sample images with `mode` and masks with nearest neighbours at `grid`
+    images = F.grid_sample(images, grid, mode=mode, padding_mode=padding_mode, align_corners=False)
+    masks = F.grid_sample(
+        masks.float(),
+        grid,
+        mode="nearest",
+        padding_mode=padding_mode,
+        align_corners=False,
+    )
+    return images, masks.long()
+
+
+class RandomResizedCrop:
+    def __init__(self, size, scale, interpolation=1, ratio=(3 / 4, 4 / 3), p=1.0):
+        self.size = size
+        self.scale = scale
+        self.ratio = ratio
+        self.mode = INTERPOLATIONS.get(interpolation, "bilinear")
+        self.p = p
+
+    def __call__(self, images, masks):
+        batch_size, _, height, width = images.shape
+        device = images.device
+        area = height * width * sample_uniform(*self.scale, batch_size, device)
+        log_ratio = sample_uniform(math.log(self.ratio[0]), math.log(self.ratio[1]), batch_size, device)
+        ratio = torch.exp(log_ratio)
+        crop_w = torch.sqrt(area * ratio).clamp(max=width)
+        crop_h = torch.sqrt(area / ratio).clamp(max=height)
+
+        # Samples the op is not applied to are resized as a whole
+        apply = sample_apply(self.p, batch_size, device)
+        crop_w = torch.where(apply, crop_w, torch.full_like(crop_w, width))
+        crop_h = torch.where(apply, crop_h, torch.full_like(crop_h, height))
+        x0 = torch.rand(batch_size, device=device) * (width - crop_w)
+        y0 = torch.rand(batch_size, device=device) * (height - crop_h)
+
+        theta = torch.zeros(batch_size, 2, 3, device=device)
+        theta[:, 0, 0] = crop_w / width
+        theta[:, 0, 2] = (x0 + crop_w / 2) / width * 2 - 1
+        theta[:, 1, 1] = crop_h / height
+        theta[:, 1, 2] = (y0 + crop_h / 2) / height * 2 - 1
+        grid = F.affine_grid(theta, (batch_size, 1, self.size, self.size), align_corners=False)
+        return remap(images, masks, grid, mode=self.mode, padding_mode="border")
+
+
+class HorizontalFlip:
+    def __init__(self, p=0.5):
+        self.p = p
+
+    def __call__(self, images, masks):
+        apply = sample_apply(self.p, images.shape[0], images.device)[:, None, None, None]
+        return (
+            torch.where(apply, images.flip(-1), images),
+            torch.where(apply, masks.flip(-1), masks),
+        )
+
+
+class VerticalFlip:
+    def __init__(self, p=0.5):
+        self.p = p
+
+    def __call__(self, images, masks):
+        apply = sample_apply(self.p, images.shape[0], images.device)[:, None, None, None]
+        return (
+            torch.where(apply, images.flip(-2), images),
+            torch.where(apply, masks.flip(-2), masks),
+        )
+
+
+class GaussianBlur:
+    def __init__(self, sigma_limit, p=0.5):
+        self.sigma_limit = sigma_limit
+        self.kernel_size = 2 * math.ceil(3 * sigma_limit[1]) + 1
+        self.p = p
+
+    def __call__(self, images, masks):
+        batch_size = images.shape[0]
+        sigma = sample_uniform(*self.sigma_limit, batch_size, images.device)
+        apply = sample_apply(self.p, batch_size, images.device)[:, None, None, None]
+        blurred = gaussian_blur(images, sigma, self.kernel_size)
+        return torch.where(apply, blurred, images), masks
+
+
+class ElasticTransform:
+    def __init__(
+        self,
+        alpha=1.0,
+        sigma=50,
+        alpha_affine=50,
+        interpolation=1,
+        border_mode=4,
+        same_dxdy=False,
+        approximate=False,
+        p=0.5,
+    ):
+        self.alpha = float(alpha)
+        self.sigma = float(sigma)
+        self.alpha_affine = float(alpha_affine)
+        self.mode = INTERPOLATIONS.get(interpolation, "bilinear")
+        self.padding_mode = BORDER_MODES.get(border_mode, "reflection")
+        self.same_dxdy = same_dxdy
+        # The approximate displacement smoothing uses a fixed 17x17 kernel
+        self.kernel_size = 17 if approximate else 2 * math.ceil(3 * self.sigma) + 1
+        self.p = p
+
+    def __call__(self, images, masks):
+        batch_size, _, height, width = images.shape
+        device = images.device
+
+        # Random affine from three jittered points around the center
+        center = torch.tensor([width / 2, height / 2], device=device)
+        square = min(height, width) // 3
+        src = torch.stack(
+            (
+                center + square,
+                center + torch.tensor([square, -square], device=device),
+                center - square,
+            )
+        )
+        src = src[None].expand(batch_size, 3, 2)
+        dst = src + torch.empty(batch_size, 3, 2, device=device).uniform_(-self.alpha_affine, self.alpha_affine)
+        # Output pixels are mapped back to input pixels, so solve dst -> src
+        ones = torch.ones(batch_size, 3, 1, device=device)
+        inverse = torch.linalg.solve(torch.cat((dst, ones), dim=2), src)
+
+        # Smoothed random displacement field
+        field_channels = 1 if self.same_dxdy else 2
+        field = torch.empty(batch_size, field_channels, height, width, device=device).uniform_(-1, 1)
+        sigma = torch.full((batch_size,), self.sigma, device=device)
+        field = gaussian_blur(field, sigma, self.kernel_size) * self.alpha
+        if self.same_dxdy:
+            field = field.expand(batch_size, 2, height, width)
+
+        ys, xs = torch.meshgrid(
+            torch.arange(height, device=device, dtype=torch.float32),
+            torch.arange(width, device=device, dtype=torch.float32),
+            indexing="ij",
+        )
+        points = torch.stack((xs, ys), dim=-1)[None] + field.permute(0, 2, 3, 1)
+        points = torch.cat((points, torch.ones_like(points[..., :1])), dim=-1)
+        source = torch.einsum("bhwk,bkj->bhwj", points, inverse)
+
+        # Pixel centers to the normalized coordinates of grid_sample
+        size = torch.tensor([width, height], device=device, dtype=torch.float32)
+        grid = (source + 0.5) / size * 2 - 1
+
+        apply = sample_apply(self.p, batch_size, device)
+        identity = F.affine_grid(
+            torch.eye(2, 3, device=device)[None].expand(batch_size, 2, 3),
+            (batch_size, 1, height, width),
+            align_corners=False,
+        )
+        grid = torch.where(apply[:, None, None, None], grid, identity)
+        return remap(images, masks, grid, mode=self.mode, padding_mode=self.padding_mode)
+
+
+class CoarseDropout:
+    def __init__(self, max_holes=8, max_height=8, max_width=8, fill_value=0, p=0.5):
+        self.max_holes = max_holes
+        self.max_height = max_height
+        self.max_width = max_width
+        self.fill_value = fill_value
+        self.p = p
+
+    def __call__(self, images, masks):
+        batch_size, _, height, width = images.shape
+        device = images.device
+        ys = torch.randint(0, height - self.max_height + 1, (batch_size, self.max_holes), device=device)
+        xs = torch.randint(0, width - self.max_width + 1, (batch_size, self.max_holes), device=device)
+        rows = torch.arange(height, device=device)
+        cols = torch.arange(width, device=device)
+        in_rows = (rows >= ys[..., None]) & (rows < ys[..., None] + self.max_height)
+        in_cols = (cols >= xs[..., None]) & (cols < xs[..., None] + self.max_width)
+        holes = (in_rows[..., :, None] & in_cols[..., None, :]).any(dim=1)
+
+        apply = sample_apply(self.p, batch_size, device)[:, None, None]
+        holes = (holes & apply)[:, None]
+        return images.masked_fill(holes, self.fill_value), masks
+
+
+class GaussNoise:
+    def __init__(self, var_limit=(10.0, 50.0), mean=0.0, p=0.5):
+        self.var_limit = var_limit
+        self.mean = mean
+        self.p = p
+
+    def __call__(self, images, masks):
+        batch_size = images.shape[0]
+        std = torch.sqrt(sample_uniform(*self.var_limit, batch_size, images.device))
+        apply = sample_apply(self.p, batch_size, images.device)[:, None, None, None]
+        noise = torch.randn_like(images) * std[:, None, None, None] + self.mean
+        return images + noise * apply, masks
+
+
+class MultiplicativeNoise:
+    def __init__(self, multiplier=(0.9, 1.1), p=0.5):
+        self.multiplier = multiplier
+        self.p = p
+
+    def __call__(self, images, masks):
+        batch_size = images.shape[0]
+        factor = sample_uniform(*self.multiplier, batch_size, images.device)
+        apply = sample_apply(self.p, batch_size, images.device)
+        factor = torch.where(apply, factor, torch.ones_like(factor))
+        return images * factor[:, None, None, None], masks
+
+
+class BatchAugmentations:
+    """
+    Applies the configured ops to whole batches of raw (unscaled) acquisitions, their
+    mask and valid pixel mask on the device they live on. Samples left without valid
+    pixels keep their original values, like in `Dataset.__getitem__`, resized to the
+    output size when an op such as RandomResizedCrop resizes the batch.
+    """
+
+    def __init__(self, ops):
+        self.ops = ops
+
+    def __call__(self, events, mask, valid):
+        channels = [event.shape[1] for event in events]
+        images = torch.cat([event.float() for event in events], dim=1)
+        # The valid pixel mask is transformed along with the mask
+        masks = torch.stack((mask, valid.long()), dim=1)
+
+        aug_images, aug_masks = images, masks
+        for op in self.ops:
+            aug_images, aug_masks = op(aug_images, aug_masks)
+
+        if aug_images.shape[-2:] != images.shape[-2:]:
+            # Resizing ops change the output size, the originals are resized as a whole
+            size = aug_images.shape[-2:]
+            images = F.interpolate(images, size=size, mode="bilinear", align_corners=False)
+            masks = F.interpolate(masks.float(), size=size, mode="nearest").long()
+        keep = (aug_masks[:, 1].flatten(1).sum(dim=1) > 0)[:, None, None, None]
+        aug_images = torch.where(keep, aug_images, images)
+        aug_masks = torch.where(keep, aug_masks, masks)
+
+        events = list(torch.split(aug_images, channels, dim=1))
+        return events, aug_masks[:, 0], aug_masks[:, 1].to(valid.dtype)
+
+
+def batch_engine_enabled(config):
+    return config["data_augmentations"] and config["augmentation_engine"] == "batch"
+
+
+def get_batch_augmentations(config):
+    # Same schema as `augmentations.get_augmentations`, used when the data config
+    # selects the batch augmentation engine
+    if not batch_engine_enabled(config):
+        return None
+    if config["scale_input"] == "custom":
+        # Custom scaling runs per sample in the loader, before batches are augmented
+        print('The batch augmentation engine does not support "custom" scaling, use the "sample" engine')
+        exit(2)
+
+    augmentations = config["augmentations"]
+    ops = []
+    for k, v in augmentations.items():
+        if k == "RandomResizedCrop":
+            aug = RandomResizedCrop(
+                size=v["value"],
+                scale=tuple(v["scale"]),
+                interpolation=v["interpolation"],
+                p=v["p"],
+            )
+        elif k == "HorizontalFlip":
+            aug = HorizontalFlip(p=v["p"])
+        elif k == "VerticalFlip":
+            aug = VerticalFlip(p=v["p"])
+        elif k == "GaussianBlur":
+            aug = GaussianBlur(sigma_limit=v["sigma_limit"], p=v["p"])
+        elif k == "ElasticTransform":
+            aug = ElasticTransform(
+                alpha=v["alpha"],
+                sigma=v["sigma"],
+                alpha_affine=v["alpha_affine"],
+                interpolation=v["interpolation"],
+                border_mode=v["border_mode"],
+                same_dxdy=v["same_dxdy"],
+                approximate=v["approximate"],
+                p=v["p"],
+            )
+        elif k == "Cutout":
+            aug = CoarseDropout(p=v["p"])
+        elif k == "GaussianNoise":
+            aug = GaussNoise(p=v["p"])
+        elif k == "MultNoise":
+            aug = MultiplicativeNoise(p=v["p"])
+        else:
+            continue
+        if v["p"] > 0:
+            ops.append(aug)
+    return BatchAugmentations(ops)
@@ -0,0 +1,120 @@
+import torch
+
+# Scores of `confusion_scores`, in the order the trainers unpack them
+METRICS = ("accuracy", "fscore", "precision", "recall", "iou")
+
+# Permanent waters and floods merged, for the "only water" scores
+WATER_CLASSES = [[0], [1, 2]]
+
+
+def confusion_scores(counts):
+    """
+    Per-class scores of a [..., class, class] confusion tensor (rows are targets,
+    columns predictions), as the multiclass torchmetrics with average="none" compute
+    them. Classes without support score 0.
+    """
+    counts = counts.double()
+    tp = counts.diagonal(dim1=-2, dim2=-1)
+    fp = counts.sum(-2) - tp
+    fn = counts.sum(-1) - tp
+
+    def divide(num, den):
+        return torch.where(den > 0, num / den.clamp(min=1), torch.zeros_like(num))
+
+    recall = divide(tp, tp + fn).float()
+    return {
+        # Multiclass accuracy of a class is its recall
+        "accuracy": recall,
+        "fscore": divide(2 * tp, 2 * tp + fp + fn).float(),
+        "precision": divide(tp, tp + fp).float(),
+        "recall": recall,
+        "iou": divide(tp, tp + fp + fn).float(),
+    }
+
+
+def merge_classes(counts, classes):
+    # Confusion of the merged classes, e.g. WATER_CLASSES, of a [..., C, C] tensor
+    rows = torch.stack([counts[..., group, :].sum(-2) for group in classes], dim=-2)
+    return torch.stack([rows[..., group].sum(-1) for group in classes], dim=-1)
+
+
+class ConfusionMetrics:
+    """
+    Segmentation metrics of an evaluation, accumulated on the device as a single
+    [group, class, class] confusion tensor. Group 0 holds every pixel, each grouping
+    (e.g. {"clz": [1, 2, 3], "activation": activation ids}) adds a group per key.
+    A batch is counted with one scatter_add for all groups, pixels of `ignore_index`
+    targets are left out. Scores of any group are derived from its confusion with
+    `compute`, also for merged classes (see WATER_CLASSES).
+    """
+
+    def __init__(self, num_classes, groupings=None, ignore_index=3, device="cpu"):
+        self.num_classes = num_classes
+        self.ignore_index = ignore_index
+        self.groupings = {}
+        groups = 1
+        for name, keys in (groupings or {}).items():
+            keys = torch.as_tensor(sorted(keys), dtype=torch.int64, device=device)
+            self.groupings[name] = (keys, groups)
+            groups += len(keys)
+
+        # The extra last cell collects the ignored pixels, the extra last group the
+        # samples of keys outside a grouping
+        cells = groups * num_classes * num_classes
+        self.cells = torch.zeros(cells + 1, dtype=torch.int64, device=device)
+        self.counts = self.cells[:-1].view(groups, num_classes, num_classes)
+        self.discarded = groups
+        self.samples = torch.zeros(groups + 1, dtype=torch.int64, device=device)
+
+    def groups(self, keys, batch_size):
+        # [grouping, B] group of every sample, the global group first. Samples with a
+        # key outside the grouping go to the discarded group
+        groups = [torch.zeros(batch_size, dtype=torch.int64, device=self.cells.device)]
+        for name, (grouping_keys, first) in self.groupings.items():
+            sample_keys = torch.as_tensor(keys[name]).to(grouping_keys.device)
+            index = torch.searchsorted(grouping_keys, sample_keys).clamp(max=len(grouping_keys) - 1)
+            member = grouping_keys[index] == sample_keys
+            groups.append(torch.where(member, first + index, torch.full_like(index, self.discarded)))
+        return torch.stack(groups)
+
+    def update(self, predictions, target, **keys):
+        """
+        Count a [B, H, W] batch of predictions against its target, with the [B] keys
+        of the samples for every grouping, e.g. update(predictions, mask, clz=clz).
+        """
+        groups = self.groups(keys, target.shape[0])
+        classes = self.num_classes * self.num_classes
+        cells = target * self.num_classes + predictions
+        pixel_shape = (1,) * (cells.dim() - 1)
+        cells = cells.unsqueeze(0) + groups.view(*groups.shape, *pixel_shape) * classes
+        discarded = (groups == self.discarded).view(*groups.shape, *pixel_shape)
+        ignored = (target == self.ignore_index).unsqueeze(0) | discarded
+        cells = torch.where(ignored, torch.full_like(cells, len(self.cells) - 1), cells)
+        self.cells.scatter_add_(0, cells.flatten(), torch.ones_like(self.cells[:1]).expand(cells.numel()))
+        self.samples.scatter_add_(0, groups.flatten(), torch.ones_like(self.samples[:1]).expand(groups.numel()))
+
+    def reset(self):
+        self.cells.zero_()
+        self.samples.zero_()
+
+    def group(self, grouping=None, key=None):
+        if grouping is None:
+            return 0
+        keys, first = self.groupings[grouping]
+        return first + keys.tolist().index(key)
+
+    def confusion(self, grouping=None, key=None):
+        return self.counts[self.group(grouping, key)]
+
+    def sample_count(self, grouping=None, key=None):
+        return self.samples[self.group(grouping, key)].item()
+
+    def compute(self, grouping=None, key=None, classes=None):
+        """
+        Per-class accuracy, fscore, precision, recall and iou of every pixel, or of the
+        samples of `key` in `grouping`. `classes` merges classes first.
+        """
+        counts = self.confusion(grouping, key)
+        if classes is not None:
+            counts = merge_classes(counts, classes)
+        return confusion_scores(counts)
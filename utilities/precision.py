@@ -0,0 +1,54 @@
+import torch
+
+# Autocast dtypes of configs["precision"], fp32 runs without autocast
+PRECISIONS = {"fp32": None, "bf16": torch.bfloat16, "fp16": torch.float16}
+
+
+class PrecisionPolicy:
+    """
+    Autocast precision of training or evaluation on a device (see `from_configs` and
+    `eval_from_configs`). fp16 needs a GradScaler and runs on GPU only, CPUs get bf16
+    instead. bf16 and fp32 train without loss scaling.
+    """
+
+    def __init__(self, precision, device):
+        if precision not in PRECISIONS:
+            print(f'Invalid precision "{precision}", options: ', list(PRECISIONS))
+            exit(2)
+        self.device_type = torch.device(device).type
+        if precision == "fp16" and self.device_type == "cpu":
+            print("fp16 autocast needs a GPU, using bf16 on CPU")
+            precision = "bf16"
+        if precision == "bf16" and self.device_type == "cuda" and not torch.cuda.is_bf16_supported():
+            print("bf16 is not supported by this GPU, use fp16 or fp32")
+            exit(2)
+        self.precision = precision
+        self.dtype = PRECISIONS[precision]
+
+    @classmethod
+    def from_configs(cls, configs):
+        # configs["precision"], or fp16 on GPU for the older "mixed_precision" flag
+        precision = configs.get("precision")
+        if precision is None:
+            device_type = torch.device(configs["device"]).type
+            use_fp16 = configs["mixed_precision"] and device_type == "cuda"
+            precision = "fp16" if use_fp16 else "fp32"
+        return cls(precision, configs["device"])
+
+    @classmethod
+    def eval_from_configs(cls, configs):
+        # Evaluation runs in fp32 unless configs["eval_precision"] asks for less
+        return cls(configs["eval_precision"], configs["device"])
+
+    @property
+    def reduced(self):
+        return self.dtype is not None
+
+    def autocast(self):
+        return torch.autocast(self.device_type, dtype=self.dtype, enabled=self.reduced)
+
+    def grad_scaler(self):
+        # Only fp16 gradients underflow without loss scaling
+        if self.precision == "fp16":
+            return torch.cuda.amp.GradScaler()
+        return None
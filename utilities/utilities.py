@@ -5,10 +5,12 @@ from pathlib import Path
 import segmentation_models_pytorch as smp
 import torch
 import torch.nn as nn
-from torchmetrics import Accuracy, F1Score, JaccardIndex, Precision, Recall
 from torchvision.transforms import Normalize
 
 import dataset.Dataset as Dataset
+from dataset.collate import ACQUISITIONS, InputCollate
+from dataset.dataset_index import DatasetIndex
+from dataset.samplers import BalancedSampler, LocalityShuffleSampler
 from .bce_and_dice import BCEandDiceLoss
 
 
@@ -61,9 +63,7 @@ def create_checkpoint_directory(configs, model_configs):
         )
     elif configs["task"] == "cd":
         run_ts = datetime.now().strftime("%Y%m%d%H%M%S")
-        checkpoint_path = (
-            "checkpoints/" + configs["method"].lower() + f'/{configs["track"]}_{run_ts}'
-        )
+        checkpoint_path = "checkpoints/" + configs["method"].lower() + f'/{configs["track"]}_{run_ts}'
     elif configs["task"] == "finetune":
         checkpoint_path = "checkpoints/finetuning"
     Path(checkpoint_path).mkdir(parents=True, exist_ok=True)
@@ -89,17 +89,39 @@ def prepare_loaders(configs):
         val_dataset = Dataset.SLCDataset(mode="val", configs=configs)
         test_dataset = Dataset.SLCDataset(mode="test", configs=configs)
     else:
-        train_dataset = Dataset.Dataset(mode="train", configs=configs)
-        val_dataset = Dataset.Dataset(mode="val", configs=configs)
-        test_dataset = Dataset.Dataset(mode="test", configs=configs)
+        # Grids, manifests, min-max stats, stores and the decoded tile cache are
+        # loaded once and shared by the three splits
+        index = DatasetIndex(configs)
+        train_dataset = Dataset.Dataset(mode="train", configs=configs, index=index)
+        val_dataset = Dataset.Dataset(mode="val", configs=configs, index=index)
+        test_dataset = Dataset.Dataset(mode="test", configs=configs, index=index)
+
+    train_sampler = None
+    if configs["oversampling"] and not configs.get("slc"):
+        # Balance positive and negative grids, reproducibly and resumably per epoch
+        train_sampler = BalancedSampler(train_dataset.records.rows["positive"], configs.get("positive_ratio", 0.5))
+        if configs["resume_checkpoint"]:
+            checkpoint = torch.load(configs["resume_checkpoint"])
+            if "sampler_state_dict" in checkpoint:
+                train_sampler.load_state_dict(checkpoint["sampler_state_dict"])
+    elif configs.get("shuffle_buffer"):
+        # Shuffle in chunks of adjacent grids so that reads stay close on disk
+        train_sampler = LocalityShuffleSampler(train_dataset.records.paths(), configs["shuffle_buffer"])
+
+    # Samples are collated straight into the model input layout of the trainer
+    collate_fn = InputCollate(configs)
+    # Train samples of the batch augmentation engine carry their valid pixel masks
+    train_collate_fn = InputCollate(configs, valid_mask=getattr(train_dataset, "return_valid_mask", False))
 
     train_loader = torch.utils.data.DataLoader(
         train_dataset,
         batch_size=batch_size,
-        shuffle=True,
+        shuffle=train_sampler is None,
+        sampler=train_sampler,
         num_workers=workers,
         pin_memory=True,
         drop_last=True,
+        collate_fn=train_collate_fn,
     )
 
     val_loader = torch.utils.data.DataLoader(
@@ -109,6 +131,7 @@ def prepare_loaders(configs):
         num_workers=workers,
         pin_memory=True,
         drop_last=False,
+        collate_fn=collate_fn,
     )
 
     test_loader = torch.utils.data.DataLoader(
@@ -118,6 +141,7 @@ def prepare_loaders(configs):
         num_workers=workers,
         pin_memory=True,
         drop_last=False,
+        collate_fn=collate_fn,
     )
 
     print("Samples in Train Set: ", len(train_loader.dataset))
@@ -126,143 +150,73 @@ def prepare_loaders(configs):
     return train_loader, val_loader, test_loader
 
 
-def reverse_scale_img(img, x1, x2, configs):
-    if configs["scale_input"] == "normalize":
-        # x1 is the means, x2 the stds
-        if img.ndim == 4:
-            return (img * x2[:, :, None, None]) + x1[:, :, None, None]
-        else:
-            return (img * x2[:, None, None]) + x1[:, None, None]
-    elif configs["scale_input"] in ["min-max", "custom"]:
-        # x1 is the mins, x2 is the maxs
-        if len(configs["channels"]) == 2:
-            if img.ndim == 4:
-                new_ch0 = (
-                    img[:, 0, :, :]
-                    * (
-                        x2[:, :, None, None][:, 0, :, :]
-                        - x1[:, :, None, None][:, 0, :, :]
-                    )
-                ) + x1[:, :, None, None][:, 0, :, :]
-                new_ch1 = (
-                    img[:, 1, :, :]
-                    * (
-                        x2[:, :, None, None][:, 1, :, :]
-                        - x1[:, :, None, None][:, 1, :, :]
-                    )
-                ) + x1[:, :, None, None][:, 1, :, :]
-                return torch.cat(
-                    (new_ch0[:, None, :, :], new_ch1[:, None, :, :]), dim=1
-                )
-            else:
-                new_ch0 = (
-                    img[0, :, :]
-                    * (x2[:, None, None][0, :, :] - x1[:, None, None][0, :, :])
-                ) + x1[:, None, None][0, :, :]
-                new_ch1 = (
-                    img[1, :, :]
-                    * (x2[:, None, None][1, :, :] - x1[:, None, None][1, :, :])
-                ) + x1[:, None, None][1, :, :]
-                return torch.cat((new_ch0[None, :, :], new_ch1[None, :, :]), dim=0)
-        else:
-            if img.ndim == 4:
-                return (img * (x2[:, None, None] - x1[:, None, None])) + x1[
-                    :, None, None
-                ]
-            else:
-                return (img * (x2 - x1)) + x1
-    elif isinstance(configs["scale_input"], list):
-        # x1 is the mins, x2 is the maxs
-        # The required min and max values are given
-        new_min, new_max = [torch.tensor(i) for i in configs["scale_input"]]
-
-        if len(configs["channels"]) == 2:
-            mid_img = (img - new_min) / (new_max - new_min)
-
-            if img.ndim == 4:
-                new_ch0 = (
-                    mid_img[:, 0, :, :]
-                    * (
-                        x2[:, :, None, None][:, 0, :, :]
-                        - x1[:, :, None, None][:, 0, :, :]
-                    )
-                ) + x1[:, :, None, None][:, 0, :, :]
-                new_ch1 = (
-                    mid_img[:, 1, :, :]
-                    * (
-                        x2[:, :, None, None][:, 1, :, :]
-                        - x1[:, :, None, None][:, 1, :, :]
-                    )
-                ) + x1[:, :, None, None][:, 1, :, :]
-
-                new_img = torch.cat(
-                    (new_ch0[:, None, :, :], new_ch1[:, None, :, :]), dim=1
-                )
-            else:
-                new_ch0 = (
-                    mid_img[0, :, :]
-                    * (x2[:, None, None][0, :, :] - x1[:, None, None][0, :, :])
-                ) + x1[:, None, None][0, :, :]
-                new_ch1 = (
-                    mid_img[1, :, :]
-                    * (x2[:, None, None][1, :, :] - x1[:, None, None][1, :, :])
-                ) + x1[:, None, None][1, :, :]
-
-                new_img = torch.cat((new_ch0[None, :, :], new_ch1[None, :, :]), dim=0)
-
-            return new_img
-        else:
-            if img.ndim == 4:
-                return (
-                    torch.mul(
-                        (img - new_min[:, None, None])
-                        / (new_max[:, None, None] - new_min[:, None, None]),
-                        (x2[:, None, None] - x1[:, None, None]),
-                    )
-                    + x1[:, None, None]
-                )
-            else:
-                return torch.mul((img - new_min) / (new_max - new_min), (x2 - x1)) + x1
-
-
-def initialize_metrics(configs, mode="all"):
-    accuracy = Accuracy(
-        task="multiclass",
-        average="none",
-        multidim_average="global",
-        num_classes=configs["num_classes"] + 1,
-        ignore_index=3,
-    ).to(configs["device"])
-    fscore = F1Score(
-        task="multiclass",
-        num_classes=configs["num_classes"] + 1,
-        average="none",
-        multidim_average="global",
-        ignore_index=3,
-    ).to(configs["device"])
-    precision = Precision(
-        task="multiclass",
-        average="none",
-        num_classes=configs["num_classes"] + 1,
-        multidim_average="global",
-        ignore_index=3,
-    ).to(configs["device"])
-    recall = Recall(
-        task="multiclass",
-        average="none",
-        num_classes=configs["num_classes"] + 1,
-        multidim_average="global",
-        ignore_index=3,
-    ).to(configs["device"])
-    iou = JaccardIndex(
-        task="multiclass",
-        num_classes=configs["num_classes"] + 1,
-        average="none",
-        multidim_average="global",
-        ignore_index=3,
-    ).to(configs["device"])
-
-    return accuracy, fscore, precision, recall, iou
+def scale_img(img, activation, acquisition, scale_lookup):
+    # Scale a [B, C, H, W] batch of `acquisition` images with the parameters of the
+    # activation of every sample, in a single broadcast op on the lookup's device
+    img = img.to(scale_lookup.device)
+    if img.shape[1] == 0:
+        return img
+    params = scale_lookup.lookup(activation, acquisition)
+    return torch.addcmul(params[:, :, 0, None, None], img, params[:, :, 1, None, None])
+
+
+def prepare_batch(batch, configs, scale_lookup=None, batch_augmentations=None):
+    # Move an InputBatch to the device in a single copy, then augment and scale its
+    # acquisitions in place there, in the order of the per-sample pipeline: the ops
+    # act on raw backscatter. The DEM is neither augmented nor scaled.
+    batch = batch.to(configs["device"])
+    if batch_augmentations is not None and batch.valid is not None:
+        # Only train batches of the Dataset carry the valid masks of the ops
+        names = ["pre_event_1", "pre_event_2", "post_event"]
+        events, mask, batch.valid = batch_augmentations([batch.field(name) for name in names], batch.mask, batch.valid)
+        batch.update(dict(zip(names, events)), mask)
+    if scale_lookup is not None:
+        batch.update(
+            {name: scale_img(batch.field(name), batch.activation, acq, scale_lookup) for name, acq in ACQUISITIONS.items()}
+        )
+    return batch
+
+
+def reverse_scale_img(img, activation, acquisition, scale_lookup):
+    # Undo `scale_img` on a [C, H, W] image of `activation` or a [B, C, H, W] batch of
+    # `activation` ids, extra channels such as the DEM are returned as they are
+    params = scale_lookup.lookup(activation, acquisition).to(img.device)
+    channels = params.shape[-2]
+    offset = params[..., 0, None, None]
+    scale = params[..., 1, None, None]
+    scaled = img.narrow(-3, 0, channels)
+    rest = img.narrow(-3, channels, img.shape[-3] - channels)
+    return torch.cat(((scaled - offset) / scale, rest), dim=-3)
+
+
+def create_optimizer(model, configs, model_configs):
+    optimizer_name = model_configs.get("optimizer", "adam")
+    if optimizer_name == "adam":
+        optimizer = torch.optim.Adam(model.parameters(), lr=model_configs["learning_rate"])
+    elif optimizer_name == "adamw":
+        optimizer = torch.optim.AdamW(
+            model.parameters(),
+            lr=model_configs["learning_rate"],
+            betas=model_configs["betas"],
+            weight_decay=model_configs["weight_decay"],
+        )
+    elif optimizer_name == "sgd":
+        optimizer = torch.optim.SGD(
+            model.parameters(),
+            lr=model_configs["learning_rate"],
+            momentum=model_configs["momentum"],
+            weight_decay=model_configs["weight_decay"],
+        )
+    else:
+        raise NotImplementedError(f"{optimizer_name} optimizer is not yet implemented!")
+
+    # Load checkpoint (if any)
+    if configs["resume_checkpoint"]:
+        checkpoint = torch.load(configs["resume_checkpoint"], map_location="cpu")
+        if "optimizer_state_dict" in checkpoint:
+            optimizer.load_state_dict(checkpoint["optimizer_state_dict"])
+
+    return optimizer
 
 
 def init_lr_scheduler(optimizer, configs, model_configs, model_name=None, steps=None):
@@ -276,25 +230,19 @@ def init_lr_scheduler(optimizer, configs, model_configs, model_name=None, steps=
     if lr_schedule == "cosine":
         lr_scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, steps)
     elif lr_schedule is None:
-        lr_scheduler = torch.optim.lr_scheduler.LambdaLR(
-            optimizer, lambda _: 1, last_epoch=-1
-        )
+        lr_scheduler = torch.optim.lr_scheduler.LambdaLR(optimizer, lambda _: 1, last_epoch=-1)
     elif lr_schedule == "linear":
 
         def lambda_rule(epoch):
             lr_l = 1.0 - epoch / float(configs["epochs"] + 1)
             return lr_l
 
-        lr_scheduler = torch.optim.lr_scheduler.LambdaLR(
-            optimizer, lr_lambda=lambda_rule
-        )
+        lr_scheduler = torch.optim.lr_scheduler.LambdaLR(optimizer, lr_lambda=lambda_rule)
     elif lr_schedule == "step":
         step_size = configs["epochs"] // 3
         scheduler = lr_scheduler.StepLR(optimizer, step_size=step_size, gamma=0.1)
     else:
-        raise NotImplementedError(
-            f"{lr_schedule} LR scheduling is not yet implemented!"
-        )
+        raise NotImplementedError(f"{lr_schedule} LR scheduling is not yet implemented!")
 
     # Load checkpoint (if any)
     if configs["resume_checkpoint"]:
@@ -314,9 +262,7 @@ def create_loss(configs, mode="val"):
         if mode == "train":
             print("Creating cross entropy loss with class weights")
             print(class_weights)
-            return nn.CrossEntropyLoss(weight=class_weights, ignore_index=3).to(
-                configs["device"]
-            )
+            return nn.CrossEntropyLoss(weight=class_weights, ignore_index=3).to(configs["device"])
         else:
             return nn.CrossEntropyLoss(ignore_index=3).to(configs["device"])
 
@@ -339,12 +285,12 @@ def create_loss(configs, mode="val"):
             reduction="mean",
             force_reload=False,
         ).to(configs["device"])
-    elif configs['loss_function'] == 'ce+dice':
-        if 'class_weights' in configs.keys():
-            class_weights = torch.tensor(configs['class_weights'])
+    elif configs["loss_function"] == "ce+dice":
+        if "class_weights" in configs.keys():
+            class_weights = torch.tensor(configs["class_weights"])
         else:
             class_weights = torch.tensor([1.0, 1.0, 1.0])
-        return BCEandDiceLoss(weights=class_weights, ignore_index=3, use_softmax=True).to(configs['device'])
+        return BCEandDiceLoss(weights=class_weights, ignore_index=3, use_softmax=True).to(configs["device"])
 
 
 def update_config(config, args=None):
@@ -368,26 +314,24 @@ def update_config(config, args=None):
 
     if config["task"] == "self-supervised" or config["data_augmentations"]:
         # Load augmentation settings
-        augmentation_config = json.load(
-            open("configs/augmentations/augmentation.json", "r")
-        )
+        augmentation_config = json.load(open("configs/augmentations/augmentation.json", "r"))
         config.update(augmentation_config)
 
     # Compute total number of input channels
-    if (config['task'] == 'cd') or (config['method'] == 'convlstm'):
-        config['num_channels'] = len(config['channels'])
-        if config['dem']:
-            config['num_channels'] += 1
+    if (config["task"] == "cd") or (config["method"] == "convlstm"):
+        config["num_channels"] = len(config["channels"])
+        if config["dem"]:
+            config["num_channels"] += 1
     else:
-        config['num_channels'] = len(config['channels']) * len(config['inputs'])
-        if config['dem']:
-            config['num_channels'] += 1
+        config["num_channels"] = len(config["channels"]) * len(config["inputs"])
+        if config["dem"]:
+            config["num_channels"] += 1
 
     if "slc" in config and config["slc"]:
-        if config['dem']:
+        if config["dem"]:
             config["num_channels"] = ((config["num_channels"] - 1) * 2) + 1
         else:
-            config["num_channels"] = config["num_channels"]*2
+            config["num_channels"] = config["num_channels"] * 2
 
     if config["weighted"] and config["track"] == "RandomEvents":
         config["class_weights"] = [
@@ -412,10 +356,10 @@ def update_config(config, args=None):
     return config
 
 
-def define_tracks(configs):        
-    train_acts = configs['train_acts']
-    val_acts = configs['val_acts']
-    test_acts = configs['test_acts']
+def define_tracks(configs):
+    train_acts = configs["train_acts"]
+    val_acts = configs["val_acts"]
+    test_acts = configs["test_acts"]
     print("train activations ", len(train_acts))
     print("val activations ", len(val_acts))
     print("test activations ", len(test_acts))